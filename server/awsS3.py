@@ -1,8 +1,76 @@
 import boto3
+import json
+import math
 import os
+import tempfile
+from botocore.exceptions import ClientError
+from botocore.paginate import TokenDecoder
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utils.metrics import track_dependency
+from utils.ttlCache import TTLCache
 from dotenv import load_dotenv
 load_dotenv()
 
+# Streaming uploads: the body is read and sent one part at a time, with at most
+# S3_UPLOAD_CONCURRENCY parts in memory. S3 requires parts of at least 5 MB (except the last).
+S3_MIN_PART_SIZE = 5 * 1024 * 1024
+S3_PART_SIZE = max(int(os.getenv("S3_PART_SIZE", str(8 * 1024 * 1024))), S3_MIN_PART_SIZE)
+S3_UPLOAD_CONCURRENCY = int(os.getenv("S3_UPLOAD_CONCURRENCY", "4"))
+
+# Listings: pages of at most 1000 keys (the S3 maximum), cached per bucket/uid/cursor.
+# Uploads through this client drop the uploader's cached pages.
+S3_LIST_PAGE_SIZE = min(int(os.getenv("S3_LIST_PAGE_SIZE", "1000")), 1000)
+listing_cache = TTLCache(
+    "s3_listings",
+    max_size=int(os.getenv("S3_LIST_CACHE_SIZE", "2048")),
+    ttl=float(os.getenv("S3_LIST_CACHE_TTL", "300")),
+)
+
+
+def listing_cache_prefix(bucket_name: str, uid: str = None) -> str:
+    return f"{bucket_name}:{uid or ''}:"
+
+
+# Presigned URLs let clients move contract bytes to/from S3 directly; the API only
+# signs keys under the caller's own {uid}/ prefix and records metadata afterwards.
+S3_PRESIGN_TTL = int(os.getenv("S3_PRESIGN_TTL", "900"))
+S3_MAX_PARTS = 10000
+METADATA_DIR = ".meta"  # {uid}/.meta/{file_name}.json sidecars, hidden from listings
+
+
+def user_key(uid: str, file_name: str) -> str:
+    """{uid}/{file_name}, refusing names that would escape the user's prefix or hit the metadata dir."""
+    if not uid or "/" in uid or uid in (".", ".."):
+        raise ValueError("a user_id without '/' is required")
+    if not file_name or "/" in file_name or "\\" in file_name or file_name in (".", "..") \
+            or file_name == METADATA_DIR:
+        raise ValueError(f"invalid file name: {file_name!r}")
+    return f"{uid}/{file_name}"
+
+
+def completed_parts(parts) -> list:
+    """CompleteMultipartUpload parts from [{"part_number", "etag"}], sorted; ValueError if malformed."""
+    if not isinstance(parts, list) or not parts:
+        raise ValueError("parts must be a non-empty list of {part_number, etag}")
+    completed = []
+    for part in parts:
+        try:
+            number, etag = int(part["part_number"]), part["etag"]
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"invalid part {part!r}: expected {{part_number, etag}}") from None
+        if number < 1 or not isinstance(etag, str) or not etag:
+            raise ValueError(f"invalid part {part!r}: expected {{part_number, etag}}")
+        completed.append({"PartNumber": number, "ETag": etag})
+    return sorted(completed, key=lambda p: p["PartNumber"])
+
+
+def metadata_key(uid: str, file_name: str) -> str:
+    return f"{uid}/{METADATA_DIR}/{file_name}.json"
+
+
+def is_metadata_key(key: str) -> bool:
+    return f"/{METADATA_DIR}/" in key or key.startswith(f"{METADATA_DIR}/")
 
 
 class S3Client:
@@ -21,52 +89,310 @@ class S3Client:
         Otherwise uploads to: bucket_name/file_name
         """
         s3_key = f"{uid}/{file_name}" if uid else file_name
-        self.s3_client.upload_file(file_path, bucket_name, s3_key)
+        with track_dependency("s3", "upload"):
+            self.s3_client.upload_file(file_path, bucket_name, s3_key)
+        self.invalidate_listing(bucket_name, uid)
         print(f"✅ File uploaded successfully to {s3_key}!")
         return s3_key
+
+    def upload_stream(self, fileobj, bucket_name: str, file_name: str, uid: str = None,
+                      content_type: str = None, part_size: int = None, max_concurrency: int = None):
+        """
+        Upload a file-like object (e.g. UploadFile.file) to S3 without reading it whole
+        or copying it to disk. Bodies up to one part go up in a single PUT; larger ones
+        use a multipart upload with up to `max_concurrency` parts uploading at once.
+        Blocking: call it from a worker thread in async code.
+
+        Returns:
+            tuple[str, int]: the S3 key and the number of bytes uploaded.
+        """
+        s3_key = f"{uid}/{file_name}" if uid else file_name
+        part_size = max(part_size or S3_PART_SIZE, S3_MIN_PART_SIZE)
+        max_concurrency = max_concurrency or S3_UPLOAD_CONCURRENCY
+        extra = {"ContentType": content_type} if content_type else {}
+
+        first = fileobj.read(part_size)
+        if len(first) < part_size:
+            with track_dependency("s3", "upload"):
+                self.s3_client.put_object(Bucket=bucket_name, Key=s3_key, Body=first, **extra)
+            self.invalidate_listing(bucket_name, uid)
+            print(f"✅ File uploaded successfully to {s3_key}!")
+            return s3_key, len(first)
+
+        with track_dependency("s3", "create_multipart_upload"):
+            upload_id = self.s3_client.create_multipart_upload(Bucket=bucket_name, Key=s3_key, **extra)["UploadId"]
+
+        # A part is only read once a slot is free, so memory stays at ~max_concurrency parts
+        slots = threading.BoundedSemaphore(max_concurrency)
+        failed = threading.Event()
+
+        def upload_part(number, body):
+            try:
+                with track_dependency("s3", "upload_part"):
+                    response = self.s3_client.upload_part(
+                        Bucket=bucket_name, Key=s3_key, UploadId=upload_id, PartNumber=number, Body=body
+                    )
+                return {"PartNumber": number, "ETag": response["ETag"]}
+            except Exception:
+                failed.set()
+                raise
+            finally:
+                slots.release()
+
+        total, futures = 0, []
+        try:
+            with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="s3-part") as pool:
+                body, number = first, 1
+                while body and not failed.is_set():
+                    slots.acquire()
+                    futures.append(pool.submit(upload_part, number, body))
+                    total += len(body)
+                    body, number = fileobj.read(part_size), number + 1
+                parts = [future.result() for future in futures]
+
+            with track_dependency("s3", "complete_multipart_upload"):
+                self.s3_client.complete_multipart_upload(
+                    Bucket=bucket_name, Key=s3_key, UploadId=upload_id, MultipartUpload={"Parts": parts}
+                )
+        except BaseException:
+            # Don't leave billed, invisible parts behind
+            self.s3_client.abort_multipart_upload(Bucket=bucket_name, Key=s3_key, UploadId=upload_id)
+            raise
+
+        self.invalidate_listing(bucket_name, uid)
+        print(f"✅ File uploaded successfully to {s3_key} ({total} bytes, {len(parts)} parts)!")
+        return s3_key, total
     
-    def download_file(self, bucket_name: str, file_name: str, uid: str = None):
-        """Download a file from S3"""
+    def download_file(self, bucket_name: str, file_name: str, uid: str = None, dest_path: str = None):
+        """
+        Download a file from S3 to `dest_path` (default: the system temp dir, not the cwd).
+        Returns the local path.
+        """
         s3_key = f"{uid}/{file_name}" if uid else file_name
-        self.s3_client.download_file(bucket_name, s3_key, file_name)
+        dest_path = dest_path or os.path.join(tempfile.gettempdir(), os.path.basename(file_name))
+        with track_dependency("s3", "download"):
+            self.s3_client.download_file(bucket_name, s3_key, dest_path)
         print("✅ File downloaded successfully!")
+        return dest_path
+
+    # ─────────────────────────────────────────────
+    # Presigned, direct-to-S3 transfers
+    # ─────────────────────────────────────────────
+    def presign_upload(self, bucket_name: str, file_name: str, uid: str,
+                       content_type: str = None, expires_in: int = S3_PRESIGN_TTL):
+        """
+        Presigned PUT for {uid}/{file_name}. The client must send the returned
+        headers with the body. Call complete_upload afterwards to record metadata.
+        """
+        s3_key = user_key(uid, file_name)
+        params = {"Bucket": bucket_name, "Key": s3_key}
+        headers = {}
+        if content_type:
+            params["ContentType"] = headers["Content-Type"] = content_type
+        url = self.s3_client.generate_presigned_url("put_object", Params=params, ExpiresIn=expires_in)
+        return {"method": "PUT", "url": url, "headers": headers, "s3_path": s3_key, "expires_in": expires_in}
+
+    def presign_download(self, bucket_name: str, file_name: str, uid: str, expires_in: int = S3_PRESIGN_TTL):
+        """Presigned GET for {uid}/{file_name}; raises FileNotFoundError if there is no such file."""
+        s3_key = user_key(uid, file_name)
+        self._head(bucket_name, s3_key)
+        url = self.s3_client.generate_presigned_url(
+            "get_object", Params={"Bucket": bucket_name, "Key": s3_key}, ExpiresIn=expires_in
+        )
+        return {"method": "GET", "url": url, "s3_path": s3_key, "expires_in": expires_in}
+
+    def presign_multipart_upload(self, bucket_name: str, file_name: str, uid: str, size: int,
+                                 content_type: str = None, part_size: int = None,
+                                 expires_in: int = S3_PRESIGN_TTL):
+        """
+        Start a multipart upload for a `size`-byte file and presign a PUT per part.
+        The client uploads part N as bytes [(N-1) * part_size, N * part_size), keeps
+        each response's ETag header, and passes them to complete_upload.
+        """
+        s3_key = user_key(uid, file_name)
+        part_size = max(part_size or S3_PART_SIZE, S3_MIN_PART_SIZE, math.ceil(size / S3_MAX_PARTS))
+        part_count = max(1, math.ceil(size / part_size))
+        extra = {"ContentType": content_type} if content_type else {}
+
+        with track_dependency("s3", "create_multipart_upload"):
+            upload_id = self.s3_client.create_multipart_upload(Bucket=bucket_name, Key=s3_key, **extra)["UploadId"]
+
+        parts = [
+            {
+                "part_number": number,
+                "url": self.s3_client.generate_presigned_url(
+                    "upload_part",
+                    Params={"Bucket": bucket_name, "Key": s3_key, "UploadId": upload_id, "PartNumber": number},
+                    ExpiresIn=expires_in,
+                ),
+            }
+            for number in range(1, part_count + 1)
+        ]
+        return {
+            "upload_id": upload_id,
+            "s3_path": s3_key,
+            "part_size": part_size,
+            "parts": parts,
+            "expires_in": expires_in,
+        }
+
+    def complete_upload(self, bucket_name: str, file_name: str, uid: str, metadata: dict = None,
+                        upload_id: str = None, parts=None):
+        """
+        Finish a presigned upload: complete the multipart upload when `upload_id` is
+        given ({"part_number", "etag"} per part), check the object landed, write the
+        metadata sidecar and refresh the uid's listing. Returns the object's key and size.
+        """
+        s3_key = user_key(uid, file_name)
+        if upload_id:
+            completed = completed_parts(parts)
+            with track_dependency("s3", "complete_multipart_upload"):
+                self.s3_client.complete_multipart_upload(
+                    Bucket=bucket_name, Key=s3_key, UploadId=upload_id, MultipartUpload={"Parts": completed}
+                )
+
+        head = self._head(bucket_name, s3_key)
+        if metadata:
+            self.save_metadata(bucket_name, file_name, uid, metadata)
+        self.invalidate_listing(bucket_name, uid)
+        print(f"✅ Upload to {s3_key} completed ({head['ContentLength']} bytes)")
+        return {"s3_path": s3_key, "size": head["ContentLength"], "content_type": head.get("ContentType")}
+
+    def abort_upload(self, bucket_name: str, file_name: str, uid: str, upload_id: str):
+        """Abandon a presigned multipart upload so its parts aren't kept (and billed)."""
+        with track_dependency("s3", "abort_multipart_upload"):
+            self.s3_client.abort_multipart_upload(Bucket=bucket_name, Key=user_key(uid, file_name), UploadId=upload_id)
+
+    # ─────────────────────────────────────────────
+    # Contract metadata sidecars ({uid}/.meta/{file_name}.json)
+    # ─────────────────────────────────────────────
+    def save_metadata(self, bucket_name: str, file_name: str, uid: str, metadata: dict):
+        user_key(uid, file_name)
+        with track_dependency("s3", "put_metadata"):
+            self.s3_client.put_object(
+                Bucket=bucket_name,
+                Key=metadata_key(uid, file_name),
+                Body=json.dumps({"file_name": file_name, **metadata}).encode("utf-8"),
+                ContentType="application/json",
+            )
+
+    def get_metadata(self, bucket_name: str, file_name: str, uid: str):
+        """The metadata recorded for a file, or None."""
+        user_key(uid, file_name)
+        try:
+            with track_dependency("s3", "get_metadata"):
+                body = self.s3_client.get_object(Bucket=bucket_name, Key=metadata_key(uid, file_name))["Body"].read()
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                return None
+            raise
+        return json.loads(body)
+
+    def _head(self, bucket_name: str, s3_key: str):
+        try:
+            with track_dependency("s3", "head"):
+                return self.s3_client.head_object(Bucket=bucket_name, Key=s3_key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                raise FileNotFoundError(s3_key) from e
+            raise
 
     def list_files(self, bucket_name: str, uid: str = None):
         """
         List files in S3 bucket
         If uid is provided, lists files under: bucket_name/uid/
         Otherwise lists all files in bucket
+        Follows every page (list_objects_v2 stops at 1000 keys); use
+        list_files_page or iter_files for large prefixes.
         """
+        return list(self.iter_files(bucket_name, uid))
+
+    def iter_files(self, bucket_name: str, uid: str = None):
+        """Yield every file under the prefix."""
+        for files in self.iter_pages(bucket_name, uid):
+            yield from files
+
+    def iter_pages(self, bucket_name: str, uid: str = None):
+        """Yield the listing as lists of files, one (cached) page at a time."""
+        cursor = None
+        while True:
+            page = self.list_files_page(bucket_name, uid, cursor=cursor, limit=S3_LIST_PAGE_SIZE)
+            yield page["files"]
+            cursor = page["next_cursor"]
+            if not cursor:
+                return
+
+    def list_files_page(self, bucket_name: str, uid: str = None, cursor: str = None, limit: int = None):
+        """
+        One page of the listing: {"files": [...], "next_cursor": str | None}.
+        Pass next_cursor back as `cursor` for the following page. Pages are cached
+        per (bucket, uid, cursor, limit) until S3_LIST_CACHE_TTL or an upload by that uid.
+        Metadata sidecars are left out, so a page can hold fewer than `limit` files.
+        Raises ValueError for a cursor that did not come from this API.
+        """
+        limit = max(1, min(int(limit or S3_LIST_PAGE_SIZE), 1000))
+        if cursor is not None:
+            self._check_cursor(cursor)
+        cache_key = f"{listing_cache_prefix(bucket_name, uid)}{cursor or ''}:{limit}"
+        page, status = listing_cache.get(cache_key)
+        if status == "hit":
+            return page
+
         params = {'Bucket': bucket_name}
-        
-        # Add prefix if UID is provided
         if uid:
             params['Prefix'] = f"{uid}/"
-        
-        response = self.s3_client.list_objects_v2(**params)
-        
-        # Return empty list if no files found
-        if 'Contents' not in response:
-            return []
-        
-        # Extract just the file names (remove UID prefix if present)
-        files = []
-        for item in response['Contents']:
-            key = item['Key']
-            # Extract filename from path (remove UID prefix)
-            if uid and key.startswith(f"{uid}/"):
-                filename = key.replace(f"{uid}/", "", 1)
-            else:
-                filename = key
-            
-            files.append({
-                'name': filename,
-                'full_path': key,
-                'size': item['Size'],
-                'last_modified': item['LastModified'].isoformat()
-            })
-        
-        return files
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        pages = paginator.paginate(
+            **params, PaginationConfig={"MaxItems": limit, "PageSize": limit, "StartingToken": cursor}
+        )
+        try:
+            with track_dependency("s3", "list"):
+                result = pages.build_full_result()
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") == "InvalidArgument":
+                raise ValueError(f"S3 rejected the cursor: {e}") from e
+            raise
+
+        page = {
+            "files": [
+                self._file_entry(item, uid) for item in result.get('Contents', []) if not is_metadata_key(item['Key'])
+            ],
+            "next_cursor": result.get('NextToken'),
+        }
+        listing_cache.set(cache_key, page)
+        return page
+
+    def invalidate_listing(self, bucket_name: str, uid: str = None):
+        """Drop cached listing pages for this uid and for the whole bucket."""
+        listing_cache.delete_prefix(listing_cache_prefix(bucket_name, uid))
+        if uid:
+            listing_cache.delete_prefix(listing_cache_prefix(bucket_name))
+
+    @staticmethod
+    def _check_cursor(cursor: str):
+        """Cursors are the paginator's resume tokens; anything else would reach S3 mangled."""
+        try:
+            token = TokenDecoder().decode(cursor)
+        except ValueError as e:
+            raise ValueError(f"not a listing cursor ({e})") from e
+        if not isinstance(token, dict) or "ContinuationToken" not in token:
+            raise ValueError("not a listing cursor")
+
+    @staticmethod
+    def _file_entry(item, uid: str = None):
+        # Extract filename from path (remove UID prefix)
+        key = item['Key']
+        if uid and key.startswith(f"{uid}/"):
+            filename = key.replace(f"{uid}/", "", 1)
+        else:
+            filename = key
+
+        return {
+            'name': filename,
+            'full_path': key,
+            'size': item['Size'],
+            'last_modified': item['LastModified'].isoformat()
+        }
     
     def list_files_raw(self, bucket_name: str, uid: str = None):
         """
@@ -77,8 +403,9 @@ class S3Client:
         if uid:
             params['Prefix'] = f"{uid}/"
         
-        response = self.s3_client.list_objects_v2(**params)
-        return response.get('Contents', [])
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        with track_dependency("s3", "list"):
+            return [item for page in paginator.paginate(**params) for item in page.get('Contents', [])]
     
 
 
@@ -0,0 +1,52 @@
+"""
+Per-upsert overhead in db/chromaClient.py with embeddings stubbed locally:
+a fresh OpenAIEmbeddingFunction + get_or_create_collection per call (before)
+vs the cached collection handle and shared embedding function (after).
+
+Run from server/:
+    python -m benchmarks.bench_chroma_upsert --docs 500 --companies 5
+"""
+import argparse
+import time
+
+from benchmarks import fakes
+from chromadb.utils import embedding_functions
+from db import chromaClient
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=500)
+    parser.add_argument("--companies", type=int, default=5)
+    args = parser.parse_args()
+
+    stub = fakes.FakeEmbeddingFunction()
+    chromaClient.set_embedding_function(stub)
+
+    def before(company, text, i):
+        embedding_functions.OpenAIEmbeddingFunction(api_key="sk-benchmark", model_name=chromaClient.EMBEDDING_MODEL)
+        collection = chromaClient.chroma.get_or_create_collection(
+            name=f"before_{chromaClient.sanitize_collection_name(company)}",
+            embedding_function=stub,
+        )
+        collection.add(documents=[text], metadatas=[{"i": i}], ids=[f"{company}_{i}"])
+
+    def after(company, text, i):
+        collection = chromaClient.get_collection(f"after_{chromaClient.sanitize_collection_name(company)}")
+        collection.add(documents=[text], metadatas=[{"i": i}], ids=[f"{company}_{i}"])
+
+    for label, fn in [("per-call handle (before)", before), ("cached handle (after)", after)]:
+        samples = []
+        for i in range(args.docs):
+            company = f"Company {i % args.companies}"
+            start = time.perf_counter()
+            fn(company, f"Snippet {i} about {company}", i)
+            samples.append((time.perf_counter() - start) * 1000)
+        print(
+            f"{label:<26} mean={sum(samples) / len(samples):7.3f}ms "
+            f"p50={fakes.percentile(samples, 50):7.3f}ms p95={fakes.percentile(samples, 95):7.3f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Latency of getting from a chat message to (intent, company, criticality) through
+classify_and_extract_node: one structured LLM call for phrasings the rules leave
+to the LLM, and the rule-based pre-classifier for obvious requests.
+
+The response cache is cleared before every timed call, so each one reaches the
+(fake) LLM; the speculative SERP fetch classify-and-extract starts goes to a local
+mock SERP server.
+
+Run from server/:
+    python -m benchmarks.bench_classify --requests 20 --llm-latency 0.4
+"""
+import argparse
+import contextlib
+import io
+import os
+import time
+
+from benchmarks import fakes
+
+# Obvious requests the pre-classifier answers, and phrasings it leaves to the LLM
+RULE_MESSAGES = ["analyze Tesla with high criticality", "Risk assessment for Apple, criticality is low", "hello"]
+LLM_MESSAGES = ["could you analyze Tesla with high criticality for our vendor review?", "what does clause 4 mean"]
+
+
+def run(label, node, messages, requests):
+    from graphs import contractbot
+
+    samples = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(requests):
+            state = {"user_id": "bench", "messages": [{"role": "user", "content": messages[i % len(messages)]}]}
+            contractbot.response_cache.clear()
+            start = time.perf_counter()
+            node(state)
+            samples.append((time.perf_counter() - start) * 1000)
+    print(
+        f"{label:<32} p50={fakes.percentile(samples, 50):8.2f}ms "
+        f"p95={fakes.percentile(samples, 95):8.2f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--llm-latency", type=float, default=0.4)
+    args = parser.parse_args()
+
+    with fakes.MockSerpServer(latency=0.5) as serp:
+        os.environ["BRIGHT_DATA_URL"] = serp.url
+        from graphs import contractbot
+
+        contractbot.llm = fakes.FakeChatModel(fakes.contractbot_responder, latency=args.llm_latency)
+
+        run("one structured LLM call", contractbot.classify_and_extract_node, LLM_MESSAGES, args.requests)
+        run("pre-classifier, obvious", contractbot.classify_and_extract_node, RULE_MESSAGES, args.requests)
+
+
+if __name__ == "__main__":
+    main()
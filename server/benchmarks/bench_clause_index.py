@@ -0,0 +1,112 @@
+"""
+Clause retrieval latency for one user with --clauses contract chunks (default 10k):
+index build, BM25 only, vector only (Chroma HNSW) and the hybrid search used by
+contract_qa (both, fused with reciprocal rank fusion), optionally filtered to one contract.
+
+Embeddings are local fakes of --dim dimensions (1536 = text-embedding-3-small),
+so the query embedding costs microseconds here; in production it is an OpenAI
+call unless the question is in the query embedding cache.
+
+Run from server/:
+    python -m benchmarks.bench_clause_index --clauses 10000 --queries 300
+"""
+import argparse
+import contextlib
+import io
+import random
+import time
+
+from benchmarks import fakes
+
+QUESTIONS = [
+    "what is the termination notice period",
+    "who is liable for gross negligence",
+    "when are invoices payable",
+    "governing law of the agreement",
+    "how is personal data processed",
+    "does the contract renew automatically",
+    "limitation of liability cap on fees paid",
+    "security measures required from the supplier",
+    "material breach cure period",
+    "insurance obligations",
+]
+
+
+def seed(user_id: str, clauses: int, contracts: int):
+    """Write `clauses` chunks spread over `contracts` contracts straight through upsert_contract_chunks."""
+    from db.chromaClient import upsert_contract_chunks
+
+    per_contract = clauses // contracts
+    for n in range(contracts):
+        texts, metadatas = [], []
+        articles = fakes.contract_clauses(article_count=per_contract // 12 + 1, seed=n)
+        for heading, article_clauses in articles:
+            for clause in article_clauses:
+                if len(texts) == per_contract:
+                    break
+                texts.append(f"{clause} Contract {n} clause {len(texts)}.")
+                metadatas.append({
+                    "file_name": f"contract-{n}.pdf", "contract_name": f"Contract {n}", "section": heading,
+                    "page": len(texts) // 3 + 1, "page_end": len(texts) // 3 + 1, "chunk": len(texts),
+                })
+        upsert_contract_chunks(user_id, texts, metadatas, batch_size=2000)
+
+
+def timed_ms(fn, samples):
+    start = time.perf_counter()
+    result = fn()
+    samples.append((time.perf_counter() - start) * 1000)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clauses", type=int, default=10_000)
+    parser.add_argument("--contracts", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--top-k", type=int, default=6)
+    args = parser.parse_args()
+
+    from db import chromaClient, clauseIndex
+
+    embed = fakes.FakeEmbeddingFunction(dim=args.dim)
+    chromaClient.set_embedding_function(embed)
+    user_id = "bench-clauses"
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        seed(user_id, args.clauses, args.contracts)
+    seed_s = time.perf_counter() - start
+
+    build = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        index = timed_ms(lambda: clauseIndex.get_clause_index(user_id), build)
+
+    rng = random.Random(7)
+    questions = [f"{rng.choice(QUESTIONS)} {i}" for i in range(args.queries)]
+    limit = max(4 * args.top_k, 20)
+    results = {"bm25": [], "vector": [], "hybrid": [], "hybrid, one contract": []}
+    for i, question in enumerate(questions):
+        vector = chromaClient.embed_queries([question])[0]
+        timed_ms(lambda: index.bm25(question, limit), results["bm25"])
+        timed_ms(lambda: index.vector(vector, limit), results["vector"])
+        timed_ms(lambda: clauseIndex.search_clauses(user_id, question, top_k=args.top_k), results["hybrid"])
+        file_name = f"contract-{i % args.contracts}.pdf"
+        timed_ms(
+            lambda: clauseIndex.search_clauses(user_id, question, top_k=args.top_k, file_name=file_name),
+            results["hybrid, one contract"],
+        )
+
+    print(f"{len(index)} clauses in {args.contracts} contracts, dim {args.dim} (seeded in {seed_s:.1f}s)")
+    print(f"  index build (collection.get + BM25 postings): {build[0]:.0f} ms")
+    print(f"  {'retrieval':<24}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for label, samples in results.items():
+        print(
+            f"  {label:<24}{fakes.percentile(samples, 50):>9.2f}"
+            f"{fakes.percentile(samples, 95):>9.2f}{fakes.percentile(samples, 99):>9.2f}"
+        )
+    print(f"  index cache: {clauseIndex.clause_index_stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Contract PDF ingestion: the straightforward version (pdfplumber over the whole
+document in the calling process, then one big upsert) vs contractIngest.ingest_pdf
+(page ranges in the extraction process pool, chunks embedded while later pages
+are still being extracted).
+
+Every run is a child process, so peak RSS is its own; the kernel's peak mark
+is reset right before ingestion. Extraction workers are separate processes and
+not included in the peak. Embeddings are local fakes with --embed-latency
+seconds per call.
+
+Run from server/:
+    python -m benchmarks.bench_contract_ingest --pages 50,500
+    python -m benchmarks.bench_contract_ingest --pages 500 --workers 4
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_s3_upload import reset_peak_rss, rss_mb
+
+
+def ingest_before(path, user_id):
+    import pdfplumber
+
+    from db.chromaClient import upsert_contract_chunks
+    from db.clauseIndex import ClauseChunker
+
+    with pdfplumber.open(path) as pdf:
+        pages = [(page.page_number, page.extract_text() or "") for page in pdf.pages]
+    chunker = ClauseChunker()
+    chunks = [chunk for page_number, text in pages for chunk in chunker.add_page(page_number, text)]
+    chunks += chunker.finish()
+    metadatas = [
+        {"file_name": "contract.pdf", "section": c["section"], "page": c["page"], "page_end": c["page_end"], "chunk": i}
+        for i, c in enumerate(chunks)
+    ]
+    texts = [c["text"] for c in chunks]
+    upsert_contract_chunks(user_id, texts, metadatas)
+    return len(pages), len(texts)
+
+
+def ingest_after(path, user_id):
+    from utils.contractIngest import ingest_pdf
+
+    result = ingest_pdf(path, user_id, "contract.pdf")
+    return result["pages"], result["chunks"]
+
+
+def child(args):
+    import contextlib
+    import io
+
+    from benchmarks import fakes
+    from db import chromaClient
+    from utils import contractIngest
+
+    chromaClient.set_embedding_function(fakes.FakeEmbeddingFunction(latency=args.embed_latency))
+    if args.child == "after":
+        contractIngest._get_extract_pool().submit(int).result()  # workers are up before the clock starts
+
+    reset_peak_rss()
+    baseline = rss_mb()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        ingest = ingest_before if args.child == "before" else ingest_after
+        pages, chunks = ingest(args.path, f"bench-{args.child}")
+    wall = time.perf_counter() - start
+    peak = rss_mb("VmHWM")
+    contractIngest.shutdown()
+    print(json.dumps({"pages": pages, "chunks": chunks, "seconds": wall, "peak_rss_mb": peak, "baseline_rss_mb": baseline}))
+
+
+def run_child(mode, path, args):
+    env = {**os.environ, "PDF_EXTRACT_WORKERS": str(args.workers)}
+    command = [
+        sys.executable, "-m", "benchmarks.bench_contract_ingest", "--child", mode, "--path", path,
+        "--embed-latency", str(args.embed_latency),
+    ]
+    out = subprocess.run(command, env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", default="50,500", help="comma-separated page counts")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="PDF_EXTRACT_WORKERS")
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--child", choices=["before", "after"], help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        return
+
+    from benchmarks import fakes
+
+    print(f"{args.workers} extraction workers, {args.embed_latency * 1000:.0f} ms per embedding call")
+    print(f"{'pages':>6}  {'path':<24}{'seconds':>9}{'pages/s':>9}{'chunks':>8}{'peak RSS MB':>13}{'over baseline':>15}")
+    for pages in (int(p) for p in args.pages.split(",")):
+        path = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf").name
+        fakes.write_contract_pdf(path, pages)
+        try:
+            for mode, label in [("before", "whole document inline"), ("after", "ingest_pdf")]:
+                r = run_child(mode, path, args)
+                print(
+                    f"{pages:>6}  {label:<24}{r['seconds']:>9.2f}{r['pages'] / r['seconds']:>9.1f}{r['chunks']:>8}"
+                    f"{r['peak_rss_mb']:>13.1f}{r['peak_rss_mb'] - r['baseline_rss_mb']:>15.1f}"
+                )
+        finally:
+            os.unlink(path)
+
+
+if __name__ == "__main__":
+    main()
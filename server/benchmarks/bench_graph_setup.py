@@ -0,0 +1,52 @@
+"""
+Per-request graph setup cost for /chat, before and after the compiled-graph registry.
+
+Run from server/:
+    python -m benchmarks.bench_graph_setup --requests 400 --concurrency 32
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import fakes
+from graphs import contractbot
+
+
+def run(label, setup_fn, requests, concurrency):
+    def one_request(i):
+        start = time.perf_counter()
+        app = setup_fn()
+        setup_ms = (time.perf_counter() - start) * 1000
+        app.invoke(
+            {"user_id": f"user-{i % 50}", "messages": [{"role": "user", "content": "what can you do?"}]},
+            config={"configurable": {"thread_id": f"user-{i % 50}"}},
+        )
+        return setup_ms
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        setup_samples = list(pool.map(one_request, range(requests)))
+    wall = time.perf_counter() - start
+
+    print(
+        f"{label:<28} setup p50={fakes.percentile(setup_samples, 50):7.3f}ms "
+        f"p95={fakes.percentile(setup_samples, 95):7.3f}ms "
+        f"total setup={sum(setup_samples):8.1f}ms  throughput={requests / wall:7.1f} req/s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    contractbot.llm = fakes.FakeChatModel(lambda prompt: "other" if "classify" in prompt else "I analyze contract risk.")
+
+    run("build per request (before)", contractbot.build_chat_risk_graph, args.requests, args.concurrency)
+    contractbot.get_chat_risk_graph()  # warmed at startup in main.py
+    run("compiled registry (after)", contractbot.get_chat_risk_graph, args.requests, args.concurrency)
+
+
+if __name__ == "__main__":
+    main()
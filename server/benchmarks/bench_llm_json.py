@@ -0,0 +1,64 @@
+"""
+Fan-out JSON scoring against a local OpenAI stand-in that rate-limits a
+fraction of requests: sequential calls that give up on the first 429 (before)
+vs call_llm_as_json_many / acall_llm_as_json_many with backoff (after).
+
+Run from server/:
+    python -m benchmarks.bench_llm_json --prompts 40 --latency 0.3 --rate-limit 0.3
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import time
+
+from benchmarks import fakes
+
+
+def report(label, results, wall, server, stats_before, stats_after):
+    failed = sum(1 for r in results if "error" in r)
+    print(
+        f"{label:<32} {len(results)} prompts in {wall:6.2f}s  failed={failed:<3} "
+        f"requests={server.requests:<4} 429s={server.rate_limited:<3} "
+        f"retries={stats_after['retries'] - stats_before['retries']}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--prompts", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--rate-limit", type=float, default=0.3)
+    args = parser.parse_args()
+    prompts = [f"Score vendor {i}" for i in range(args.prompts)]
+
+    runs = [
+        ("sequential, no backoff (before)", "sequential"),
+        ("call_llm_as_json_many (after)", "threads"),
+        ("acall_llm_as_json_many (after)", "async"),
+    ]
+    for label, mode in runs:
+        with fakes.MockOpenAIServer(latency=args.latency, rate_limit=args.rate_limit) as server:
+            os.environ["OPENAI_BASE_URL"] = server.base_url
+            import importlib
+            from utils import jsonConverter
+            jsonConverter = importlib.reload(jsonConverter)  # clients pick up OPENAI_BASE_URL
+            jsonConverter.LLM_BACKOFF_BASE = 0.1
+
+            before = jsonConverter.llm_json_stats()
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                if mode == "sequential":
+                    jsonConverter.LLM_MAX_ATTEMPTS = 1
+                    results = [jsonConverter.call_llm_as_json(p) for p in prompts]
+                elif mode == "threads":
+                    results = jsonConverter.call_llm_as_json_many(prompts)
+                else:
+                    results = asyncio.run(jsonConverter.acall_llm_as_json_many(prompts))
+            wall = time.perf_counter() - start
+            report(label, results, wall, server, before, jsonConverter.llm_json_stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+Offline benchmark of the whole service: run_pipeline_stream, riskAnalysisGraph,
+handle_user_message and the S3 upload/list path, with recorded SERP pages,
+fake embeddings, a fake chat model and moto for S3. Reports p50/p95 per stage
+and end to end, and throughput at each concurrency level.
+
+Run from server/ (moto: pip install -r benchmarks/requirements.txt):
+    python -m benchmarks.bench_pipeline --users 1,8,32 --requests 32
+    python -m benchmarks.bench_pipeline --save baseline.json
+    python -m benchmarks.bench_pipeline --compare baseline.json --tolerance 0.25
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import fakes
+
+S3_BUCKET = "calhacks3.0"
+
+
+# ─────────────────────────────────────────────
+# Scenarios: one request each, returning ({stage: ms}, end-to-end ms)
+# ─────────────────────────────────────────────
+def stream_request(run, i):
+    from utils.stream_runner import run_pipeline_stream
+
+    stages = {}
+    start = time.perf_counter()
+    for event in run_pipeline_stream(f"{run}-user{i}", f"analyze {run}Co{i} with high criticality"):
+        if event["type"] == "stage_complete" and "duration_ms" in event:
+            stages[event["stage"]] = event["duration_ms"]
+        elif event["type"] == "error":
+            raise RuntimeError(event["message"])
+    return stages, (time.perf_counter() - start) * 1000
+
+
+def risk_graph_request(run, i):
+    from graphs.riskAnalysisGraph import riskAnalysisGraph
+
+    start = time.perf_counter()
+    state = riskAnalysisGraph(f"{run}Co{i}", "High", run_id=f"{run}-{i}")
+    return _durations(state), (time.perf_counter() - start) * 1000
+
+
+def chat_request(run, i):
+    from graphs.contractbot import handle_user_message
+
+    start = time.perf_counter()
+    state = handle_user_message(f"{run}-user{i}", f"what does clause {i} of a {run} NDA usually cover?")
+    return _durations(state), (time.perf_counter() - start) * 1000
+
+
+def _durations(state):
+    return {stage: m["duration_ms"] for stage, m in (state.get("stage_metrics") or {}).items()}
+
+
+def make_s3_request(payload_kb):
+    from awsS3 import S3Client
+
+    client = S3Client()
+    client.s3_client.create_bucket(
+        Bucket=S3_BUCKET, CreateBucketConfiguration={"LocationConstraint": "us-west-1"}
+    )
+    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
+    tmp.write(os.urandom(payload_kb * 1024))
+    tmp.close()
+
+    def s3_request(run, i):
+        stages = {}
+        start = time.perf_counter()
+        with open(tmp.name, "rb") as body:
+            client.upload_stream(body, S3_BUCKET, f"contract-{i}.pdf", uid=f"{run}-user{i % 8}")
+        stages["upload"] = (time.perf_counter() - start) * 1000
+        listed = time.perf_counter()
+        client.list_files(S3_BUCKET, uid=f"{run}-user{i % 8}")
+        stages["list"] = (time.perf_counter() - listed) * 1000
+        return stages, (time.perf_counter() - start) * 1000
+
+    return s3_request
+
+
+# ─────────────────────────────────────────────
+# Harness
+# ─────────────────────────────────────────────
+def reset_caches():
+    """Every run starts cold so runs are comparable."""
+    from db import chromaClient
+    from graphs import contractbot
+    from utils.reportCache import report_cache
+    from utils.webScraper import serp_cache
+
+    serp_cache.clear()
+    report_cache.clear()
+    contractbot.response_cache.clear()
+    chromaClient.query_embedding_cache.clear()
+
+
+def run_level(name, request_fn, users, requests):
+    reset_caches()
+    run = f"{name[:4]}{users}"
+    samples, stage_samples, errors = [], {}, 0
+
+    def one(i):
+        return request_fn(run, i)
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=users) as pool:
+        futures = [pool.submit(one, i) for i in range(max(requests, users))]
+        for future in futures:
+            try:
+                stages, total = future.result()
+            except Exception as e:
+                errors += 1
+                print(f"⚠️ {name} request failed: {e}", file=sys.stderr)
+                continue
+            samples.append(total)
+            for stage, ms in stages.items():
+                stage_samples.setdefault(stage, []).append(ms)
+    wall = time.perf_counter() - start
+
+    def summary(values):
+        return {"p50": round(fakes.percentile(values, 50), 2), "p95": round(fakes.percentile(values, 95), 2)}
+
+    return {
+        "requests": len(futures),
+        "errors": errors,
+        "throughput": round(len(samples) / wall, 2),
+        "stages": {stage: summary(values) for stage, values in stage_samples.items()},
+        "end_to_end": summary(samples),
+    }
+
+
+def print_level(name, users, result):
+    print(
+        f"\n== {name}  users={users}  requests={result['requests']}  errors={result['errors']}  "
+        f"throughput={result['throughput']} req/s"
+    )
+    print(f"   {'stage':<28}{'p50 ms':>10}{'p95 ms':>10}")
+    for stage, s in list(result["stages"].items()) + [("end_to_end", result["end_to_end"])]:
+        print(f"   {stage:<28}{s['p50']:>10.2f}{s['p95']:>10.2f}")
+
+
+def compare(results, baseline, tolerance, floor_ms):
+    """p95 values more than `tolerance` (and `floor_ms`) above the baseline."""
+    regressions = []
+    for name, levels in results.items():
+        for users, result in levels.items():
+            base = baseline.get(name, {}).get(users)
+            if not base:
+                continue
+            pairs = [("end_to_end", result["end_to_end"], base["end_to_end"])]
+            pairs += [(s, v, base["stages"][s]) for s, v in result["stages"].items() if s in base["stages"]]
+            for stage, now, before in pairs:
+                if now["p95"] > before["p95"] * (1 + tolerance) and now["p95"] - before["p95"] > floor_ms:
+                    regressions.append(f"{name} users={users} {stage}: p95 {before['p95']}ms -> {now['p95']}ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", default="1,8,32", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=32, help="requests per level (at least one per user)")
+    parser.add_argument("--scenarios", default="stream,risk_graph,chat,s3")
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--serp-latency", type=float, default=0.3)
+    parser.add_argument("--embed-latency", type=float, default=0.02)
+    parser.add_argument("--s3-payload-kb", type=int, default=256)
+    parser.add_argument("--save", help="write results as JSON")
+    parser.add_argument("--compare", help="baseline JSON from --save; exit 1 on p95 regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--floor-ms", type=float, default=10.0, help="ignore p95 increases smaller than this")
+    args = parser.parse_args()
+    levels = [int(u) for u in args.users.split(",")]
+    scenarios = args.scenarios.split(",")
+
+    with fakes.MockSerpServer(latency=args.serp_latency, render=fakes.recorded_serp_html) as serp, \
+            contextlib.ExitStack() as stack:
+        from db import chromaClient
+        from graphs import contractbot, riskAnalysisGraph
+        from utils import webScraper
+
+        webScraper.BRIGHT_DATA_URL = serp.url
+        chromaClient.set_embedding_function(fakes.FakeEmbeddingFunction(latency=args.embed_latency))
+        contractbot.llm = fakes.FakeChatModel(fakes.contractbot_responder, latency=args.llm_latency)
+        contractbot.call_llm_as_json = fakes.fake_risk_assessment(latency=args.llm_latency)
+        contractbot.stream_llm_json, contractbot.astream_llm_json = fakes.fake_risk_assessment_stream(args.llm_latency)
+        riskAnalysisGraph.call_llm_as_json = fakes.fake_risk_assessment(latency=args.llm_latency)
+
+        requests_by_scenario = {"stream": stream_request, "risk_graph": risk_graph_request, "chat": chat_request}
+        if "s3" in scenarios:
+            try:
+                from moto import mock_aws
+            except ImportError:
+                print("⚠️ moto not installed, skipping s3 (pip install -r benchmarks/requirements.txt)")
+            else:
+                stack.enter_context(mock_aws())
+                requests_by_scenario["s3"] = make_s3_request(args.s3_payload_kb)
+
+        results = {}
+        for name in scenarios:
+            if name not in requests_by_scenario:
+                continue
+            for users in levels:
+                result = run_level(name, requests_by_scenario[name], users, args.requests)
+                results.setdefault(name, {})[str(users)] = result
+                print_level(name, users, result)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved results to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.floor_ms)
+        if regressions:
+            print("\n❌ p95 regressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print(f"\n✅ No p95 regressions beyond {args.tolerance:.0%} of {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Repeated FAQ traffic through the chat branch (classify_and_extract + regular_chatbot),
+with the LLM response cache disabled (before) and enabled (after). FAQ entries the
+rule-based pre-classifier recognises skip the classifier LLM call either way.
+
+Run from server/:
+    python -m benchmarks.bench_response_cache --requests 200 --llm-latency 0.3
+"""
+import argparse
+import contextlib
+import io
+import random
+import time
+
+from benchmarks import fakes
+from graphs import contractbot
+
+FAQ = [
+    "What can you do?", "what can you do", "What is a contract?", "how do you score risk?",
+    "Which sources do you use?", "what is a contract", "Can you compare two vendors?",
+]
+
+
+class NoCache:
+    def get(self, *args, **kwargs):
+        return None
+
+    def set(self, *args, **kwargs):
+        pass
+
+
+def run(label, requests):
+    rng = random.Random(7)
+    samples = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(requests):
+            state = {"user_id": "bench", "messages": [{"role": "user", "content": rng.choice(FAQ)}]}
+            start = time.perf_counter()
+            state = contractbot.classify_and_extract_node(state)
+            contractbot.regular_chatbot_node(state)
+            samples.append((time.perf_counter() - start) * 1000)
+    print(
+        f"{label:<22} p50={fakes.percentile(samples, 50):8.2f}ms "
+        f"p95={fakes.percentile(samples, 95):8.2f}ms  llm calls={contractbot.llm.calls}"
+    )
+
+
+class CountingChatModel(fakes.FakeChatModel):
+    calls = 0
+
+    def invoke(self, prompt, *args, **kwargs):
+        self.calls += 1
+        return super().invoke(prompt, *args, **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    args = parser.parse_args()
+
+    cache = contractbot.response_cache
+
+    contractbot.llm = CountingChatModel(fakes.contractbot_responder, latency=args.llm_latency)
+    contractbot.response_cache = NoCache()
+    run("no cache (before)", args.requests)
+
+    contractbot.llm = CountingChatModel(fakes.contractbot_responder, latency=args.llm_latency)
+    contractbot.response_cache = cache
+    run("response cache (after)", args.requests)
+    for node, stats in cache.stats()["nodes"].items():
+        print(f"  {node}: {stats}")
+
+
+if __name__ == "__main__":
+    main()
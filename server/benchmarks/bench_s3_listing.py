@@ -0,0 +1,120 @@
+"""
+/list_files against a moto S3 seeded with one user owning --objects files
+(default 100k): the previous single list_objects_v2 call vs the paginated
+listing, cold and cached, a page by cursor, the NDJSON stream, and the first
+listing after an upload (cache invalidated).
+
+Run from server/ (pip install -r benchmarks/requirements.txt):
+    python -m benchmarks.bench_s3_listing --objects 100000
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import time
+
+BUCKET = "calhacks3.0"
+UID = "bench-user"
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+
+async def drain_ndjson(response):
+    """Read a StreamingResponse the way the server sends it: ((lines, ms) at first chunk, (lines, ms) at the end)."""
+    start, first, lines = time.perf_counter(), None, 0
+    async for chunk in response.body_iterator:
+        lines += chunk.count("\n")
+        if first is None:
+            first = (lines, (time.perf_counter() - start) * 1000)
+    return first, (lines, (time.perf_counter() - start) * 1000)
+
+
+def seed(objects: int):
+    """Write keys straight into the moto backend; going through put_object would take minutes."""
+    from moto.core import DEFAULT_ACCOUNT_ID
+    from moto.s3.models import s3_backends
+
+    backend = s3_backends[DEFAULT_ACCOUNT_ID]["global"]
+    for i in range(objects):
+        backend.put_object(BUCKET, f"{UID}/contract-{i:06d}.pdf", b"%PDF-1.4 bench")
+    backend.put_object(BUCKET, "other-user/contract.pdf", b"%PDF-1.4 bench")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--objects", type=int, default=100_000)
+    parser.add_argument("--limit", type=int, default=100, help="page size for the cursor requests")
+    args = parser.parse_args()
+
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+    from moto import mock_aws
+
+    with mock_aws(), contextlib.redirect_stdout(io.StringIO()):
+        from fastapi.testclient import TestClient
+
+        import main as api
+        from awsS3 import listing_cache
+
+        api.s3_client.s3_client.create_bucket(
+            Bucket=BUCKET, CreateBucketConfiguration={"LocationConstraint": "us-west-1"}
+        )
+        _, seed_ms = timed(lambda: seed(args.objects))
+        client = TestClient(api.app)
+        rows = []
+
+        def row(label, ms, detail):
+            rows.append(f"  {label:<44}{ms:>10.1f} ms   {detail}")
+
+        response, ms = timed(lambda: api.s3_client.s3_client.list_objects_v2(Bucket=BUCKET, Prefix=f"{UID}/"))
+        row("single list_objects_v2 (before)", ms, f"{len(response['Contents'])} files, truncated={response['IsTruncated']}")
+
+        listing_cache.clear()
+        body, ms = timed(lambda: client.get(f"/list_files?user_id={UID}").json())
+        row("full listing, cold", ms, f"{body['count']} files")
+        body, ms = timed(lambda: client.get(f"/list_files?user_id={UID}").json())
+        row("full listing, cached", ms, f"{body['count']} files")
+
+        listing_cache.clear()
+        page, ms = timed(lambda: client.get(f"/list_files?user_id={UID}&limit={args.limit}").json())
+        row(f"first page (limit={args.limit}), cold", ms, f"{page['count']} files")
+        _, ms = timed(lambda: client.get(f"/list_files?user_id={UID}&limit={args.limit}").json())
+        row(f"first page (limit={args.limit}), cached", ms, "")
+        # Walk up to page 50, stopping early when the listing runs out
+        cursor, pages = page["next_cursor"], 1
+        while cursor and pages < 50:
+            page = client.get(f"/list_files?user_id={UID}&limit={args.limit}&cursor={cursor}").json()
+            cursor, pages = page["next_cursor"], pages + 1
+        if cursor:
+            page, ms = timed(lambda: client.get(f"/list_files?user_id={UID}&limit={args.limit}&cursor={cursor}").json())
+            row(f"page {pages + 1} by cursor, cold", ms, f"first file {page['files'][0]['name']}")
+        else:
+            row("page by cursor", 0, f"skipped: the listing has only {pages} pages")
+
+        listing_cache.clear()
+        first_line, total = asyncio.run(drain_ndjson(api.list_files_endpoint(user_id=UID, format="ndjson")))
+        row("NDJSON stream, cold: first line", first_line[1], "")
+        row("NDJSON stream, cold: whole listing", total[1], f"{total[0]} lines")
+
+        client.post(
+            "/upload_file",
+            files={"file": ("contract-000000a.pdf", io.BytesIO(b"%PDF-1.4 new"), "application/pdf")},
+            data={"user_id": UID, "contract_name": "n", "contract_date": "d", "contract_signatory": "s"},
+        )
+        page, ms = timed(lambda: client.get(f"/list_files?user_id={UID}&limit={args.limit}").json())
+        row("first page after an upload (invalidated)", ms, f"second file {page['files'][1]['name']}")
+
+    print(f"seeded {args.objects} objects in {seed_ms / 1000:.1f}s")
+    print("\n".join(rows))
+    print(f"  listing cache: {json.dumps(listing_cache.stats())}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Contract upload to S3: the previous /upload_file path (read the whole body,
+copy it to a temp file, S3Client.upload_file) vs S3Client.upload_stream
+(part by part, parallel parts, nothing buffered beyond the parts in flight).
+
+S3 is a moto server in this process; every upload runs in a child process so
+its peak RSS is the client's own. The kernel's peak-RSS mark is reset right
+before the upload (Linux /proc/self/clear_refs), so import-time peaks don't count.
+
+Run from server/ (pip install -r benchmarks/requirements.txt):
+    python -m benchmarks.bench_s3_upload --sizes 1,50,500
+    python -m benchmarks.bench_s3_upload --sizes 50 --part-size-mb 16 --concurrency 8
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BUCKET = "calhacks3.0"
+
+
+def rss_mb(field: str = "VmRSS") -> float:
+    """Current (VmRSS) or peak (VmHWM) resident set size of this process."""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(f"{field}:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def reset_peak_rss():
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")
+
+
+# ─────────────────────────────────────────────
+# Child: one upload, printed as JSON
+# ─────────────────────────────────────────────
+def upload_before(client, path):
+    """The previous handler: await file.read(), write a NamedTemporaryFile, upload_file."""
+    with open(path, "rb") as source:
+        content = source.read()
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_file:
+        temp_file.write(content)
+        temp_path = temp_file.name
+    client.upload_file(temp_path, BUCKET, "contract.pdf", uid="bench-before")
+    os.unlink(temp_path)
+    return len(content)
+
+
+def upload_after(client, path, part_size, concurrency):
+    with open(path, "rb") as source:
+        _, size = client.upload_stream(
+            source, BUCKET, "contract.pdf", uid="bench-after",
+            part_size=part_size, max_concurrency=concurrency,
+        )
+    return size
+
+
+def child(args):
+    import contextlib
+    import io
+
+    from awsS3 import S3Client
+
+    client = S3Client()
+    reset_peak_rss()
+    baseline = rss_mb()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if args.child == "before":
+            size = upload_before(client, args.path)
+        else:
+            size = upload_after(client, args.path, args.part_size_mb * 1024 * 1024, args.concurrency)
+    wall = time.perf_counter() - start
+    peak = rss_mb("VmHWM")
+    print(json.dumps({"bytes": size, "seconds": wall, "peak_rss_mb": peak, "baseline_rss_mb": baseline}))
+
+
+# ─────────────────────────────────────────────
+# Parent
+# ─────────────────────────────────────────────
+def make_source(size_mb: int) -> str:
+    source = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
+    for _ in range(size_mb):
+        source.write(os.urandom(1024 * 1024))
+    source.close()
+    return source.name
+
+
+def run_child(mode, path, args, env):
+    command = [
+        sys.executable, "-m", "benchmarks.bench_s3_upload", "--child", mode, "--path", path,
+        "--part-size-mb", str(args.part_size_mb), "--concurrency", str(args.concurrency),
+    ]
+    out = subprocess.run(command, env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1,50,500", help="comma-separated file sizes in MB")
+    parser.add_argument("--part-size-mb", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--child", choices=["before", "after"], help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        return
+
+    import boto3
+    from moto.server import ThreadedMotoServer
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=0, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    env = {
+        **os.environ,
+        "AWS_ENDPOINT_URL": f"http://{host}:{port}",
+        "AWS_ACCESS_KEY_ID": "bench",
+        "AWS_SECRET_ACCESS_KEY": "bench",
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "bench"),
+    }
+    boto3.client(
+        "s3", region_name="us-west-1", endpoint_url=env["AWS_ENDPOINT_URL"],
+        aws_access_key_id="bench", aws_secret_access_key="bench",
+    ).create_bucket(Bucket=BUCKET, CreateBucketConfiguration={"LocationConstraint": "us-west-1"})
+
+    print(f"part size {args.part_size_mb} MB, {args.concurrency} parts in parallel")
+    print(f"{'size':>8}  {'path':<22}{'seconds':>9}{'MB/s':>9}{'peak RSS MB':>13}{'over baseline':>15}")
+    try:
+        for size_mb in (int(s) for s in args.sizes.split(",")):
+            path = make_source(size_mb)
+            try:
+                for mode, label in [("before", "read + temp file"), ("after", "upload_stream")]:
+                    r = run_child(mode, path, args, env)
+                    print(
+                        f"{size_mb:>6}MB  {label:<22}{r['seconds']:>9.2f}{size_mb / r['seconds']:>9.1f}"
+                        f"{r['peak_rss_mb']:>13.1f}{r['peak_rss_mb'] - r['baseline_rss_mb']:>15.1f}"
+                    )
+            finally:
+                os.unlink(path)
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
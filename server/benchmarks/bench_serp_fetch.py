@@ -0,0 +1,54 @@
+"""
+get_company_data latency against a local mock SERP server:
+sequential requests.post calls (old behaviour) vs the concurrent pooled fetch.
+
+Run from server/:
+    python -m benchmarks.bench_serp_fetch --latency 0.5 --runs 10 --variants 2
+"""
+import argparse
+import os
+import time
+
+import requests
+
+from benchmarks import fakes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.5, help="mock SERP response time in seconds")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--variants", type=int, default=1, help="query variants per category")
+    args = parser.parse_args()
+
+    with fakes.MockSerpServer(latency=args.latency) as serp:
+        os.environ["BRIGHT_DATA_URL"] = serp.url
+        from utils import webScraper
+
+        templates = {
+            category: [f"{variants[0]} (variant {v})" for v in range(args.variants)]
+            for category, variants in webScraper.SERP_QUERY_TEMPLATES.items()
+        }
+        webScraper.SERP_QUERY_TEMPLATES = templates
+
+        def sequential(company):
+            results = {}
+            for category, query in webScraper.build_queries(company, templates):
+                response = requests.post(serp.url, json={"url": webScraper.build_search_url(query)}, timeout=25)
+                results.setdefault(category, []).extend(webScraper.parse_google_html(response.text))
+            return results
+
+        for label, fn in [("sequential (before)", sequential), ("concurrent pooled (after)", webScraper.get_company_data)]:
+            samples = []
+            for i in range(args.runs):
+                start = time.perf_counter()
+                fn(f"Company {i}")
+                samples.append((time.perf_counter() - start) * 1000)
+            print(
+                f"{label:<27} p50={fakes.percentile(samples, 50):8.1f}ms "
+                f"p95={fakes.percentile(samples, 95):8.1f}ms  ({2 * args.variants} queries/run)"
+            )
+
+
+if __name__ == "__main__":
+    main()
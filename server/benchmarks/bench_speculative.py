@@ -0,0 +1,124 @@
+"""
+End-to-end latency of the chat risk graph (handle_user_message) and the async
+stream runner, run linearly (before) and with the parallel stored-evidence
+lookup plus the speculative SERP fetch (after). Messages cover:
+
+  confirmed     the LLM classifies it and confirms the regex guess (speculation pays off)
+  wrong_guess   the LLM corrects the guess (speculative fetch is cancelled)
+  rules         the rule-based pre-classifier handles it (nothing to speculate on)
+  known         rules path, company already in Chroma with no new evidence (stored context is reused)
+
+Run from server/:
+    python -m benchmarks.bench_speculative --requests 10 --llm-latency 0.3 --serp-latency 0.3
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import time
+
+from benchmarks import fakes
+
+MESSAGES = {
+    "confirmed": "Could you analyze {company} for our vendor review, criticality high?",
+    "wrong_guess": "Can you analyze our supplier {company}, criticality high?",
+    "rules": "analyze {company} with high criticality",
+    "known": "analyze {company} with high criticality",
+}
+
+
+def set_mode(parallel: bool):
+    from graphs import contractbot
+    from graphs.registry import reset_compiled_graphs
+    from utils import speculative
+
+    contractbot.PARALLEL_RETRIEVAL = parallel
+    speculative.SPECULATION_ENABLED = parallel
+    reset_compiled_graphs()
+
+
+def reset_caches():
+    from db import chromaClient
+    from graphs import contractbot
+    from utils.reportCache import report_cache
+    from utils.webScraper import serp_cache
+
+    serp_cache.clear()
+    report_cache.clear()
+    contractbot.response_cache.clear()
+    chromaClient.query_embedding_cache.clear()
+
+
+def graph_request(user_id, message):
+    from graphs.contractbot import handle_user_message
+
+    state = handle_user_message(user_id, message)
+    assert state.get("risk_report"), state.get("assistant_reply")
+
+
+def stream_request(user_id, message):
+    from utils.stream_runner import arun_pipeline_stream
+
+    async def consume():
+        async for event in arun_pipeline_stream(user_id, message):
+            assert event["type"] != "error", event["message"]
+
+    asyncio.run(consume())
+
+
+def run(label, request_fn, kind, requests):
+    """Per-request end-to-end ms; every request starts with cold SERP/report caches."""
+    samples = []
+    for i in range(requests):
+        company = f"{label}{kind}{i}" if kind != "known" else f"{label}Known"
+        message = MESSAGES[kind].format(company=company)
+        if kind == "known" and i == 0:
+            request_fn(f"{label}-seed", message)  # first sighting stores the evidence
+        reset_caches()
+        start = time.perf_counter()
+        request_fn(f"{label}-{kind}-{i}", message)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=10, help="requests per message kind and mode")
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--serp-latency", type=float, default=0.3)
+    parser.add_argument("--embed-latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    with fakes.MockSerpServer(latency=args.serp_latency, render=fakes.recorded_serp_html) as serp:
+        from db import chromaClient
+        from graphs import contractbot
+        from utils import webScraper
+        from utils.speculative import speculation_stats
+
+        webScraper.BRIGHT_DATA_URL = serp.url
+        chromaClient.set_embedding_function(fakes.FakeEmbeddingFunction(latency=args.embed_latency))
+        contractbot.llm = fakes.FakeChatModel(fakes.contractbot_responder, latency=args.llm_latency)
+        contractbot.call_llm_as_json = fakes.fake_risk_assessment(latency=args.llm_latency)
+        contractbot.stream_llm_json, contractbot.astream_llm_json = fakes.fake_risk_assessment_stream(args.llm_latency)
+
+        print(f"{'path':<8}{'message':<13}{'linear p50/p95 ms':>22}{'parallel p50/p95 ms':>24}{'p50 saved':>12}")
+        for path, request_fn in [("graph", graph_request), ("stream", stream_request)]:
+            for kind in MESSAGES:
+                results = {}
+                for mode, parallel in [("lin", False), ("par", True)]:
+                    set_mode(parallel)
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        results[mode] = run(f"{path}{mode}", request_fn, kind, args.requests)
+                before, after = results["lin"], results["par"]
+                saved = fakes.percentile(before, 50) - fakes.percentile(after, 50)
+                print(
+                    f"{path:<8}{kind:<13}"
+                    f"{fakes.percentile(before, 50):>11.1f}/{fakes.percentile(before, 95):<10.1f}"
+                    f"{fakes.percentile(after, 50):>13.1f}/{fakes.percentile(after, 95):<10.1f}"
+                    f"{saved:>8.1f} ms ({saved / fakes.percentile(before, 50):.0%})"
+                )
+        print(f"\nspeculation: {speculation_stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Concurrent /chat/stream capacity: the sync generator iterated in Starlette's
+threadpool (before) vs the async pipeline on the event loop (after).
+LLM, SERP and embeddings are local stand-ins with configurable latency.
+
+Run from server/:
+    python -m benchmarks.bench_stream_capacity --streams 120 --llm-latency 0.5 --serp-latency 0.5
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import time
+
+import httpx
+
+from benchmarks import fakes
+
+
+async def drive(app, path, streams):
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app), \
+            httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def one(i):
+            start = time.perf_counter()
+            response = await client.post(path, json={"user_id": f"u{i}", "message": f"analyze Company{i} with high criticality"})
+            assert '"type": "final"' in response.text, response.text[-300:]
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(one(i) for i in range(streams)))
+        return time.perf_counter() - start, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--streams", type=int, default=120)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--serp-latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    with fakes.MockSerpServer(latency=args.serp_latency) as serp:
+        os.environ["BRIGHT_DATA_URL"] = serp.url
+        import main as api
+        from fastapi import Body
+        from fastapi.responses import StreamingResponse
+        from db import chromaClient
+        from graphs import contractbot
+        from utils.stream_runner import run_pipeline_stream
+        from utils.webScraper import serp_cache
+        from utils.reportCache import report_cache
+
+        chromaClient.set_embedding_function(fakes.FakeEmbeddingFunction())
+        contractbot.llm = fakes.FakeChatModel(fakes.contractbot_responder, latency=args.llm_latency)
+        contractbot.call_llm_as_json = fakes.fake_risk_assessment(latency=args.llm_latency)
+        contractbot.stream_llm_json, contractbot.astream_llm_json = fakes.fake_risk_assessment_stream(args.llm_latency)
+
+        @api.app.post("/bench/sync_stream")
+        def sync_stream(payload: dict = Body(...)):
+            """The previous /chat/stream: a sync generator Starlette iterates in its threadpool."""
+            def events():
+                for event in run_pipeline_stream(payload["user_id"], payload["message"]):
+                    yield api.sse_event(event)
+                yield api.sse_event({"type": "done"})
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        for label, path in [("sync threadpool (before)", "/bench/sync_stream"), ("async pipeline (after)", "/chat/stream")]:
+            # Each run starts cold: no cached SERP results, query embeddings or reports
+            chromaClient.query_embedding_cache.clear()
+            serp_cache.clear()
+            report_cache.clear()
+            with contextlib.redirect_stdout(io.StringIO()):
+                wall, latencies = asyncio.run(drive(api.app, path, args.streams))
+            print(
+                f"{label:<25} {args.streams} streams in {wall:6.2f}s  "
+                f"({args.streams / wall:6.1f} streams/s)  "
+                f"p50={fakes.percentile(latencies, 50):5.2f}s p95={fakes.percentile(latencies, 95):5.2f}s"
+            )
+
+
+if __name__ == "__main__":
+    main()
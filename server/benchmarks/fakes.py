@@ -0,0 +1,403 @@
+"""
+Local stand-ins used by the benchmark scripts so they run without
+OpenAI, Bright Data or S3 credentials.
+
+Import this module before anything from graphs/, db/ or utils/.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import urllib.parse
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ.setdefault("BRIGHT_DATA_KEY", "benchmark")
+
+from langchain_core.messages import AIMessage
+from chromadb.api.types import EmbeddingFunction
+
+
+class FakeEmbeddingFunction(EmbeddingFunction):
+    """Deterministic hash-based embeddings; counts calls and embedded texts."""
+
+    def __init__(self, dim: int = 64, latency: float = 0.0):
+        self.dim = dim
+        self.latency = latency
+        self.calls = 0
+        self.texts = 0
+
+    def __call__(self, input):
+        self.calls += 1
+        self.texts += len(input)
+        if self.latency:
+            time.sleep(self.latency)
+        return [self.embed_one(text) for text in input]
+
+    def embed_one(self, text):
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        return [(digest[i % len(digest)] - 128) / 128 for i in range(self.dim)]
+
+    @staticmethod
+    def name():
+        return "benchmark-fake"
+
+    def get_config(self):
+        return {"dim": self.dim}
+
+    @staticmethod
+    def build_from_config(config):
+        return FakeEmbeddingFunction(config.get("dim", 64))
+
+
+class FakeChatModel:
+    """Minimal ChatOpenAI replacement: sleeps for `latency` seconds and answers via `responder(prompt)`."""
+
+    def __init__(self, responder=None, latency: float = 0.0):
+        self.responder = responder or (lambda prompt: "other")
+        self.latency = latency
+
+    def invoke(self, prompt, *args, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        return AIMessage(content=self.responder(prompt))
+
+    async def ainvoke(self, prompt, *args, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return AIMessage(content=self.responder(prompt))
+
+    def with_structured_output(self, schema):
+        return FakeStructuredModel(self, schema)
+
+
+class FakeStructuredModel:
+    """Result of FakeChatModel.with_structured_output: parses the responder's JSON into `schema`."""
+
+    def __init__(self, model: FakeChatModel, schema):
+        self.model = model
+        self.schema = schema
+
+    def invoke(self, prompt, *args, **kwargs):
+        return self.schema.model_validate_json(self.model.invoke(prompt).content)
+
+    async def ainvoke(self, prompt, *args, **kwargs):
+        return self.schema.model_validate_json((await self.model.ainvoke(prompt)).content)
+
+
+def contractbot_responder(prompt) -> str:
+    """Answers the contractbot prompts: "analyze <Company> with <level> criticality" is a risk request."""
+    prompt = str(prompt)
+    if "Classify the user's request and extract" in prompt:
+        # Also phrasings the rule-based pre-classifier leaves to the LLM:
+        # "could you analyze Acme for our review, criticality high", "analyze our supplier Acme, ..."
+        message = prompt.split("Message:")[-1]
+        company = re.search(r"analy[sz]e (?:our (?:supplier|vendor) )?(\w+)", message, re.IGNORECASE)
+        level = re.search(r"\b(high|medium|low)\b", message, re.IGNORECASE)
+        if not company:
+            return '{"intent": "other", "company_name": null, "criticality": null}'
+        return json.dumps({
+            "intent": "risk",
+            "company_name": company.group(1),
+            "criticality": level.group(1).lower() if level else None,
+        })
+    return "I help you assess the risk of contracting with other companies."
+
+
+RISK_ASSESSMENT = {
+    "financial_risk": 2,
+    "security_risk": 3,
+    "reputation_risk": 2,
+    "resilience_strength": 4,
+    "overall_recommendation": "contract_with_protections",
+    "rationale_with_citations": ["[Source 1] benchmark evidence"],
+}
+
+
+def fake_risk_assessment(latency: float = 0.0):
+    """Stand-in for utils.jsonConverter.call_llm_as_json returning a fixed assessment."""
+    def call_llm_as_json(prompt, *args, **kwargs):
+        if latency:
+            time.sleep(latency)
+        return dict(RISK_ASSESSMENT)
+    return call_llm_as_json
+
+
+def fake_risk_assessment_stream(latency: float = 0.0, chunk_size: int = 8):
+    """
+    Stand-ins for utils.jsonConverter.stream_llm_json / astream_llm_json:
+    the fixed assessment as JSON text, spread evenly over `latency` seconds.
+    Returns (sync_stream, async_stream).
+    """
+    text = json.dumps(RISK_ASSESSMENT, indent=2)
+    chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+    pause = latency / len(chunks)
+
+    def stream_llm_json(prompt, *args, **kwargs):
+        for chunk in chunks:
+            time.sleep(pause)
+            yield chunk
+
+    async def astream_llm_json(prompt, *args, **kwargs):
+        for chunk in chunks:
+            await asyncio.sleep(pause)
+            yield chunk
+
+    return stream_llm_json, astream_llm_json
+
+
+def serp_html(query: str, results: int = 10) -> str:
+    """Google-like result page in the layout utils/htmlParser.py understands."""
+    items = "".join(
+        f'<div class="g"><a href="https://example{i}.com/{abs(hash(query)) % 997}/{i}"><h3>{query} result {i}</h3></a>'
+        f'<div class="VwiC3b">Snippet {i} about {query}</div></div>'
+        for i in range(results)
+    )
+    return f"<html><body>{items}</body></html>"
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+_serp_fixtures = {}
+
+
+def _load_serp_fixtures():
+    if not _serp_fixtures:
+        serp_dir = os.path.join(FIXTURES_DIR, "serp")
+        for name in sorted(os.listdir(serp_dir)):
+            category = name.split("_", 1)[0]
+            with open(os.path.join(serp_dir, name), encoding="utf-8") as f:
+                _serp_fixtures.setdefault(category, []).append(f.read())
+    return _serp_fixtures
+
+
+def recorded_serp_html(query: str) -> str:
+    """
+    A recorded Google result page (benchmarks/fixtures/serp) for one of the
+    webScraper query templates, with the company from `query` filled in.
+    """
+    match = re.search(r"involving (.+)$", query)
+    category = "risk" if match else "resilience"
+    company = match.group(1) if match else query.split(" compliance certification")[0]
+    pages = _load_serp_fixtures()[category]
+    page = pages[zlib.crc32(company.encode()) % len(pages)]
+    slug = re.sub(r"[^a-z0-9]+", "-", company.lower()).strip("-")
+    return (
+        page.replace("{query}", query).replace("{company}", company)
+        .replace("{slug}", slug).replace("{slug_len}", str(len(slug)))
+    )
+
+
+def _serp_query(body: bytes) -> str:
+    """The Google query inside a Bright Data request body."""
+    try:
+        url = json.loads(body)["url"]
+        return urllib.parse.parse_qs(urllib.parse.urlparse(url).query)["q"][0]
+    except (ValueError, KeyError, IndexError):
+        return body.decode("utf-8", "ignore")[-60:]
+
+
+class MockSerpServer:
+    """
+    Local stand-in for the Bright Data request API. Every POST sleeps `latency`
+    seconds and returns `render(query)`, a synthetic result page by default
+    (recorded_serp_html serves the fixtures). Use as a context manager;
+    `url` is what BRIGHT_DATA_URL should point at.
+    """
+
+    def __init__(self, latency: float = 0.5, results: int = 10, render=None):
+        latency_s, result_count = latency, results
+        render = render or (lambda query: serp_html(query, result_count))
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                server.requests += 1
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                time.sleep(latency_s)
+                payload = render(_serp_query(body)).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/request"
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class MockOpenAIServer:
+    """
+    Local stand-in for the OpenAI chat completions API. Each POST sleeps
+    `latency` seconds; a `rate_limit` fraction of them answer 429. Successful
+    calls return `content` (default: RISK_ASSESSMENT as JSON) as the message.
+    The response_format of every request is kept in `response_formats`.
+    `base_url` is what OPENAI_BASE_URL should point at.
+    """
+
+    def __init__(self, latency: float = 0.3, rate_limit: float = 0.0, seed: int = 7, content: str = None):
+        import random
+        rng = random.Random(seed)
+        rng_lock = threading.Lock()
+        self.requests = 0
+        self.rate_limited = 0
+        self.response_formats = []
+        content = json.dumps(RISK_ASSESSMENT) if content is None else content
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with rng_lock:
+                    server.requests += 1
+                    server.response_formats.append(request.get("response_format"))
+                    limited = rng.random() < rate_limit
+                    server.rate_limited += limited
+                time.sleep(latency)
+                if limited:
+                    status, body = 429, {"error": {"message": "Rate limit reached", "type": "requests"}}
+                else:
+                    status, body = 200, {
+                        "id": "chatcmpl-bench", "object": "chat.completion", "created": 0, "model": "gpt-4o-mini",
+                        "choices": [{"index": 0, "finish_reason": "stop",
+                                     "message": {"role": "assistant", "content": content}}],
+                        "usage": {"prompt_tokens": 900, "completion_tokens": 120, "total_tokens": 1020},
+                    }
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+# ─────────────────────────────────────────────
+# Contract PDFs
+# ─────────────────────────────────────────────
+CONTRACT_ARTICLES = [
+    "Definitions", "Term and Termination", "Fees and Payment", "Confidentiality", "Data Protection",
+    "Indemnification", "Limitation of Liability", "Warranties", "Insurance", "Governing Law",
+]
+CONTRACT_PHRASES = [
+    "the Supplier shall", "the Customer may", "upon thirty (30) days written notice", "in accordance with Schedule B",
+    "subject to Section {ref}", "any Confidential Information", "the aggregate liability", "shall not exceed the fees paid",
+    "personal data processed on behalf of the Customer", "a material breach that remains uncured", "invoices are payable",
+    "within sixty (60) days", "reasonable security measures", "except for gross negligence or wilful misconduct",
+    "the laws of the State of California", "commercially reasonable efforts", "renews automatically for successive terms",
+]
+
+
+def contract_clauses(article_count: int = 10, clauses_per_article: int = 12, seed: int = 0):
+    """Deterministic (heading, [clause text]) articles that read like an MSA."""
+    articles = []
+    for a in range(article_count):
+        title = CONTRACT_ARTICLES[(a + seed) % len(CONTRACT_ARTICLES)]
+        clauses = []
+        for c in range(clauses_per_article):
+            words = [
+                CONTRACT_PHRASES[(a * 7 + c * 3 + k + seed) % len(CONTRACT_PHRASES)].format(ref=f"{(a + k) % 9 + 1}.{c + 1}")
+                for k in range(6)
+            ]
+            clauses.append(f"{a + 1}.{c + 1} {title}. " + ", ".join(words) + ".")
+        articles.append((f"ARTICLE {a + 1}. {title.upper()}", clauses))
+    return articles
+
+
+def contract_lines(pages: int, lines_per_page: int = 45, seed: int = 0):
+    """`pages` pages of contract text as lists of lines (clauses wrapped at ~90 chars)."""
+    lines = []
+    articles = contract_clauses(article_count=max(1, pages * lines_per_page // 60) + 1, seed=seed)
+    for heading, clauses in articles:
+        lines.append(heading)
+        for clause in clauses:
+            line = ""
+            for word in clause.split():
+                if len(line) + len(word) > 90:
+                    lines.append(line)
+                    line = ""
+                line = f"{line} {word}" if line else word
+            lines.append(line)
+    return [lines[p * lines_per_page:(p + 1) * lines_per_page] for p in range(pages)]
+
+
+def write_contract_pdf(path: str, pages: int, lines_per_page: int = 45, seed: int = 0):
+    """
+    Write a text PDF (Helvetica, no dependencies) straight to `path`, one object
+    at a time. Returns the file size.
+    """
+    offsets = []
+    with open(path, "wb") as f:
+        def obj(number, body: bytes):
+            offsets.append((number, f.tell()))
+            f.write(f"{number} 0 obj\n".encode() + body + b"\nendobj\n")
+
+        f.write(b"%PDF-1.4\n")
+        obj(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        obj(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+        kids = []
+        for p, page_lines in enumerate(contract_lines(pages, lines_per_page, seed)):
+            content = ["BT /F1 10 Tf 12 TL 50 760 Td"]
+            for line in page_lines:
+                escaped = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+                content.append(f"({escaped}) '")
+            content.append("ET")
+            stream = "\n".join(content).encode("latin-1")
+            page_number, content_number = 4 + 2 * p, 5 + 2 * p
+            obj(content_number, f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream")
+            obj(page_number, (
+                f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_number} 0 R >>"
+            ).encode())
+            kids.append(f"{page_number} 0 R")
+        obj(2, f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {pages} >>".encode())
+
+        xref_at = f.tell()
+        size = 4 + 2 * pages
+        by_number = dict(offsets)
+        f.write(f"xref\n0 {size}\n0000000000 65535 f \n".encode())
+        for number in range(1, size):
+            f.write(f"{by_number[number]:010d} 00000 n \n".encode())
+        f.write(f"trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref_at}\n%%EOF\n".encode())
+        return f.tell()
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
@@ -1,8 +1,18 @@
 from dotenv import load_dotenv
-from chromadb import Client
+from chromadb import Client, PersistentClient
+from chromadb.errors import NotFoundError
 from chromadb.utils import embedding_functions
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
 import os
 import re
+import threading
+import time
+
+from utils.ttlCache import TTLCache
+from utils.metrics import track_dependency
 
 load_dotenv()
 print("loaded!--------------")
@@ -10,11 +20,37 @@ print("loaded!--------------")
 openai_api_key = os.getenv("OPENAI_API_KEY")
 if not openai_api_key:
     raise RuntimeError("⚠️ OPENAI_API_KEY is missing! Check .env or environment variables.")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+COLLECTION_CACHE_SIZE = int(os.getenv("CHROMA_COLLECTION_CACHE_SIZE", "256"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+EMBED_MAX_WORKERS = int(os.getenv("EMBED_MAX_WORKERS", "4"))
+# Set CHROMA_PERSIST_DIR (e.g. ./chroma_store) to keep embeddings across restarts and workers.
+CHROMA_PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR")
+# Company evidence collections not written to for this many seconds are dropped; 0 keeps them
+# forever. Only risk_docs_* collections expire: they are rebuilt from SERP, uploaded contracts are not.
+CHROMA_COLLECTION_TTL = float(os.getenv("CHROMA_COLLECTION_TTL", "0"))
+COMPANY_COLLECTION_PREFIX = "risk_docs_"
+
+# One embedding client for the whole process; the underlying OpenAI client is thread-safe.
 embedding_func = embedding_functions.OpenAIEmbeddingFunction(
     api_key=openai_api_key,
-    model_name="text-embedding-3-small"
+    model_name=EMBEDDING_MODEL
+)
+chroma = PersistentClient(path=CHROMA_PERSIST_DIR) if CHROMA_PERSIST_DIR else Client()
+
+# Query embeddings keyed by (model, text digest); EMBEDDING_CACHE_DB adds an on-disk tier.
+query_embedding_cache = TTLCache(
+    "query_embeddings",
+    max_size=int(os.getenv("EMBEDDING_CACHE_SIZE", "5000")),
+    ttl=float(os.getenv("EMBEDDING_CACHE_TTL", str(30 * 24 * 3600))),
+    db_path=os.getenv("EMBEDDING_CACHE_DB"),
 )
-chroma = Client()
+_embedding_counters = {"network_calls": 0, "embedded_tokens_est": 0, "saved_tokens_est": 0}
+_embedding_counters_lock = threading.Lock()
+
+# Bounded LRU of collection handles: collection name -> Collection
+_collections = OrderedDict()
+_collections_lock = threading.Lock()
 
 
 def sanitize_collection_name(name: str) -> str:
@@ -33,51 +69,357 @@ def sanitize_collection_name(name: str) -> str:
     clean = clean.strip('._-')
     return clean
 
-def get_company_collection(company_name: str):
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise ValueError("OPENAI_API_KEY not found. Ensure .env is loaded before using chromaClient.")
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), good enough for savings counters."""
+    return max(1, len(text) // 4)
+
+
+def embedding_cache_key(text: str) -> str:
+    model = getattr(embedding_func, "model_name", type(embedding_func).__name__)
+    return f"{model}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+
+def embed_queries(texts):
+    """
+    Embed query texts, serving repeats from the query embedding cache.
+    Only texts not seen before go to the embedding API, all in one call.
+    """
+    keys = [embedding_cache_key(text) for text in texts]
+    vectors = [None] * len(texts)
+    missing = []
+    saved_tokens = 0
+
+    for i, key in enumerate(keys):
+        cached, status = query_embedding_cache.get(key)
+        if status == "hit":
+            vectors[i] = cached
+            saved_tokens += estimate_tokens(texts[i])
+        else:
+            missing.append(i)
+
+    embedded_tokens = 0
+    if missing:
+        with track_dependency("openai", "embeddings"):
+            fresh = embedding_func([texts[i] for i in missing])
+        for i, vector in zip(missing, fresh):
+            vectors[i] = [float(x) for x in vector]
+            query_embedding_cache.set(keys[i], vectors[i])
+            embedded_tokens += estimate_tokens(texts[i])
+
+    with _embedding_counters_lock:
+        _embedding_counters["network_calls"] += 1 if missing else 0
+        _embedding_counters["embedded_tokens_est"] += embedded_tokens
+        _embedding_counters["saved_tokens_est"] += saved_tokens
+
+    return vectors
+
+
+def embedding_cache_stats() -> dict:
+    with _embedding_counters_lock:
+        counters = dict(_embedding_counters)
+    return {**query_embedding_cache.stats(), **counters}
+
+
+def set_embedding_function(func):
+    """Replace the shared embedding function (e.g. with a local stub) and drop cached handles."""
+    global embedding_func
+    with _collections_lock:
+        embedding_func = func
+        _collections.clear()
+
+
+def get_collection(name: str, create: bool = True):
+    """
+    Return a cached handle for collection `name`, creating the collection if needed.
+    With create=False a missing (or expired) collection returns None instead.
+    """
+    with _collections_lock:
+        collection = _collections.get(name)
+        if collection is not None:
+            if not is_collection_stale(collection):
+                _collections.move_to_end(name)
+                return collection
+            # Expired while cached (long-running process): reload it below, which
+            # re-reads updated_at (another worker may have written) and drops it if still stale
+            _collections.pop(name, None)
 
-    embedding_func = embedding_functions.OpenAIEmbeddingFunction(
-        api_key=api_key,
-        model_name="text-embedding-3-small"
+    if create:
+        collection = chroma.get_or_create_collection(
+            name=name,
+            embedding_function=embedding_func
+        )
+    else:
+        try:
+            collection = chroma.get_collection(name=name, embedding_function=embedding_func)
+        except (NotFoundError, ValueError):
+            return None
+    if is_collection_stale(collection):
+        print(f"🧹 Collection {name} is older than {CHROMA_COLLECTION_TTL}s, starting fresh")
+        chroma.delete_collection(name)
+        if not create:
+            return None
+        collection = chroma.get_or_create_collection(
+            name=name,
+            embedding_function=embedding_func
+        )
+
+    with _collections_lock:
+        _collections[name] = collection
+        _collections.move_to_end(name)
+        while len(_collections) > COLLECTION_CACHE_SIZE:
+            _collections.popitem(last=False)
+    return collection
+
+
+def is_collection_stale(collection, now=None) -> bool:
+    """True when CHROMA_COLLECTION_TTL is set and a company collection's last write is older than it."""
+    if not CHROMA_COLLECTION_TTL or not collection.name.startswith(COMPANY_COLLECTION_PREFIX):
+        return False
+    updated_at = (collection.metadata or {}).get("updated_at")
+    return updated_at is not None and (now or time.time()) - updated_at > CHROMA_COLLECTION_TTL
+
+
+def mark_collection_updated(collection):
+    """Record the last write time in the collection metadata (drives the TTL above)."""
+    metadata = dict(collection.metadata or {})
+    metadata["updated_at"] = time.time()
+    collection.modify(metadata=metadata)
+
+
+def evict_stale_collections() -> int:
+    """Delete every company collection past CHROMA_COLLECTION_TTL. Returns how many were removed."""
+    if not CHROMA_COLLECTION_TTL:
+        return 0
+
+    now = time.time()
+    evicted = 0
+    for collection in chroma.list_collections():
+        if is_collection_stale(collection, now):
+            chroma.delete_collection(collection.name)
+            with _collections_lock:
+                _collections.pop(collection.name, None)
+            evicted += 1
+    return evicted
+
+
+def warm_start() -> dict:
+    """
+    Evict stale collections, preload handles for the rest and report what was restored.
+    Called once at API startup.
+    """
+    start = time.perf_counter()
+    evicted = evict_stale_collections()
+
+    collections = chroma.list_collections()
+    vectors = 0
+    for collection in collections:
+        vectors += collection.count()
+    for collection in collections[:COLLECTION_CACHE_SIZE]:
+        get_collection(collection.name)
+
+    report = {
+        "persistent": bool(CHROMA_PERSIST_DIR),
+        "path": CHROMA_PERSIST_DIR,
+        "collections": len(collections),
+        "vectors": vectors,
+        "evicted": evicted,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+    print(
+        f"🗄️ Chroma warm start: restored {report['collections']} collections / "
+        f"{report['vectors']} vectors, evicted {evicted} stale, in {report['seconds']}s"
     )
+    return report
+
 
+def get_company_collection(company_name: str):
     # ✅ Sanitize the name safely
-    safe_name = f"risk_docs_{sanitize_collection_name(company_name)}"
+    safe_name = f"{COMPANY_COLLECTION_PREFIX}{sanitize_collection_name(company_name)}"
+    return get_collection(safe_name)
+
+def get_user_contracts_collection(user_id: str, create: bool = True):
+    """Chunks of every contract a user has uploaded (None with create=False if they have none)."""
+    return get_collection(f"contracts_{sanitize_collection_name(user_id)}", create=create)
+
+
+def make_doc_id(company, text, url=None):
+    """
+    Content-addressed id: identical evidence gets the same id in every process and
+    across restarts (unlike the salted built-in hash()).
+    """
+    normalized = " ".join(str(text).split()).lower()
+    digest = hashlib.sha256(f"{normalized}\n{url or ''}".encode("utf-8")).hexdigest()[:32]
+    return f"{sanitize_collection_name(company)}_{digest}"
+
+
+def upsert_many(company, texts, metadatas, batch_size=None, max_workers=None):
+    """
+    Store many documents for a company with one embedding call and one write per batch.
+    Documents whose id is already in the collection are skipped without embedding;
+    new ones are embedded in batches (up to `max_workers` at a time) and upserted.
+
+    Returns:
+        list[str]: document ids, in the same order as `texts`.
+    """
+    return upsert_documents(company, texts, metadatas, batch_size, max_workers)[0]
+
+
+def upsert_documents(company, texts, metadatas, batch_size=None, max_workers=None):
+    """
+    upsert_many that also reports how many documents were not stored before.
+
+    Returns:
+        tuple[list[str], int]: document ids in the same order as `texts`, and the new-document count.
+    """
+    if not texts:
+        return [], 0
+
+    collection = get_company_collection(company)
+    ids = [
+        make_doc_id(company, text, (metadata or {}).get("url"))
+        for text, metadata in zip(texts, metadatas)
+    ]
+    new_count, existing_count = _upsert_new(collection, ids, texts, metadatas, batch_size, max_workers)
+    print(f"💾 {company}: embedded {new_count} new documents, skipped {existing_count} already stored")
+    return ids, new_count
+
+
+def upsert_contract_chunks(user_id, texts, metadatas, batch_size=None, max_workers=None):
+    """
+    Store chunks of a user's contract in their contracts collection.
+    Each metadata needs file_name, page and chunk; re-ingesting an unchanged
+    file embeds nothing.
+
+    Returns:
+        tuple[list[str], int]: chunk ids in the same order as `texts`, and the new-chunk count.
+    """
+    if not texts:
+        return [], 0
+
+    collection = get_user_contracts_collection(user_id)
+    ids = [
+        make_doc_id(user_id, text, f"{m['file_name']}#p{m['page']}.{m['chunk']}")
+        for text, m in zip(texts, metadatas)
+    ]
+    new_count, _ = _upsert_new(collection, ids, texts, metadatas, batch_size, max_workers)
+    return ids, new_count
+
+
+def prune_contract_chunks(user_id, file_name, keep_ids) -> int:
+    """Delete a file's chunks that are not in `keep_ids` (left over from an older version). Returns how many."""
+    collection = get_user_contracts_collection(user_id)
+    with track_dependency("chroma", "get"):
+        stored = collection.get(where={"file_name": file_name}, include=[])["ids"]
+    keep = set(keep_ids)
+    stale = [doc_id for doc_id in stored if doc_id not in keep]
+    if stale:
+        with track_dependency("chroma", "delete"):
+            collection.delete(ids=stale)
+    return len(stale)
+
+
+def _upsert_new(collection, ids, texts, metadatas, batch_size=None, max_workers=None):
+    """
+    Embed and upsert the documents whose id is not in `collection` yet.
+    Returns (new count, already-stored count).
+    """
+    batch_size = batch_size or EMBED_BATCH_SIZE
+    max_workers = max_workers or EMBED_MAX_WORKERS
+
+    # Chroma rejects duplicate ids inside one write, so keep the first occurrence only
+    unique = {}
+    for doc_id, text, metadata in zip(ids, texts, metadatas):
+        unique.setdefault(doc_id, (text, metadata))
+
+    # Unchanged evidence is already embedded; don't pay for it again
+    with track_dependency("chroma", "get"):
+        existing = set(collection.get(ids=list(unique), include=[])["ids"])
+    new_ids = [doc_id for doc_id in unique if doc_id not in existing]
+
+    def write_batch(start):
+        batch_ids = new_ids[start:start + batch_size]
+        batch_texts = [unique[i][0] for i in batch_ids]
+        with track_dependency("openai", "embeddings"):
+            embeddings = embedding_func(batch_texts)
+        with track_dependency("chroma", "upsert"):
+            collection.upsert(
+                ids=batch_ids,
+                documents=batch_texts,
+                metadatas=[unique[i][1] for i in batch_ids],
+                embeddings=embeddings,
+            )
+
+    starts = list(range(0, len(new_ids), batch_size))
+    if len(starts) == 1:
+        write_batch(0)
+    elif starts:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(starts))) as pool:
+            list(pool.map(write_batch, starts))
+
+    if new_ids:
+        mark_collection_updated(collection)
+    return len(new_ids), len(existing)
 
-    collection = chroma.get_or_create_collection(
-        name=safe_name,
-        embedding_function=embedding_func
-    )
-    return collection
 
 # storing collection within collection
 def upsert_into_chroma(company, text, metadata):
-    collection = get_company_collection(company)
-    doc_id = f"{company}_{hash(text)}"
-    collection.add(documents=[text], metadatas=[metadata], ids=[doc_id])
-    return doc_id
+    return upsert_many(company, [text], [metadata])[0]
 
-def query_chroma(query_text, company, top_k=5, where=None):
-    collection = get_company_collection(company)
+def query_chroma_many(company, queries):
+    """
+    Run several retrieval queries against a company's collection at once.
+    All query texts are embedded in a single call (repeats come from the
+    query embedding cache); queries that share the same
+    `where` filter go to Chroma in a single collection.query.
 
-    query_args = {
-        "query_texts": [query_text],
-        "n_results": top_k,
-    }
+    Args:
+        company (str): Company whose collection is searched.
+        queries (list[dict]): {"query_text": str, "top_k": int (default 5), "where": dict | None}
+
+    Returns:
+        list[list[dict]]: one result list per query, in the same order.
+    """
+    if not queries:
+        return []
 
-    if where:
-        query_args["where"] = where
+    collection = get_company_collection(company)
+    query_embeddings = embed_queries([q["query_text"] for q in queries])
 
-    results = collection.query(**query_args)
+    # Group query positions by filter so each distinct filter is one query call
+    groups = {}
+    for position, q in enumerate(queries):
+        groups.setdefault(json.dumps(q.get("where"), sort_keys=True), []).append(position)
 
-    docs = [
-        {
-            "doc": d,
-            "score": results["distances"][0][i],
-            "metadata": results["metadatas"][0][i],
+    grouped_results = [[] for _ in queries]
+    for where_key, positions in groups.items():
+        query_args = {
+            "query_embeddings": [query_embeddings[p] for p in positions],
+            "n_results": max(queries[p].get("top_k", 5) for p in positions),
         }
-        for i, d in enumerate(results["documents"][0])
-    ]
-    return docs
+        where = json.loads(where_key)
+        if where:
+            query_args["where"] = where
+
+        with track_dependency("chroma", "query"):
+            results = collection.query(**query_args)
+
+        for row, position in enumerate(positions):
+            docs = [
+                {
+                    "id": results["ids"][row][i],
+                    "doc": d,
+                    "score": results["distances"][row][i],
+                    "metadata": results["metadatas"][row][i],
+                }
+                for i, d in enumerate(results["documents"][row])
+            ]
+            grouped_results[position] = docs[:queries[position].get("top_k", 5)]
+
+    return grouped_results
+
+
+def query_chroma(query_text, company, top_k=5, where=None):
+    return query_chroma_many(
+        company,
+        [{"query_text": query_text, "top_k": top_k, "where": where}]
+    )[0]
@@ -0,0 +1,303 @@
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from db.chromaClient import get_user_contracts_collection, embed_queries
+from utils.metrics import track_dependency
+
+# Chunks are packed from whole clauses up to CLAUSE_CHUNK_CHARS; the tail of each
+# chunk is repeated at the start of the next one within the same section.
+CLAUSE_CHUNK_CHARS = int(os.getenv("CLAUSE_CHUNK_CHARS", "900"))
+CLAUSE_OVERLAP_CHARS = int(os.getenv("CLAUSE_OVERLAP_CHARS", "150"))
+CLAUSE_TOP_K = int(os.getenv("CLAUSE_TOP_K", "6"))
+CLAUSE_INDEX_CACHE_SIZE = int(os.getenv("CLAUSE_INDEX_CACHE_SIZE", "64"))  # users with an index in memory
+CLAUSE_INDEX_TTL = float(os.getenv("CLAUSE_INDEX_TTL", "300"))  # rebuilt after this, for other workers' uploads
+BM25_K1, BM25_B = 1.5, 0.75
+RRF_K = 60  # reciprocal rank fusion: score = sum(1 / (RRF_K + rank))
+
+# "ARTICLE 3. FEES AND PAYMENT", "Section 12 - Governing Law", "7. CONFIDENTIALITY", "GOVERNING LAW"
+SECTION_HEADING_PATTERNS = [
+    # keyword + number + an optional Title Case title; "Section 4.7 of this Agreement, ..." is body text
+    re.compile(
+        r"^(?i:article|section|schedule|exhibit|annex|appendix)\s+(?:\d+(?:\.\d+)*|[IVXLC]+|[A-Z])\.?"
+        r"(?:\s*[-–:]?\s*[A-Z][\w&'/\-]*(?:\s+(?:[A-Z][\w&'/\-]*|of|and|or|the|to|for|in|on))*)?$"
+    ),
+    re.compile(r"^\d{1,2}\.?\s+[A-Z][A-Z0-9 &,'/\-]{2,80}$"),
+    re.compile(r"^[A-Z][A-Z0-9 &,'/\-]{3,80}$"),
+]
+# "4.2 The Supplier shall...", "(a) any ...", "12. Notices. All notices..."
+CLAUSE_START_PATTERN = re.compile(r"^(?:\(?\d+(?:\.\d+)+\)?|\d+\.|\([a-z]{1,3}\))\s")
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or shall that the this to was will with"
+    " what which who does do our my we i".split()
+)
+
+
+def tokenize(text: str):
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def is_section_heading(line: str) -> bool:
+    return len(line) <= 100 and any(p.match(line) for p in SECTION_HEADING_PATTERNS)
+
+
+# ─────────────────────────────────────────────
+# Chunking
+# ─────────────────────────────────────────────
+class ClauseChunker:
+    """
+    Turns a contract's pages (fed in page order) into overlapping clause chunks:
+    {"text", "section", "page", "page_end"}. A new section always starts a new
+    chunk, without overlap, so a chunk never mixes two sections.
+    """
+
+    def __init__(self, max_chars: int = None, overlap_chars: int = None):
+        self.max_chars = max_chars or CLAUSE_CHUNK_CHARS
+        self.overlap_chars = min(overlap_chars if overlap_chars is not None else CLAUSE_OVERLAP_CHARS,
+                                 self.max_chars // 2)
+        self.section = ""
+        self._unit, self._unit_page = [], None  # clause being read: lines, page it started on
+        self._units = []                        # (text, page) waiting for the current chunk
+        self._overlap = ""
+        self._out = []
+
+    def add_page(self, page_number: int, text: str):
+        """Feed one page; returns the chunks it completed."""
+        for line in text.splitlines():
+            line = " ".join(line.split())
+            if not line:
+                continue
+            if is_section_heading(line):
+                self._close_unit()
+                self._emit(carry=False)
+                self.section = line
+            elif CLAUSE_START_PATTERN.match(line) or not self._unit:
+                self._close_unit()
+                self._unit, self._unit_page = [line], page_number
+            else:
+                self._unit.append(line)
+        return self._drain()
+
+    def finish(self):
+        """Chunks left at the end of the document."""
+        self._close_unit()
+        self._emit(carry=False)
+        return self._drain()
+
+    def _close_unit(self):
+        if not self._unit:
+            return
+        text, page = " ".join(self._unit), self._unit_page
+        self._unit = []
+        while len(text) + len(self._overlap) > self.max_chars:
+            # A clause longer than a chunk gets chunks of its own, cut between words
+            self._emit(carry=True)
+            room = self.max_chars - len(self._overlap) - 1
+            cut = text.rfind(" ", 0, room)
+            cut = cut if cut > 0 else room
+            self._units.append((text[:cut], page))
+            self._emit(carry=True)
+            text = text[cut:].strip()
+        if self._units and self._pending_chars() + len(text) + len(self._overlap) > self.max_chars:
+            self._emit(carry=True)
+        if text:
+            self._units.append((text, page))
+
+    def _pending_chars(self) -> int:
+        return sum(len(text) + 1 for text, _ in self._units)
+
+    def _emit(self, carry: bool):
+        if not self._units:
+            self._overlap = ""
+            return
+        body = "\n".join(text for text, _ in self._units)
+        self._out.append({
+            "text": f"{self._overlap} {body}" if self._overlap else body,
+            "section": self.section,
+            "page": self._units[0][1],
+            "page_end": self._units[-1][1],
+        })
+        self._units = []
+        self._overlap = ""
+        if carry and self.overlap_chars:
+            tail = body[-self.overlap_chars:]
+            self._overlap = tail[tail.find(" ") + 1:] if len(body) > self.overlap_chars else tail
+
+    def _drain(self):
+        out, self._out = self._out, []
+        return out
+
+
+# ─────────────────────────────────────────────
+# Hybrid index
+# ─────────────────────────────────────────────
+class ClauseIndex:
+    """
+    One user's contract chunks: BM25 postings in memory (a numpy array of doc
+    positions and precomputed weights per term) plus the Chroma collection for
+    vector search. Rankings are fused with reciprocal rank fusion.
+    """
+
+    def __init__(self, user_id: str, ids, documents, metadatas):
+        self.user_id = user_id
+        self.ids, self.documents, self.metadatas = list(ids), list(documents), list(metadatas)
+        self.positions = {doc_id: i for i, doc_id in enumerate(self.ids)}
+        self.file_names = np.array([m.get("file_name", "") for m in self.metadatas], dtype=object)
+        self.built_at = time.monotonic()
+
+        term_counts = [Counter(tokenize(f"{m.get('section', '')} {doc}")) for doc, m in zip(self.documents, self.metadatas)]
+        lengths = np.array([sum(c.values()) for c in term_counts], dtype=np.float32)
+        avg_length = float(lengths.mean()) if len(lengths) else 0.0
+        norms = BM25_K1 * (1 - BM25_B + BM25_B * lengths / (avg_length or 1.0))
+
+        postings = {}
+        for position, counts in enumerate(term_counts):
+            for term, tf in counts.items():
+                postings.setdefault(term, ([], []))
+                postings[term][0].append(position)
+                postings[term][1].append(tf)
+        self.postings = {}
+        for term, (positions, tfs) in postings.items():
+            positions = np.array(positions, dtype=np.int32)
+            tfs = np.array(tfs, dtype=np.float32)
+            idf = np.log(1 + (len(self.ids) - len(positions) + 0.5) / (len(positions) + 0.5))
+            self.postings[term] = (positions, (idf * tfs * (BM25_K1 + 1) / (tfs + norms[positions])).astype(np.float32))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def bm25(self, query: str, limit: int, file_name: str = None):
+        """Positions of the best BM25 matches, best first."""
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for term in set(tokenize(query)):
+            if term in self.postings:
+                positions, weights = self.postings[term]
+                scores[positions] += weights
+        if file_name is not None:
+            scores[self.file_names != file_name] = 0
+        matched = np.flatnonzero(scores)
+        if len(matched) > limit:
+            matched = matched[np.argpartition(-scores[matched], limit - 1)[:limit]]
+        return matched[np.argsort(-scores[matched], kind="stable")].tolist()
+
+    def vector(self, query_embedding, limit: int, file_name: str = None):
+        """Positions of the nearest chunks in the Chroma collection, best first."""
+        query_args = {"query_embeddings": [query_embedding], "n_results": min(limit, len(self.ids)), "include": []}
+        if file_name is not None:
+            query_args["where"] = {"file_name": file_name}
+        collection = get_user_contracts_collection(self.user_id, create=False)
+        if collection is None:
+            return []
+        with track_dependency("chroma", "query"):
+            ids = collection.query(**query_args)["ids"][0]
+        return [self.positions[doc_id] for doc_id in ids if doc_id in self.positions]
+
+    def search(self, query: str, top_k: int = None, file_name: str = None, query_embedding=None):
+        """
+        Hybrid search: [{"id", "doc", "metadata", "score", "bm25_rank", "vector_rank"}], best first.
+        Ranks are 1-based, None when that retriever did not return the chunk.
+        """
+        top_k = top_k or CLAUSE_TOP_K
+        if not self.ids:
+            return []
+        limit = max(4 * top_k, 20)
+        if query_embedding is None:
+            query_embedding = embed_queries([query])[0]
+
+        rankings = {"bm25_rank": self.bm25(query, limit, file_name), "vector_rank": self.vector(query_embedding, limit, file_name)}
+        fused = {}
+        for name, positions in rankings.items():
+            for rank, position in enumerate(positions, start=1):
+                entry = fused.setdefault(position, {"score": 0.0, "bm25_rank": None, "vector_rank": None})
+                entry["score"] += 1 / (RRF_K + rank)
+                entry[name] = rank
+
+        best = sorted(fused.items(), key=lambda item: -item[1]["score"])[:top_k]
+        return [
+            {
+                "id": self.ids[position],
+                "doc": self.documents[position],
+                "metadata": self.metadatas[position],
+                **entry,
+            }
+            for position, entry in best
+        ]
+
+
+# ─────────────────────────────────────────────
+# Per-user indexes
+# ─────────────────────────────────────────────
+_indexes = OrderedDict()  # user_id -> ClauseIndex
+_indexes_lock = threading.Lock()
+_build_locks = {}  # user_id -> Lock, so concurrent first queries build once
+_counters = {"hits": 0, "builds": 0, "invalidations": 0}
+
+
+def get_clause_index(user_id: str) -> Optional[ClauseIndex]:
+    """
+    The user's clause index, built from their contracts collection on first use.
+    None when the user has no contracts collection (nothing is created for them).
+    """
+    with _indexes_lock:
+        index = _indexes.get(user_id)
+        if index is not None and time.monotonic() - index.built_at < CLAUSE_INDEX_TTL:
+            _indexes.move_to_end(user_id)
+            _counters["hits"] += 1
+            return index
+
+    collection = get_user_contracts_collection(user_id, create=False)
+    if collection is None:
+        return None
+    with _indexes_lock:
+        build_lock = _build_locks.setdefault(user_id, threading.Lock())
+
+    with build_lock:
+        with _indexes_lock:
+            index = _indexes.get(user_id)
+            if index is not None and time.monotonic() - index.built_at < CLAUSE_INDEX_TTL:
+                return index
+
+        start = time.perf_counter()
+        with track_dependency("chroma", "get"):
+            stored = collection.get(include=["documents", "metadatas"])
+        index = ClauseIndex(user_id, stored["ids"], stored["documents"], stored["metadatas"])
+        print(f"📚 Clause index for {user_id}: {len(index)} chunks in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+        with _indexes_lock:
+            _indexes[user_id] = index
+            _indexes.move_to_end(user_id)
+            _counters["builds"] += 1
+            while len(_indexes) > CLAUSE_INDEX_CACHE_SIZE:
+                evicted, _ = _indexes.popitem(last=False)
+                _build_locks.pop(evicted, None)
+        return index
+
+
+def invalidate(user_id: str):
+    """Drop the user's index (their contracts changed); the next search rebuilds it."""
+    with _indexes_lock:
+        if _indexes.pop(user_id, None) is not None:
+            _counters["invalidations"] += 1
+
+
+def search_clauses(user_id: str, query: str, top_k: int = None, file_name: str = None):
+    """Hybrid BM25 + vector search over the clauses of a user's uploaded contracts; [] if they have none."""
+    if not user_id:
+        return []
+    index = get_clause_index(user_id)
+    return index.search(query, top_k=top_k, file_name=file_name) if index is not None else []
+
+
+def clause_index_stats() -> dict:
+    with _indexes_lock:
+        return {
+            "users": len(_indexes),
+            "chunks": sum(len(index) for index in _indexes.values()),
+            **_counters,
+        }
@@ -473,26 +473,66 @@
 
 from langgraph.graph import StateGraph, END
 from datetime import datetime
-from typing import TypedDict, List, Any, Literal
+from typing import TypedDict, List, Any, Literal, Optional, Annotated
 from urllib.parse import urlparse
+import functools
 import random
 import json
 import re
 import os
+import asyncio
 
-from langgraph.checkpoint.memory import MemorySaver
 from langchain_openai import ChatOpenAI
+from pydantic import BaseModel, Field
+from langgraph.types import Overwrite
 
 # Import your custom utilities
-from utils.webScraper import get_company_data
-from db.chromaClient import upsert_into_chroma, query_chroma
-from utils.jsonConverter import call_llm_as_json
-
-llm = ChatOpenAI(model="gpt-4o-mini", temperature=0, api_key=os.getenv("OPENAI_API_KEY"))
+from utils.webScraper import get_company_data, aget_company_data
+from db.chromaClient import upsert_documents, query_chroma_many, embed_queries
+from db.clauseIndex import search_clauses
+from utils.jsonConverter import (
+    call_llm_as_json,
+    acall_llm_as_json,
+    parse_llm_json,
+    stream_llm_json,
+    astream_llm_json,
+    IncrementalJSONFields,
+    RISK_ASSESSMENT_SCHEMA,
+    record_parse_failure,
+)
+from utils.responseCache import ResponseCache
+from utils.metrics import instrument_node, LLMMetricsCallback
+from utils.reportCache import lookup_report, remember_report
+from utils import speculative
+from graphs.registry import get_compiled_graph, shared_checkpointer
+
+llm = ChatOpenAI(
+    model="gpt-4o-mini", temperature=0, api_key=os.getenv("OPENAI_API_KEY"), callbacks=[LLMMetricsCallback()]
+)
+
+# Classification and chatbot replies are temperature-0 calls, so repeated questions are cached.
+# RESPONSE_CACHE_SEMANTIC_THRESHOLD (e.g. 0.95) also serves close paraphrases of chatbot questions.
+_semantic_threshold = os.getenv("RESPONSE_CACHE_SEMANTIC_THRESHOLD")
+response_cache = ResponseCache(
+    "llm_responses",
+    max_size=int(os.getenv("RESPONSE_CACHE_SIZE", "1000")),
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", str(24 * 3600))),
+    embed=embed_queries if _semantic_threshold else None,
+    semantic_threshold=float(_semantic_threshold) if _semantic_threshold else None,
+)
+
+# Look up evidence already stored for the company while the new SERP results are
+# fetched and ingested; if the ingest adds nothing new, that lookup is the context.
+PARALLEL_RETRIEVAL = os.getenv("CHAT_PARALLEL_RETRIEVAL", "1") != "0"
 
 # ─────────────────────────────────────────────
 # Define Chat State
 # ─────────────────────────────────────────────
+def merge_stage_metrics(current: dict, update: dict) -> dict:
+    """Reducer for stage_metrics: parallel branches report their timings in the same step."""
+    return {**(current or {}), **(update or {})}
+
+
 class ChatState(TypedDict, total=False):
     user_id: str
     company_name: str
@@ -509,139 +549,345 @@ class ChatState(TypedDict, total=False):
     intent: str
     verified_findings: Any
     unverified_findings: Any
+    classified_by: str
+    stage_metrics: Annotated[dict, merge_stage_metrics]
+    existing_context: Any
+    new_doc_count: int
+    context_reused: bool
+    contract_sources: Any
+
+# Everything a turn computes. The checkpointer keeps a user's state between
+# messages (thread_id=user_id), so each new message clears these first.
+TURN_STATE_KEYS = [
+    key for key in ChatState.__annotations__ if key not in ("user_id", "messages", "temp_memory", "stage_metrics")
+]
 
 # ─────────────────────────────────────────────
-# Classification and Routing
+# General Conversation
 # ─────────────────────────────────────────────
-def classify_question_node(state: ChatState) -> ChatState:
-    """Decides whether user is asking about risk analysis or something general."""
+def build_chatbot_prompt(user_message: str) -> str:
+    return f"""
+    You are a Contract Risk Analyzer Chatbot that answers questions related to contracts, 
+    risk analysis, and your capabilities.
     
-    user_msg = state["messages"][-1]["content"]
-
-    msg = f"""
-    Your job is to classify the user's request into one of: 
-    - "risk": if the user is asking about risk analysis of a company.
-    - "other": for greetings, unrelated messages, or general help.
+    This tool helps companies understand risks when contracting with other companies.
+    Give a reply in 2-3 sentences, keep it professional.
 
-    Here are examples:
-    1. "I want to analyze Apple inc" → risk
-    2. "analysis tesla?" → risk
-    3. "what is contract" → other
-    4. "what can u do?" → other
-    5. "Hi, how are you?" → other
+    Answer this question: {user_message}
+    """
 
-    Now classify this message:
-    "{user_msg}"
 
-    Respond with only one word from [risk, other].
-    """
-    
-    res = llm.invoke(msg)
-    label = res.content.strip().lower()
-    print(f"Classifier detected intent: {label}")
-    
-    state['intent'] = label
-    state['stage'] = 'classified'
+def apply_chatbot_reply(state: ChatState, content: str) -> ChatState:
+    state['assistant_reply'] = content.strip()
+    state['stage'] = 'completed'
     
     return state
 
 
-def router_node(state: ChatState) -> Literal["init_risk", "regular_chatbot"]:
-    """Routes based on intent."""
-    if state.get('intent') == 'risk':
-        return "init_risk"
-    else:
-        return "regular_chatbot"
-
-
+@instrument_node("regular_chatbot", graph="chat_risk")
 def regular_chatbot_node(state: ChatState) -> ChatState:
     """Handles general conversation."""
-    user_message = state['messages'][-1]["content"]
-    
-    msg = f"""
-    You are a Contract Risk Analyzer Chatbot that answers questions related to contracts, 
-    risk analysis, and your capabilities.
-    
-    This tool helps companies understand risks when contracting with other companies.
-    Give a reply in 2-3 sentences, keep it professional.
+    user_msg = state['messages'][-1]["content"]
+    reply = response_cache.get("regular_chatbot", user_msg, semantic=True)
+    if reply is None:
+        reply = llm.invoke(build_chatbot_prompt(user_msg)).content
+        response_cache.set("regular_chatbot", user_msg, reply, semantic=True)
+    return apply_chatbot_reply(state, reply)
+
+
+@instrument_node("regular_chatbot", graph="chat_risk")
+async def aregular_chatbot_node(state: ChatState) -> ChatState:
+    """Async version of regular_chatbot_node."""
+    user_msg = state['messages'][-1]["content"]
+    # The semantic tier may call the embedding API, so keep it off the event loop
+    reply = await asyncio.to_thread(response_cache.get, "regular_chatbot", user_msg, True)
+    if reply is None:
+        reply = (await llm.ainvoke(build_chatbot_prompt(user_msg))).content
+        await asyncio.to_thread(response_cache.set, "regular_chatbot", user_msg, reply, True)
+    return apply_chatbot_reply(state, reply)
 
-    Answer this question: {user_message}
+
+# ─────────────────────────────────────────────
+# Questions About the User's Own Contracts
+# ─────────────────────────────────────────────
+NO_CONTRACTS_REPLY = (
+    "I couldn't find any uploaded contracts to answer from. "
+    "Upload a contract PDF and ask again once it has been processed."
+)
+
+
+def build_contract_qa_prompt(question: str, clauses: list) -> str:
+    excerpts = "\n\n".join(
+        f"[{i}] {c['metadata'].get('contract_name')}, {c['metadata'].get('section') or 'no section'}, "
+        f"page {c['metadata'].get('page')}:\n{c['doc']}"
+        for i, c in enumerate(clauses, start=1)
+    )
+    return f"""
+    You are a Contract Risk Analyzer Chatbot answering questions about the user's own contracts.
+    Answer only from the excerpts below and cite them like [1]. If they don't answer the
+    question, say so plainly instead of guessing. Keep it to a short paragraph.
+
+    Excerpts:
+    {excerpts}
+
+    Question: {question}
     """
-    
-    res = llm.invoke(msg)
-    result = res.content.strip()
-    
-    state['assistant_reply'] = result
+
+
+def contract_sources(clauses: list) -> list:
+    return [
+        {
+            "contract_name": c["metadata"].get("contract_name"),
+            "file_name": c["metadata"].get("file_name"),
+            "section": c["metadata"].get("section"),
+            "page": c["metadata"].get("page"),
+            "score": round(c["score"], 5),
+        }
+        for c in clauses
+    ]
+
+
+def apply_contract_answer(state: ChatState, clauses: list, content: str = None) -> ChatState:
+    state['contract_sources'] = contract_sources(clauses)
+    state['assistant_reply'] = content.strip() if clauses else NO_CONTRACTS_REPLY
     state['stage'] = 'completed'
-    
     return state
 
 
+@instrument_node("contract_qa", graph="chat_risk")
+def contract_qa_node(state: ChatState) -> ChatState:
+    """Answer from the user's uploaded contracts: hybrid clause retrieval, then one grounded LLM call."""
+    question = state['messages'][-1]["content"]
+    clauses = search_clauses(state.get('user_id') or '', question)
+    if not clauses:
+        return apply_contract_answer(state, clauses)
+    return apply_contract_answer(state, clauses, llm.invoke(build_contract_qa_prompt(question, clauses)).content)
+
+
+@instrument_node("contract_qa", graph="chat_risk")
+async def acontract_qa_node(state: ChatState) -> ChatState:
+    """Async version of contract_qa_node."""
+    question = state['messages'][-1]["content"]
+    clauses = await asyncio.to_thread(search_clauses, state.get('user_id') or '', question)
+    if not clauses:
+        return apply_contract_answer(state, clauses)
+    return apply_contract_answer(state, clauses, (await llm.ainvoke(build_contract_qa_prompt(question, clauses))).content)
+
+
 # ─────────────────────────────────────────────
-# Risk Analysis Initialization
+# Combined Classification + Extraction (one LLM call, or none)
 # ─────────────────────────────────────────────
-def init_risk_node(state: ChatState) -> ChatState:
-    """Extract company name and criticality from user input."""
-    user_input = state['messages'][-1]['content']
-
-    msg = f"""
-    Extract company name and criticality from this statement:
-    {user_input}
-
-    - Company name: any real company name.
-    - Criticality: one of [high, medium, low].
-
-    Example inputs:
-    1. "Analyze Apple with high criticality"
-    2. "Risk assessment for Tesla, criticality is low"
-
-    Output strictly in JSON format:
-    {{
-        "companyName": "Tesla",
-        "criticality": "high"
-    }}
-    
-    If you cannot extract both values, use null for missing fields.
+class RequestIntent(BaseModel):
+    intent: Literal["risk", "contract", "other"] = Field(
+        description="risk: risk analysis of a company; contract: question about the user's own uploaded contracts; other: anything else"
+    )
+    company_name: Optional[str] = Field(None, description="Company to analyze, if any")
+    criticality: Optional[Literal["high", "medium", "low"]] = Field(None, description="Criticality of the relationship, if given")
+
+
+# "analyze Tesla with high criticality", "risk assessment for Apple Inc, criticality is low"
+QUICK_RISK_PATTERNS = [
+    re.compile(
+        r"^\s*(?:please\s+)?(?:analy[sz]e|assess|run (?:a )?risk (?:analysis|assessment) (?:on|for))\s+"
+        r"(?:(?:the\s+)?risks?\s+(?:of|for|in)\s+)?"  # "analyze the risk of Tesla ..." names Tesla
+        r"(?P<company>[\w&.,'\- ]+?)\s*,?\s+with\s+(?P<criticality>high|medium|low)\s+criticality\W*$",
+        re.IGNORECASE,
+    ),
+    re.compile(
+        r"^\s*risk (?:analysis|assessment) (?:of|for)\s+(?P<company>[\w&.'\- ]+?)\s*,\s*"
+        r"criticality (?:is\s+)?(?P<criticality>high|medium|low)\W*$",
+        re.IGNORECASE,
+    ),
+]
+# Only a message that is nothing but a greeting: "hi, analyze Tesla ..." still goes to the LLM
+QUICK_OTHER_PATTERN = re.compile(
+    r"^\s*(?:(?:hi|hello|hey)(?: there)?|thanks|thank you(?: (?:so|very) much)?|"
+    r"what can (?:you|u) do|what is (?:a )?contract)[\s,?!.]*$",
+    re.IGNORECASE,
+)
+# "what does my contract say about termination?", "in our MSA with Acme, who pays for insurance?"
+QUICK_CONTRACT_PATTERN = re.compile(
+    r"\b(?:my|our|the uploaded|uploaded)\s+(?:[\w\-]+\s+){0,2}(?:contracts?|agreements?|msas?|ndas?|sows?)\b",
+    re.IGNORECASE,
+)
+# ...unless it also asks for an analysis ("analyze Acme, our new supplier contract") — the LLM decides those
+QUICK_RISK_WORDS = re.compile(r"\b(?:risk|analy[sz]e|assess|evaluate|vet)\b", re.IGNORECASE)
+
+
+def quick_classify(user_msg: str) -> Optional[dict]:
+    """Rule-based pre-classifier for obvious inputs. Returns None when the LLM has to decide."""
+    for pattern in QUICK_RISK_PATTERNS:
+        match = pattern.match(user_msg)
+        if match:
+            return {
+                "intent": "risk",
+                "company_name": match.group("company").strip(" ,."),
+                "criticality": match.group("criticality").lower(),
+            }
+    if QUICK_OTHER_PATTERN.match(user_msg):
+        return {"intent": "other", "company_name": None, "criticality": None}
+    if QUICK_CONTRACT_PATTERN.search(user_msg) and not QUICK_RISK_WORDS.search(user_msg):
+        return {"intent": "contract", "company_name": None, "criticality": None}
+    return None
+
+
+def build_classify_extract_prompt(user_msg: str) -> str:
+    return f"""
+    Classify the user's request and extract the risk-analysis inputs.
+
+    intent:
+    - "risk": the user is asking about risk analysis of a company.
+    - "contract": the user is asking what their own uploaded contracts say (terms, clauses, dates, obligations).
+    - "other": greetings, unrelated messages, or general help.
+
+    company_name: any real company name mentioned, else null.
+    criticality: one of [high, medium, low] if stated, else null.
+
+    Examples:
+    1. "I want to analyze Apple inc" → risk, Apple Inc, null
+    2. "Risk assessment for Tesla, criticality is low" → risk, Tesla, low
+    3. "what is contract" → other
+    4. "Hi, how are you?" → other
+    5. "When can we terminate the Acme agreement?" → contract
+
+    Message:
+    "{user_msg}"
     """
 
-    res = llm.invoke(msg)
-    result = res.content
 
-    # Extract JSON from LLM output
-    try:
-        match = re.search(r'```json\s*(.*?)\s*```', result, re.DOTALL)
-        if match:
-            json_str = match.group(1)
-        else:
-            json_str = result
-            
-        data = json.loads(json_str)
-        company = data.get("companyName")
-        criticality = data.get("criticality")
-        
-        if company and criticality:
-            state['company_name'] = company
-            state['criticality'] = criticality.lower()
-            state['stage'] = 'risk_analysis'
-            state['assistant_reply'] = f"✅ Analyzing {company} with {criticality} criticality..."
-        else:
-            state['assistant_reply'] = (
-                "⚠️ Could not extract company name or criticality. "
-                "Please provide both, e.g., 'Analyze Tesla with high criticality'"
-            )
-            state['stage'] = 'awaiting_input'
-            
-    except Exception as e:
-        print(f"Error parsing LLM output: {e}")
+def apply_classification(state: ChatState, result: dict, source: str) -> ChatState:
+    """Write intent (and, for risk requests, company/criticality) onto the state."""
+    intent = (result.get("intent") or "other").strip().lower()
+    company = result.get("company_name")
+    criticality = result.get("criticality")
+    print(f"Classifier detected intent: {intent} (via {source})")
+
+    state['intent'] = intent
+    state['classified_by'] = source
+    state['stage'] = 'classified'
+
+    if intent != "risk":
+        return state
+
+    if company and criticality:
+        state['company_name'] = company
+        state['criticality'] = criticality.lower()
+        state['stage'] = 'risk_analysis'
+        state['assistant_reply'] = f"✅ Analyzing {company} with {criticality} criticality..."
+    else:
         state['assistant_reply'] = (
-            "⚠️ Could not parse your request. "
-            "Please specify company name and criticality (high/medium/low)."
+            "⚠️ Could not extract company name or criticality. "
+            "Please provide both, e.g., 'Analyze Tesla with high criticality'"
         )
         state['stage'] = 'awaiting_input'
-    
     return state
 
 
+# ─────────────────────────────────────────────
+# Speculative SERP Fetch (started on a regex guess while the LLM classifies)
+# ─────────────────────────────────────────────
+def speculative_fetch_key(state: ChatState, company: str) -> str:
+    return speculative.speculation_key(f"chat:{state.get('user_id', '')}", company)
+
+
+def start_speculative_fetch(state: ChatState, user_msg: str) -> Optional[str]:
+    """Start fetching SERP data for the company guessed from the message; returns its key."""
+    company = speculative.guess_company(user_msg)
+    if not company:
+        return None
+    key = speculative_fetch_key(state, company)
+    return key if speculative.start(key, get_company_data, company) else None
+
+
+def astart_speculative_fetch(state: ChatState, user_msg: str) -> Optional[str]:
+    """Async version of start_speculative_fetch (the fetch runs as a task on this loop)."""
+    company = speculative.guess_company(user_msg)
+    if not company:
+        return None
+    key = speculative_fetch_key(state, company)
+    return key if speculative.astart(key, aget_company_data, company) else None
+
+
+def settle_speculative_fetch(state: ChatState, key: Optional[str]):
+    """Leave the fetch for fetch_external_data if classification confirmed the guess, otherwise cancel it."""
+    if key is None:
+        return
+    if state.get('stage') == 'risk_analysis' and speculative_fetch_key(state, state['company_name']) == key:
+        return
+    speculative.cancel(key, reason=f"classified as {state.get('intent')}, company {state.get('company_name')}")
+
+
+@instrument_node("classify_question", graph="chat_risk")
+def classify_and_extract_node(state: ChatState) -> ChatState:
+    """Intent, company and criticality from rules when obvious, otherwise one structured LLM call."""
+    user_msg = state["messages"][-1]["content"]
+
+    quick = quick_classify(user_msg)
+    if quick:
+        return apply_classification(state, quick, "rules")
+
+    guess_key = start_speculative_fetch(state, user_msg)
+    try:
+        result = response_cache.get("classify_and_extract", user_msg)
+        if result is None:
+            result = llm.with_structured_output(RequestIntent).invoke(build_classify_extract_prompt(user_msg)).model_dump()
+            response_cache.set("classify_and_extract", user_msg, result)
+        state = apply_classification(state, result, "llm")
+    finally:
+        settle_speculative_fetch(state, guess_key)
+    return state
+
+
+@instrument_node("classify_question", graph="chat_risk")
+async def aclassify_and_extract_node(state: ChatState) -> ChatState:
+    """Async version of classify_and_extract_node."""
+    user_msg = state["messages"][-1]["content"]
+
+    quick = quick_classify(user_msg)
+    if quick:
+        return apply_classification(state, quick, "rules")
+
+    guess_key = astart_speculative_fetch(state, user_msg)
+    try:
+        result = response_cache.get("classify_and_extract", user_msg)
+        if result is None:
+            result = (await llm.with_structured_output(RequestIntent).ainvoke(build_classify_extract_prompt(user_msg))).model_dump()
+            response_cache.set("classify_and_extract", user_msg, result)
+        state = apply_classification(state, result, "llm")
+    finally:
+        settle_speculative_fetch(state, guess_key)
+    return state
+
+
+def route_after_classification(state: ChatState):
+    """
+    Risk requests with both inputs go to the pipeline (fetching new evidence and
+    looking up stored evidence in parallel); incomplete ones end with the clarification reply.
+    Questions about the user's own contracts go to contract_qa.
+    """
+    if state.get('intent') == 'contract':
+        return "contract_qa"
+    if state.get('intent') != 'risk':
+        return "regular_chatbot"
+    if state.get('stage') == 'risk_analysis':
+        if PARALLEL_RETRIEVAL:
+            return ["fetch_external_data", "retrieve_existing_context"]
+        return "fetch_external_data"
+    return END
+
+
+def parallel_branch(node, *keys):
+    """
+    Make a node that returns the whole state write only `keys`. Nodes that run in
+    the same step can't both write a key that has no reducer (InvalidUpdateError).
+    """
+    @functools.wraps(node)
+    def run(state: ChatState) -> dict:
+        result = node(dict(state))
+        return {key: result[key] for key in keys if key in result}
+    return run
+
+
 def check_inputs_node(state: ChatState) -> Literal["fetch_external_data", "regular_chatbot"]:
     """Check if we have valid inputs to proceed with risk analysis."""
     if state.get('stage') == 'risk_analysis' and state.get('company_name') and state.get('criticality'):
@@ -653,23 +899,49 @@ def check_inputs_node(state: ChatState) -> Literal["fetch_external_data", "regul
 # ─────────────────────────────────────────────
 # Risk Analysis Pipeline
 # ─────────────────────────────────────────────
+def _apply_findings(state: ChatState, company: str, findings=None, error: Exception = None) -> ChatState:
+    if error is not None:
+        print(f"❌ Error fetching data: {error}")
+        state["raw_findings"] = []
+        state["assistant_reply"] = f"⚠️ Could not fetch data for {company}. Error: {str(error)}"
+        return state
+
+    state["raw_findings"] = findings
+    print(f"✅ Found {len(findings) if isinstance(findings, list) else 'multiple'} items")
+    return state
+
+
+@instrument_node("fetch_external_data", graph="chat_risk")
 def fetch_external_data_node(state: ChatState) -> ChatState:
     """Fetch external data about the company."""
     company = state["company_name"]
     print(f"🔍 Fetching data for {company}")
     
     try:
-        findings = get_company_data(company)
-        state["raw_findings"] = findings
-        print(f"✅ Found {len(findings) if isinstance(findings, list) else 'multiple'} items")
+        findings = speculative.claim_result(speculative_fetch_key(state, company))
+        if findings is None:
+            findings = get_company_data(company)
+        return _apply_findings(state, company, findings)
     except Exception as e:
-        print(f"❌ Error fetching data: {e}")
-        state["raw_findings"] = []
-        state["assistant_reply"] = f"⚠️ Could not fetch data for {company}. Error: {str(e)}"
-    
-    return state
+        return _apply_findings(state, company, error=e)
+
+
+@instrument_node("fetch_external_data", graph="chat_risk")
+async def afetch_external_data_node(state: ChatState) -> ChatState:
+    """Async version of fetch_external_data_node (non-blocking SERP requests)."""
+    company = state["company_name"]
+    print(f"🔍 Fetching data for {company}")
+
+    try:
+        findings = await speculative.aclaim_result(speculative_fetch_key(state, company))
+        if findings is None:
+            findings = await aget_company_data(company)
+        return _apply_findings(state, company, findings)
+    except Exception as e:
+        return _apply_findings(state, company, error=e)
 
 
+@instrument_node("verify_sources", graph="chat_risk")
 def verify_sources_node(state: ChatState) -> ChatState:
     """Filter out low-credibility or duplicate web sources."""
     raw_findings = state.get("raw_findings", [])
@@ -732,6 +1004,7 @@ def verify_sources_node(state: ChatState) -> ChatState:
     return state
 
 
+@instrument_node("store_in_vector_db", graph="chat_risk")
 def store_in_vector_db_node(state: ChatState) -> ChatState:
     """Store verified findings in ChromaDB."""
     company = state["company_name"]
@@ -741,46 +1014,49 @@ def store_in_vector_db_node(state: ChatState) -> ChatState:
         print("⚠️ No verified findings to store")
         state["cleaned_docs"] = []
         state["chroma_ids"] = []
+        state["new_doc_count"] = 0
         return state
 
-    cleaned_docs = []
-    chroma_ids = []
+    text_blocks = []
+    metadatas = []
 
     for item in findings:
-        text_block = (
+        text_blocks.append(
             f"Company: {company}\n"
             f"Title: {item.get('title', '')}\n"
             f"Snippet: {item.get('snippet', '')}\n"
             f"URL: {item.get('url', '')}\n"
             f"Trust Score: {item.get('trust_score', 0)}"
         )
-        
-        try:
-            doc_id = upsert_into_chroma(
-                company=company,
-                text=text_block,
-                metadata={
-                    "url": item.get("url", ""),
-                    "trust_score": item.get("trust_score", 0)
-                }
-            )
-            cleaned_docs.append({"text": text_block, "source_url": item.get("url")})
-            chroma_ids.append(doc_id)
-        except Exception as e:
-            print(f"⚠️ Error storing document: {e}")
+        metadatas.append({
+            "url": item.get("url", ""),
+            "trust_score": item.get("trust_score", 0)
+        })
+
+    cleaned_docs = []
+    chroma_ids = []
+    new_doc_count = 0
+
+    try:
+        chroma_ids, new_doc_count = upsert_documents(company, text_blocks, metadatas)
+        cleaned_docs = [
+            {"text": text_block, "source_url": item.get("url")}
+            for text_block, item in zip(text_blocks, findings)
+        ]
+    except Exception as e:
+        print(f"⚠️ Error storing documents: {e}")
 
     state["cleaned_docs"] = cleaned_docs
     state["chroma_ids"] = chroma_ids
+    state["new_doc_count"] = new_doc_count
     
     print(f"✅ Stored {len(chroma_ids)} documents in vector DB")
     
     return state
 
 
-def retrieve_relevant_context_node(state: ChatState) -> ChatState:
-    """Retrieve relevant context from vector DB."""
-    company = state["company_name"]
-    
+def query_company_context(company: str) -> list:
+    """Risk and resilience evidence for `company` from the vector DB, shuffled together."""
     risk_query = f"{company} financial regulatory security risks lawsuits incidents"
     resilience_query = f"{company} compliance certifications partnerships sustainability security awards"
 
@@ -788,41 +1064,68 @@ def retrieve_relevant_context_node(state: ChatState) -> ChatState:
     resilience_chunks = []
 
     try:
-        risk_chunks = query_chroma(
-            query_text=risk_query, 
-            company=company, 
-            top_k=5
-        )
-    except Exception as e:
-        print(f"⚠️ Risk retrieval failed: {e}")
-
-    try:
-        resilience_chunks = query_chroma(
-            query_text=resilience_query, 
-            company=company, 
-            top_k=5
+        risk_chunks, resilience_chunks = query_chroma_many(
+            company,
+            [
+                {"query_text": risk_query, "top_k": 5},
+                {"query_text": resilience_query, "top_k": 5},
+            ]
         )
     except Exception as e:
-        print(f"⚠️ Resilience retrieval failed: {e}")
+        print(f"⚠️ Context retrieval failed: {e}")
 
     combined = risk_chunks + resilience_chunks
     random.shuffle(combined)
+    return combined
+
 
+@instrument_node("retrieve_existing_context", graph="chat_risk")
+def retrieve_existing_context_node(state: ChatState) -> ChatState:
+    """Evidence already stored for the company, looked up while new findings are fetched and stored."""
+    state["existing_context"] = query_company_context(state["company_name"])
+    print(f"✅ Found {len(state['existing_context'])} context chunks already stored")
+    return state
+
+
+@instrument_node("retrieve_relevant_context", graph="chat_risk")
+def retrieve_relevant_context_node(state: ChatState) -> ChatState:
+    """Retrieve relevant context from vector DB."""
+    existing = state.get("existing_context")
+    if existing and not state.get("new_doc_count"):
+        # Nothing new was stored since the early lookup, so it already is the answer
+        state["retrieved_context"] = existing
+        state["context_reused"] = True
+        print(f"♻️ No new evidence stored, reusing {len(existing)} context chunks")
+        return state
+
+    combined = query_company_context(state["company_name"])
     state["retrieved_context"] = combined
+    state["context_reused"] = False
     print(f"✅ Retrieved {len(combined)} context chunks")
     
     return state
 
 
-def generate_final_analysis_node(state: ChatState) -> ChatState:
+async def astore_in_vector_db_node(state: ChatState) -> ChatState:
+    """Chroma and the embedding client are blocking, so run the sync node in a worker thread."""
+    return await asyncio.to_thread(store_in_vector_db_node, state)
+
+
+async def aretrieve_relevant_context_node(state: ChatState) -> ChatState:
+    """Chroma and the embedding client are blocking, so run the sync node in a worker thread."""
+    return await asyncio.to_thread(retrieve_relevant_context_node, state)
+
+
+async def aretrieve_existing_context_node(state: ChatState) -> ChatState:
+    """Chroma and the embedding client are blocking, so run the sync node in a worker thread."""
+    return await asyncio.to_thread(retrieve_existing_context_node, state)
+
+
+def build_risk_prompt(state: ChatState) -> str:
     company = state["company_name"]
     criticality = state.get("criticality", "Medium")
     context_chunks = state.get("retrieved_context", [])
 
-    if not context_chunks:
-        state["risk_report"] = {"error": "No context found for scoring"}
-        return state
-
     evidence_text = ""
     for idx, chunk in enumerate(context_chunks):
         evidence_text += (
@@ -830,7 +1133,7 @@ def generate_final_analysis_node(state: ChatState) -> ChatState:
             f"URL: {chunk['metadata'].get('url')}\n\n"
         )
 
-    prompt = f"""
+    return f"""
         You are a senior vendor risk analyst helping our company decide whether to
         enter into a **business contract** with "{company}".
 
@@ -866,36 +1169,150 @@ def generate_final_analysis_node(state: ChatState) -> ChatState:
         {evidence_text}
     """
 
-    try:
-        llm_output = call_llm_as_json(prompt)
-        state["risk_report"] = {
-            "company": company,
-            "generated_at": datetime.utcnow().isoformat(),
-            "assessment": llm_output,
-        }
-    except Exception as e:
+
+def apply_risk_report(state: ChatState, llm_output=None, error: Exception = None) -> ChatState:
+    if error is not None:
         state["risk_report"] = {
-            "error": f"Failed to generate LLM assessment: {str(e)}"
+            "error": f"Failed to generate LLM assessment: {str(error)}"
         }
+        return state
 
+    state["risk_report"] = {
+        "company": state["company_name"],
+        "generated_at": datetime.utcnow().isoformat(),
+        "assessment": llm_output,
+        "cached": False,
+    }
+    remember_report(
+        "chat_risk", state["company_name"], state.get("criticality"),
+        state.get("retrieved_context", []), state["risk_report"]
+    )
     return state
 
 
+def apply_cached_report(state: ChatState) -> bool:
+    """Reuse the last report for this company/criticality if the retrieved evidence is unchanged."""
+    cached = lookup_report(
+        "chat_risk", state["company_name"], state.get("criticality"), state.get("retrieved_context", [])
+    )
+    if cached is None:
+        return False
+    state["risk_report"] = cached
+    return True
+
+
+@instrument_node("generate_final_analysis", graph="chat_risk")
+def generate_final_analysis_node(state: ChatState) -> ChatState:
+    if not state.get("retrieved_context", []):
+        state["risk_report"] = {"error": "No context found for scoring"}
+        return state
+
+    if apply_cached_report(state):
+        return state
+
+    try:
+        return apply_risk_report(state, call_llm_as_json(build_risk_prompt(state), schema=RISK_ASSESSMENT_SCHEMA))
+    except Exception as e:
+        return apply_risk_report(state, error=e)
+
+
+@instrument_node("generate_final_analysis", graph="chat_risk")
+async def agenerate_final_analysis_node(state: ChatState) -> ChatState:
+    """Async version of generate_final_analysis_node on the async OpenAI client."""
+    if not state.get("retrieved_context", []):
+        state["risk_report"] = {"error": "No context found for scoring"}
+        return state
+
+    if apply_cached_report(state):
+        return state
+
+    try:
+        return apply_risk_report(state, await acall_llm_as_json(build_risk_prompt(state), schema=RISK_ASSESSMENT_SCHEMA))
+    except Exception as e:
+        return apply_risk_report(state, error=e)
+
+
+def _finish_streamed_report(state: ChatState, raw: str) -> bool:
+    """Apply the streamed report; False when the text wasn't valid JSON (e.g. cut off) and needs a non-streamed call."""
+    try:
+        apply_risk_report(state, parse_llm_json(raw))
+        return True
+    except json.JSONDecodeError:
+        record_parse_failure(retried=True)
+        return False
+
+
+@instrument_node("generate_final_analysis", graph="chat_risk")
+def generate_final_analysis_stream(state: ChatState):
+    """
+    Streaming version of generate_final_analysis_node.
+    Yields {"delta": str, "fields": dict} as tokens arrive (fields holds JSON
+    fields completed by that delta) and sets state["risk_report"] at the end.
+    A cached report for the same evidence yields nothing.
+    """
+    if not state.get("retrieved_context", []):
+        state["risk_report"] = {"error": "No context found for scoring"}
+        return
+
+    if apply_cached_report(state):
+        return
+
+    prompt = build_risk_prompt(state)
+    parser = IncrementalJSONFields()
+    try:
+        for delta in stream_llm_json(prompt, schema=RISK_ASSESSMENT_SCHEMA):
+            yield {"delta": delta, "fields": parser.feed(delta)}
+        if not _finish_streamed_report(state, parser.buffer):
+            apply_risk_report(state, call_llm_as_json(prompt, schema=RISK_ASSESSMENT_SCHEMA))
+    except Exception as e:
+        apply_risk_report(state, error=e)
+
+
+@instrument_node("generate_final_analysis", graph="chat_risk")
+async def agenerate_final_analysis_stream(state: ChatState):
+    """Async version of generate_final_analysis_stream."""
+    if not state.get("retrieved_context", []):
+        state["risk_report"] = {"error": "No context found for scoring"}
+        return
+
+    if apply_cached_report(state):
+        return
+
+    prompt = build_risk_prompt(state)
+    parser = IncrementalJSONFields()
+    try:
+        async for delta in astream_llm_json(prompt, schema=RISK_ASSESSMENT_SCHEMA):
+            yield {"delta": delta, "fields": parser.feed(delta)}
+        if not _finish_streamed_report(state, parser.buffer):
+            apply_risk_report(state, await acall_llm_as_json(prompt, schema=RISK_ASSESSMENT_SCHEMA))
+    except Exception as e:
+        apply_risk_report(state, error=e)
+
+
 
 # ─────────────────────────────────────────────
 # Build the Graph
 # ─────────────────────────────────────────────
-def build_chat_risk_graph():
+def build_chat_risk_graph(checkpointer=None):
     """Build the complete LangGraph workflow."""
     graph = StateGraph(ChatState)
 
     # Add all nodes
-    graph.add_node("classify_question", classify_question_node)
-    graph.add_node("router", router_node)
+    graph.add_node("classify_question", classify_and_extract_node)
     graph.add_node("regular_chatbot", regular_chatbot_node)
-    graph.add_node("init_risk", init_risk_node)
-    graph.add_node("check_inputs", check_inputs_node)
-    graph.add_node("fetch_external_data", fetch_external_data_node)
+    graph.add_node("contract_qa", contract_qa_node)
+    if PARALLEL_RETRIEVAL:
+        # Both run in the step after classification, so each writes only its own keys
+        graph.add_node(
+            "fetch_external_data",
+            parallel_branch(fetch_external_data_node, "raw_findings", "assistant_reply", "stage_metrics"),
+        )
+        graph.add_node(
+            "retrieve_existing_context",
+            parallel_branch(retrieve_existing_context_node, "existing_context", "stage_metrics"),
+        )
+    else:
+        graph.add_node("fetch_external_data", fetch_external_data_node)
     graph.add_node("verify_sources", verify_sources_node)
     graph.add_node("store_in_vector_db", store_in_vector_db_node)
     graph.add_node("retrieve_relevant_context", retrieve_relevant_context_node)
@@ -904,46 +1321,49 @@ def build_chat_risk_graph():
     # Set entry point
     graph.set_entry_point("classify_question")
 
-    # Define edges
-    graph.add_conditional_edges(
-        "classify_question",
-        router_node,
-        {
-            "init_risk": "init_risk",
-            "regular_chatbot": "regular_chatbot"
-        }
-    )
-
-    graph.add_conditional_edges(
-        "init_risk",
-        check_inputs_node,
-        {
-            "fetch_external_data": "fetch_external_data",
-            "regular_chatbot": "regular_chatbot"
-        }
-    )
+    # Define edges: intent, company and criticality come out of one classification step
+    routes = {
+        "fetch_external_data": "fetch_external_data",
+        "regular_chatbot": "regular_chatbot",
+        "contract_qa": "contract_qa",
+        END: END
+    }
+    if PARALLEL_RETRIEVAL:
+        routes["retrieve_existing_context"] = "retrieve_existing_context"
+    graph.add_conditional_edges("classify_question", route_after_classification, routes)
 
     graph.add_edge("fetch_external_data", "verify_sources")
     graph.add_edge("verify_sources", "store_in_vector_db")
-    graph.add_edge("store_in_vector_db", "retrieve_relevant_context")
+    if PARALLEL_RETRIEVAL:
+        # Fan-in: retrieval waits for the ingest branch and the stored-evidence lookup
+        graph.add_edge(["store_in_vector_db", "retrieve_existing_context"], "retrieve_relevant_context")
+    else:
+        graph.add_edge("store_in_vector_db", "retrieve_relevant_context")
     graph.add_edge("retrieve_relevant_context", "generate_final_analysis")
     graph.add_edge("generate_final_analysis", END)
     graph.add_edge("regular_chatbot", END)
+    graph.add_edge("contract_qa", END)
 
-    # Compile with memory
-    checkpointer = MemorySaver()
-    app = graph.compile(checkpointer=checkpointer)
+    # Compile with the process-wide, bounded memory
+    app = graph.compile(checkpointer=checkpointer or shared_checkpointer)
     
     return app
 
 
+def get_chat_risk_graph():
+    """Return the compiled chat graph, building it on first use only."""
+    return get_compiled_graph("chat_risk", build_chat_risk_graph)
+
+
 def handle_user_message(user_id: str, user_message: str):
     """Handle a user message and return the result."""
-    app = build_chat_risk_graph()
+    app = get_chat_risk_graph()
 
     state_input = {
+        **dict.fromkeys(TURN_STATE_KEYS),
         "user_id": user_id,
-        "messages": [{"role": "user", "content": user_message}]
+        "messages": [{"role": "user", "content": user_message}],
+        "stage_metrics": Overwrite({}),  # bypass the merge reducer
     }
 
     # Use user_id as thread_id for memory isolation
@@ -971,16 +1391,31 @@ def handle_user_message(user_id: str, user_message: str):
 # Export all node functions for streaming
 __all__ = [
     'ChatState',
-    'classify_question_node',
-    'router_node',
     'regular_chatbot_node',
-    'init_risk_node',
+    'contract_qa_node',
     'check_inputs_node',
+    'classify_and_extract_node',
+    'aclassify_and_extract_node',
+    'quick_classify',
+    'route_after_classification',
+    'parallel_branch',
     'fetch_external_data_node',
     'verify_sources_node',
     'store_in_vector_db_node',
+    'retrieve_existing_context_node',
     'retrieve_relevant_context_node',
     'generate_final_analysis_node',
+    'apply_cached_report',
+    'aregular_chatbot_node',
+    'acontract_qa_node',
+    'afetch_external_data_node',
+    'astore_in_vector_db_node',
+    'aretrieve_existing_context_node',
+    'aretrieve_relevant_context_node',
+    'agenerate_final_analysis_node',
+    'generate_final_analysis_stream',
+    'agenerate_final_analysis_stream',
     'build_chat_risk_graph',
+    'get_chat_risk_graph',
     'handle_user_message'
 ]
\ No newline at end of file
@@ -0,0 +1,85 @@
+import os
+import threading
+from collections import OrderedDict
+
+from langgraph.checkpoint.memory import MemorySaver
+
+
+# ─────────────────────────────────────────────
+# Bounded checkpointer
+# ─────────────────────────────────────────────
+class BoundedMemorySaver(MemorySaver):
+    """
+    MemorySaver that keeps checkpoints for at most `max_threads` thread_ids.
+    The least recently written thread is dropped when the limit is reached.
+    """
+
+    def __init__(self, max_threads: int = 1000, **kwargs):
+        super().__init__(**kwargs)
+        self.max_threads = max_threads
+        self._thread_order = OrderedDict()
+        self._order_lock = threading.Lock()
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        result = super().put(config, checkpoint, metadata, new_versions)
+        self._touch(config["configurable"]["thread_id"])
+        return result
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        # The async graph path must hit the same bound; MemorySaver.aput is not guaranteed to call put
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    def _touch(self, thread_id):
+        evicted = []
+        with self._order_lock:
+            self._thread_order[thread_id] = None
+            self._thread_order.move_to_end(thread_id)
+            while len(self._thread_order) > self.max_threads:
+                old_thread, _ = self._thread_order.popitem(last=False)
+                evicted.append(old_thread)
+
+        for old_thread in evicted:
+            self.delete_thread(old_thread)
+
+    def delete_thread(self, thread_id):
+        with self._order_lock:
+            self._thread_order.pop(thread_id, None)
+        super().delete_thread(thread_id)
+
+    async def adelete_thread(self, thread_id):
+        self.delete_thread(thread_id)
+
+
+# ─────────────────────────────────────────────
+# Compiled graph registry
+# ─────────────────────────────────────────────
+_compiled_graphs = {}
+_registry_lock = threading.Lock()
+
+shared_checkpointer = BoundedMemorySaver(
+    max_threads=int(os.getenv("CHAT_CHECKPOINT_MAX_THREADS", "1000"))
+)
+
+
+def get_compiled_graph(name: str, builder):
+    """
+    Return the compiled graph registered under `name`, building it once per process.
+    `builder` is only called on the first request for that name.
+    """
+    graph = _compiled_graphs.get(name)
+    if graph is not None:
+        return graph
+
+    with _registry_lock:
+        graph = _compiled_graphs.get(name)
+        if graph is None:
+            graph = builder()
+            _compiled_graphs[name] = graph
+            print(f"🧩 Compiled graph '{name}'")
+    return graph
+
+
+def reset_compiled_graphs():
+    """Drop every cached graph so the next call rebuilds it."""
+    with _registry_lock:
+        _compiled_graphs.clear()
@@ -1,12 +1,20 @@
 from langgraph.graph import StateGraph, END
 from datetime import datetime
-import json
 from urllib.parse import urlparse
+from collections import OrderedDict
 import random
+import sqlite3
+import threading
+import uuid
+import os
 
 from utils.webScraper import get_company_data
-from db.chromaClient import upsert_into_chroma, query_chroma
-from utils.jsonConverter import call_llm_as_json
+from db.chromaClient import upsert_many, query_chroma_many, sanitize_collection_name
+from utils.jsonConverter import call_llm_as_json, RISK_ASSESSMENT_SCHEMA
+from utils.trace import trace
+from utils.metrics import instrument_node
+from utils.reportCache import lookup_report, remember_report
+from graphs.registry import get_compiled_graph
 
 from dotenv import load_dotenv
 load_dotenv()  # loads variables from .env into environment
@@ -14,11 +22,13 @@ load_dotenv()  # loads variables from .env into environment
 class RiskState(dict):
     pass
 
+@instrument_node("init", graph="risk_analysis")
 def init_node(state: RiskState) -> RiskState:
     return state
 
+@instrument_node("fetch_external_data", graph="risk_analysis")
 def fetch_external_data_node(state: RiskState) -> RiskState:
-    print(f"Fetching data for {state}")
+    print(f"Fetching data for {state['company_name']}")
 
     company = state["company_name"]
 
@@ -29,37 +39,41 @@ def fetch_external_data_node(state: RiskState) -> RiskState:
     return state
 
 
+@instrument_node("store_in_vector_db", graph="risk_analysis")
 def store_in_vector_db_node(state: dict) -> dict:
     company = state["company_name"]
-    risk_docs = state["raw_findings"].get("risk", [])
-    resilience_docs = state["raw_findings"].get("resilience", [])
+    raw_findings = state.get("raw_findings") or {}
+    if not isinstance(raw_findings, dict):
+        # get_company_data returns a plain list (e.g. [] when SERP fails)
+        raw_findings = {"risk": raw_findings if isinstance(raw_findings, list) else []}
+    risk_docs = raw_findings.get("risk", [])
+    resilience_docs = raw_findings.get("resilience", [])
 
-    chroma_ids = []
+    text_blocks = []
+    metadatas = []
 
-    def store_category(docs, category):
+    def collect_category(docs, category):
         for item in docs:
-            text_block = (
+            text_blocks.append(
                 f"Category: {category}\n"
                 f"Company: {company}\n"
                 f"Title: {item.get('title','')}\n"
                 f"Snippet: {item.get('snippet','')}\n"
                 f"URL: {item.get('url','')}\n"
             )
-            doc_id = upsert_into_chroma(
-                company=company,
-                text=text_block,
-                metadata={"url": item.get("url"), "category": category}
-            )
-            chroma_ids.append(doc_id)
+            metadatas.append({"url": item.get("url"), "category": category})
+
+    # Store both types in one batched write
+    collect_category(risk_docs, "risk")
+    collect_category(resilience_docs, "resilience")
 
-    # Store both types
-    store_category(risk_docs, "risk")
-    store_category(resilience_docs, "resilience")
+    chroma_ids = upsert_many(company, text_blocks, metadatas)
 
     state["chroma_ids"] = chroma_ids
     return state
 
 
+@instrument_node("retrieve_relevant_context", graph="risk_analysis")
 def retrieve_relevant_context_node(state: dict) -> dict:
     """
     Retrieves an equal mix of risk and resilience evidence from Chroma for a company.
@@ -77,28 +91,17 @@ def retrieve_relevant_context_node(state: dict) -> dict:
     )
 
     try:
-        # Query risk context
-        risk_chunks = query_chroma(
-            query_text=risk_query,
-            company=company,
-            top_k=5,
-            where={"category": "risk"}
-        )
-    except Exception as e:
-        print(f"⚠️ Error retrieving risk chunks for {company}: {e}")
-        risk_chunks = []
-
-    try:
-        # Query resilience context
-        resilience_chunks = query_chroma(
-            query_text=resilience_query,
-            company=company,
-            top_k=5,
-            where={"category": "resilience"}
+        # Query risk and resilience context with one embedding call
+        risk_chunks, resilience_chunks = query_chroma_many(
+            company,
+            [
+                {"query_text": risk_query, "top_k": 5, "where": {"category": "risk"}},
+                {"query_text": resilience_query, "top_k": 5, "where": {"category": "resilience"}},
+            ]
         )
     except Exception as e:
-        print(f"⚠️ Error retrieving resilience chunks for {company}: {e}")
-        resilience_chunks = []
+        print(f"⚠️ Error retrieving context for {company}: {e}")
+        risk_chunks, resilience_chunks = [], []
 
     # --- Combine and shuffle ---
     combined = risk_chunks + resilience_chunks
@@ -110,6 +113,7 @@ def retrieve_relevant_context_node(state: dict) -> dict:
     return state
 
 
+@instrument_node("llm_score_risk", graph="risk_analysis")
 def llm_score_risk_node(state: dict) -> dict:
     company = state["company_name"]
     criticality = state.get("criticality", "Medium")
@@ -119,6 +123,12 @@ def llm_score_risk_node(state: dict) -> dict:
         state["risk_report"] = {"error": "No context found for scoring"}
         return state
 
+    # Same evidence as the last run → same prompt, so skip the LLM
+    cached = lookup_report("risk_analysis", company, criticality, context_chunks)
+    if cached is not None:
+        state["risk_report"] = cached
+        return state
+
     evidence_text = ""
     for idx, chunk in enumerate(context_chunks):
         evidence_text += (
@@ -163,12 +173,14 @@ def llm_score_risk_node(state: dict) -> dict:
     """
 
     try:
-        llm_output = call_llm_as_json(prompt)
+        llm_output = call_llm_as_json(prompt, schema=RISK_ASSESSMENT_SCHEMA)
         state["risk_report"] = {
             "company": company,
             "generated_at": datetime.utcnow().isoformat(),
             "assessment": llm_output,
+            "cached": False,
         }
+        remember_report("risk_analysis", company, criticality, context_chunks, state["risk_report"])
     except Exception as e:
         state["risk_report"] = {
             "error": f"Failed to generate LLM assessment: {str(e)}"
@@ -181,6 +193,7 @@ TRUSTED_DOMAINS = [
     "forbes.com", "techcrunch.com", "investor.gov", "sec.gov"
 ]
 
+@instrument_node("verify_sources", graph="risk_analysis")
 def verify_sources_node(state):
     raw_data = state.get("raw_findings", [])
     verified, unverified = [], []
@@ -221,7 +234,29 @@ def verify_sources_node(state):
     print(f"✅ Verified {len(verified)} | Unverified {len(unverified)}")
     return state
 
-def riskAnalysisGraph(companyname, criticality):
+def build_risk_checkpointer(db_path: str = None):
+    """
+    Return a SQLite checkpointer when RISK_GRAPH_CHECKPOINT_DB (or db_path) is set, else None.
+    With a checkpointer, a run that fails mid-graph resumes from its last completed node.
+    """
+    db_path = db_path or os.getenv("RISK_GRAPH_CHECKPOINT_DB")
+    if not db_path:
+        return None
+
+    try:
+        from langgraph.checkpoint.sqlite import SqliteSaver
+    except ImportError as e:
+        raise RuntimeError(
+            "RISK_GRAPH_CHECKPOINT_DB is set but langgraph-checkpoint-sqlite is not installed."
+        ) from e
+
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    checkpointer = SqliteSaver(conn)
+    _restore_failed_runs(checkpointer)
+    return checkpointer
+
+
+def build_risk_analysis_graph(checkpointer=None):
     graph = StateGraph(dict)
     
     graph.add_node("init", init_node)
@@ -240,7 +275,41 @@ def riskAnalysisGraph(companyname, criticality):
 
     graph.set_entry_point("init")
 
-    app = graph.compile()
+    return graph.compile(checkpointer=checkpointer)
+
+
+def get_risk_analysis_graph():
+    """Return the compiled risk pipeline, building it on first use only."""
+    return get_compiled_graph(
+        "risk_analysis",
+        lambda: build_risk_analysis_graph(build_risk_checkpointer())
+    )
+
+
+# Failed runs keep their checkpoints so they can be retried; only the newest are kept
+RISK_FAILED_RUNS_KEPT = int(os.getenv("RISK_FAILED_RUNS_KEPT", "100"))
+_failed_runs = OrderedDict()  # run_id -> None, oldest first
+_active_runs = set()
+_runs_lock = threading.Lock()
+
+
+class RiskRunInProgress(RuntimeError):
+    """A retry was requested for a run that is still executing."""
+
+
+def risk_run_id(companyname, criticality):
+    """A new thread_id for one run; every request gets its own."""
+    return f"risk_{sanitize_collection_name(companyname)}_{str(criticality).lower()}_{uuid.uuid4().hex[:12]}"
+
+
+def riskAnalysisGraph(companyname, criticality, run_id=None, resume=False):
+    """
+    Run the risk pipeline. With a checkpointer (RISK_GRAPH_CHECKPOINT_DB) each run
+    gets its own thread; a failed run can be retried from its last completed node by
+    passing its run_id with resume=True. Any other call starts from fresh input.
+    On failure the exception carries the run id as `risk_run_id`.
+    """
+    app = get_risk_analysis_graph()
 
     # --- Initialize runtime state ---
     initial_state = RiskState({
@@ -248,12 +317,87 @@ def riskAnalysisGraph(companyname, criticality):
         "criticality": criticality
     })
 
-    print("🚀 Starting graph with initial state:", initial_state)
+    print(f"🚀 Starting risk graph for {companyname} ({criticality})")
+    trace("risk_graph.start", company=companyname, criticality=criticality)
 
     # --- Run it ---
-    final_state = app.invoke(initial_state)
-
-    print("✅ Graph completed. Final state:")
-    print(json.dumps(final_state, indent=2))
+    if app.checkpointer is None:
+        final_state = app.invoke(initial_state)
+    else:
+        run_id = run_id or risk_run_id(companyname, criticality)
+        config = {"configurable": {"thread_id": run_id}}
+        with _runs_lock:
+            if run_id in _active_runs:
+                raise RiskRunInProgress(f"risk run {run_id} is still running")
+            _active_runs.add(run_id)
+            _failed_runs.pop(run_id, None)
+        try:
+            snapshot = app.get_state(config)
+            if resume and snapshot.next:
+                print(f"♻️ Resuming risk graph for {companyname} at {list(snapshot.next)}")
+                trace("risk_graph.resume", company=companyname, next=list(snapshot.next))
+                final_state = app.invoke(None, config)
+            else:
+                if snapshot.created_at is not None:
+                    # New input on a known run_id: don't build on the old run's state
+                    app.checkpointer.delete_thread(run_id)
+                final_state = app.invoke(initial_state, config)
+        except Exception as e:
+            _remember_failed_run(app, run_id)
+            e.risk_run_id = run_id
+            raise
+        finally:
+            with _runs_lock:
+                _active_runs.discard(run_id)
+        # Finished runs have nothing to resume
+        app.checkpointer.delete_thread(run_id)
+        final_state["run_id"] = run_id
+
+    print(f"✅ Graph completed for {companyname}")
+    trace(
+        "risk_graph.complete",
+        company=companyname,
+        verified=len(final_state.get("verified_findings", []) or []),
+        unverified=len(final_state.get("unverified_findings", []) or []),
+        stored=len(final_state.get("chroma_ids", []) or []),
+        retrieved=len(final_state.get("retrieved_context", []) or []),
+        recommendation=(final_state.get("risk_report", {}).get("assessment") or {}).get("overall_recommendation"),
+        report_cached=final_state.get("risk_report", {}).get("cached", False),
+    )
 
     return final_state
+
+
+def _remember_failed_run(app, run_id):
+    """Keep the failed run's checkpoints for a retry, dropping the oldest beyond RISK_FAILED_RUNS_KEPT."""
+    with _runs_lock:
+        _failed_runs[run_id] = None
+    _prune_failed_runs(app.checkpointer)
+
+
+def _restore_failed_runs(checkpointer):
+    """
+    Reload the failed-run list from a durable checkpointer at startup, so runs that
+    failed before a restart are still capped. Finished runs delete their threads, so
+    every thread left in the DB is a failed (or interrupted) run.
+    """
+    checkpointer.setup()
+    with checkpointer.lock:
+        rows = checkpointer.conn.execute(
+            "SELECT thread_id FROM checkpoints GROUP BY thread_id ORDER BY MAX(checkpoint_id)"
+        ).fetchall()
+    with _runs_lock:
+        for (run_id,) in rows:
+            _failed_runs[run_id] = None
+            _failed_runs.move_to_end(run_id)
+    _prune_failed_runs(checkpointer)
+    print(f"🗂️ Risk checkpoints: {len(rows)} failed runs on disk, keeping {len(_failed_runs)}")
+
+
+def _prune_failed_runs(checkpointer):
+    with _runs_lock:
+        evicted = []
+        while len(_failed_runs) > RISK_FAILED_RUNS_KEPT:
+            evicted.append(_failed_runs.popitem(last=False)[0])
+    for old_run in evicted:
+        checkpointer.delete_thread(old_run)
@@ -1,24 +1,51 @@
 from fastapi import FastAPI, Body, File, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from graphs.riskAnalysisGraph import riskAnalysisGraph
-from utils.webScraper import get_company_data
-from graphs.contractbot import handle_user_message
+from starlette.concurrency import run_in_threadpool
+from graphs.riskAnalysisGraph import riskAnalysisGraph, get_risk_analysis_graph, RiskRunInProgress
+from utils.webScraper import get_company_data, serp_cache
+from graphs.contractbot import handle_user_message, get_chat_risk_graph, response_cache
+from utils.reportCache import report_cache
+from utils.jsonConverter import llm_json_stats
+from utils.metrics import render_metrics
 
 from typing import Union
-import tempfile
 import os
 
-from fastapi.responses import StreamingResponse, JSONResponse
-from typing import Generator
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
+from typing import AsyncGenerator
 import json
-from utils.stream_runner import run_pipeline_stream
+from utils.stream_runner import arun_pipeline_stream
 
-from awsS3 import S3Client
+from awsS3 import S3Client, listing_cache, user_key, S3_PART_SIZE
+from botocore.exceptions import ClientError
 from dotenv import load_dotenv
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+from db.chromaClient import warm_start, embedding_cache_stats
+from utils import contractIngest
+from utils.speculative import speculation_stats
+from db.clauseIndex import search_clauses, clause_index_stats
 
 load_dotenv()
 
-app = FastAPI(title="AI Service", version="1.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Compile the LangGraph workflows once, before the first request arrives."""
+    # asyncio.to_thread work (Chroma, embeddings) from the async pipeline runs here;
+    # the default executor is only cpu_count + 4 threads.
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=int(os.getenv("PIPELINE_WORKER_THREADS", "64")))
+    )
+    get_chat_risk_graph()
+    get_risk_analysis_graph()
+    app.state.chroma_warm_start = warm_start()
+    yield
+    contractIngest.shutdown()
+
+
+app = FastAPI(title="AI Service", version="1.0", lifespan=lifespan)
 
 
 
@@ -31,6 +58,9 @@ app.add_middleware(
 )
 
 s3_client = S3Client()
+S3_BUCKET = os.getenv("S3_BUCKET", "calhacks3.0")
+# Recorded next to each contract as {uid}/.meta/{file_name}.json
+CONTRACT_METADATA_FIELDS = ("contract_name", "contract_date", "contract_signatory")
 
 # @app.get("/riskanalysis")
 # def read_root(payload: dict= Body(...)):
@@ -51,14 +81,37 @@ s3_client = S3Client()
 
 
 @app.get("/list_files")
-def list_files_endpoint(user_id: str = None):
+def list_files_endpoint(user_id: str = None, cursor: str = None, limit: int = None, format: str = "json"):
     """
     List files for a specific user
-    Query param: user_id - User's UID to filter files
-    Example: /list_files?user_id=abc123
+    Query params:
+    - user_id: User's UID to filter files
+    - cursor, limit: one page of at most `limit` (<= 1000) files; pass next_cursor back for the next page
+    - format=ndjson: stream every file, one JSON object per line (for large prefixes)
+    Example: /list_files?user_id=abc123&limit=100
+    Without cursor/limit every file is returned in one response, as before.
     """
-    files = s3_client.list_files('calhacks3.0', uid=user_id)
-    return {"files": files, "user_id": user_id, "count": len(files)}
+    if format == "ndjson":
+        def lines():
+            # One chunk per S3 page, not per file: each chunk is a threadpool hop
+            for files in s3_client.iter_pages(S3_BUCKET, uid=user_id):
+                yield "".join(json.dumps(f) + "\n" for f in files)
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    if cursor is None and limit is None:
+        files = s3_client.list_files(S3_BUCKET, uid=user_id)
+        return {"files": files, "user_id": user_id, "count": len(files)}
+
+    try:
+        page = s3_client.list_files_page(S3_BUCKET, uid=user_id, cursor=cursor, limit=limit)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": f"Invalid cursor: {e}"})
+    return {
+        "files": page["files"],
+        "next_cursor": page["next_cursor"],
+        "user_id": user_id,
+        "count": len(page["files"]),
+    }
 
 
 
@@ -72,27 +125,36 @@ async def upload_file(file: UploadFile = File(...), user_id: str = Body(...), co
     - user_id: User's UID
     """
     try:
-        # Create a temporary file to save the upload
-        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as temp_file:
-            # Read file content and write to temp file
-            content = await file.read()
-            temp_file.write(content)
-            temp_file_path = temp_file.name
-        
-        # Upload to S3 with user_id as prefix (uses the updated method)
+        # Reject bad names before anything is written (save_metadata would fail after the upload)
+        user_key(user_id, file.filename)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"success": False, "error": str(e), "message": "Failed to upload file"})
+
+    try:
+        # Stream the upload to S3 part by part (user_id as prefix) in a worker thread,
+        # so the contract is never held in memory whole and the event loop stays free
         print(f"Uploading file {file.filename} for user {user_id}")
-        s3_path = s3_client.upload_file(temp_file_path, 'calhacks3.0', file.filename, uid=user_id)
-        
-        # Clean up temporary file
-        os.unlink(temp_file_path)
+        s3_path, file_size = await run_in_threadpool(
+            s3_client.upload_stream, file.file, S3_BUCKET, file.filename,
+            uid=user_id, content_type=file.content_type,
+        )
+        metadata = {
+            "contract_name": contract_name,
+            "contract_date": contract_date,
+            "contract_signatory": contract_signatory,
+        }
+        await run_in_threadpool(s3_client.save_metadata, S3_BUCKET, file.filename, user_id, metadata)
+        ingest_job = start_ingest(user_id, file.filename, file.content_type, metadata)
         
         return {
             "success": True,
             "file_name": file.filename,
             "s3_path": s3_path,
             "file_type": file.content_type,
-            "file_size": len(content),
+            "file_size": file_size,
             "user_id": user_id,
+            "metadata": metadata,
+            "ingest_job": ingest_job,
             "message": f"File uploaded successfully to S3 at {s3_path}"
         }
         
@@ -108,6 +170,142 @@ async def upload_file(file: UploadFile = File(...), user_id: str = Body(...), co
             "message": "Failed to upload file"
         }
 
+
+def start_ingest(user_id: str, file_name: str, content_type: str, metadata: dict):
+    """Queue text extraction + embedding for an uploaded PDF; None for other files."""
+    if not contractIngest.is_pdf(file_name, content_type):
+        return None
+    return contractIngest.submit_s3_pdf(s3_client, S3_BUCKET, user_id, file_name, metadata)
+
+
+@app.get("/ingest_jobs/{job_id}")
+def ingest_job_status(job_id: str):
+    """
+    Progress of a contract ingestion job: status, stage, pages_done / pages_total,
+    chunks, pages_per_sec and elapsed_seconds
+    """
+    job = contractIngest.get_job(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": f"unknown ingest job {job_id}"})
+    return job
+
+
+@app.get("/ingest_jobs")
+def ingest_jobs(user_id: str):
+    """Recent ingestion jobs for a user's uploads"""
+    return {"user_id": user_id, "jobs": contractIngest.list_jobs(user_id)}
+
+
+@app.get("/contracts/search")
+def search_contracts(user_id: str, q: str, file_name: str = None, top_k: int = None):
+    """
+    Hybrid (BM25 + vector) search over the clauses of a user's uploaded contracts
+    Example: /contracts/search?user_id=abc123&q=termination%20notice&file_name=msa.pdf
+    """
+    if not user_id:
+        return JSONResponse(status_code=400, content={"error": "user_id is required"})
+    clauses = search_clauses(user_id, q, top_k=top_k, file_name=file_name)
+    return {"user_id": user_id, "query": q, "count": len(clauses), "clauses": clauses}
+
+
+def parse_upload_size(value) -> int:
+    """The declared upload size in bytes (0 when not given); ValueError for anything else."""
+    try:
+        size = int(value or 0)
+    except (TypeError, ValueError):
+        raise ValueError(f"size must be a whole number of bytes, got {value!r}") from None
+    if size < 0:
+        raise ValueError(f"size must not be negative, got {size}")
+    return size
+
+
+@app.post("/uploads/presign")
+def presign_upload(payload: dict = Body(...)):
+    """
+    Presigned URL(s) for uploading a contract straight to S3 under the user's folder.
+    
+    Request body:
+    {"user_id": "abc123", "file_name": "msa.pdf", "content_type": "application/pdf", "size": 52428800}
+    
+    Returns mode "single" (one PUT url + headers) or, above one part, mode "multipart"
+    (upload_id, part_size and a PUT url per part). Finish with POST /uploads/complete.
+    """
+    user_id = payload.get("user_id")
+    file_name = payload.get("file_name")
+    content_type = payload.get("content_type")
+
+    try:
+        size = parse_upload_size(payload.get("size"))
+        if size > S3_PART_SIZE:
+            upload = s3_client.presign_multipart_upload(S3_BUCKET, file_name, user_id, size, content_type=content_type)
+            return {"mode": "multipart", **upload}
+        return {"mode": "single", **s3_client.presign_upload(S3_BUCKET, file_name, user_id, content_type=content_type)}
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+
+
+@app.post("/uploads/complete")
+def complete_upload(payload: dict = Body(...)):
+    """
+    Completion callback for presigned uploads: finishes a multipart upload, checks the
+    object exists and records the contract metadata.
+    
+    Request body:
+    {"user_id", "file_name", "contract_name", "contract_date", "contract_signatory",
+     "upload_id" and "parts": [{"part_number": 1, "etag": "..."}] (multipart only)}
+    """
+    user_id = payload.get("user_id")
+    file_name = payload.get("file_name")
+    metadata = {field: payload.get(field) for field in CONTRACT_METADATA_FIELDS if payload.get(field) is not None}
+
+    try:
+        result = s3_client.complete_upload(
+            S3_BUCKET, file_name, user_id, metadata=metadata,
+            upload_id=payload.get("upload_id"), parts=payload.get("parts"),
+        )
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    except FileNotFoundError:
+        return JSONResponse(status_code=404, content={"error": f"{file_name} was not uploaded"})
+    except ClientError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+
+    return {
+        "success": True,
+        "file_name": file_name,
+        "s3_path": result["s3_path"],
+        "file_type": result["content_type"],
+        "file_size": result["size"],
+        "user_id": user_id,
+        "metadata": metadata,
+        "ingest_job": start_ingest(user_id, file_name, result["content_type"], metadata),
+        "message": f"File uploaded successfully to S3 at {result['s3_path']}"
+    }
+
+
+@app.post("/uploads/abort")
+def abort_upload(payload: dict = Body(...)):
+    """Abandon a presigned multipart upload. Request body: {"user_id", "file_name", "upload_id"}"""
+    try:
+        s3_client.abort_upload(S3_BUCKET, payload.get("file_name"), payload.get("user_id"), payload.get("upload_id"))
+    except (ValueError, ClientError) as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    return {"success": True}
+
+
+@app.get("/download_url")
+def download_url(user_id: str, file_name: str):
+    """
+    Presigned GET url for one of the user's files
+    Example: /download_url?user_id=abc123&file_name=msa.pdf
+    """
+    try:
+        return s3_client.presign_download(S3_BUCKET, file_name, user_id)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    except FileNotFoundError:
+        return JSONResponse(status_code=404, content={"error": f"{file_name} not found"})
+
 def sse_event(data: dict) -> str:
     """Format data as Server-Sent Events"""
     return f"data: {json.dumps(data)}\n\n"
@@ -118,10 +316,28 @@ def read_root():
 
 @app.post("/riskanalysis")
 def risk_analysis(payload: dict = Body(...)):
-    """Non-streaming risk analysis endpoint"""
+    """
+    Non-streaming risk analysis endpoint
+    A failed run answers 500 with its run_id; send {"runId": ..., "resume": true}
+    with the same company to retry it from the last completed step.
+    """
     companyName = payload.get("companyName", "")
     criticality = payload.get("criticality", "Medium")
-    return riskAnalysisGraph(companyName, criticality)
+    resume = bool(payload.get("resume"))
+    run_id = payload.get("runId")
+    if resume and not run_id:
+        return JSONResponse(status_code=400, content={"error": "resume needs the runId of the failed run"})
+    try:
+        return riskAnalysisGraph(companyName, criticality, run_id=run_id, resume=resume)
+    except RiskRunInProgress as e:
+        return JSONResponse(status_code=409, content={"error": str(e), "run_id": run_id})
+    except Exception as e:
+        print(f"Risk analysis failed for {companyName}: {e}")
+        return JSONResponse(status_code=500, content={
+            "error": str(e),
+            "run_id": getattr(e, "risk_run_id", None),
+            "message": "Risk analysis failed; retry with this runId and resume=true to continue where it stopped",
+        })
 
 @app.post("/search")
 def search_company(payload: dict = Body(...)):
@@ -133,6 +349,8 @@ def chatBot(payload: dict = Body(...)):
     """Non-streaming chat endpoint"""
     userId = payload.get("userId")
     userMessage = payload.get("userMessage")
+    if not userId or not userMessage:
+        return JSONResponse(status_code=400, content={"error": "userId and userMessage are required"})
     return handle_user_message(userId, userMessage)
 
 @app.post("/chat/stream")
@@ -158,10 +376,10 @@ async def chat_stream(payload: dict = Body(...)):
             content={"error": "Message is required"}
         )
     
-    def event_generator() -> Generator[str, None, None]:
-        """Generate SSE events from the pipeline"""
+    async def event_generator() -> AsyncGenerator[str, None]:
+        """Generate SSE events from the pipeline (runs on the event loop, not the threadpool)"""
         try:
-            for event in run_pipeline_stream(user_id, message):
+            async for event in arun_pipeline_stream(user_id, message):
                 yield sse_event(event)
                 
             # Send completion signal
@@ -185,7 +403,24 @@ async def chat_stream(payload: dict = Body(...)):
         }
     )
 
+@app.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint: stage and dependency latency histograms, LLM tokens and cost"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 def health_check():
     """Health check endpoint"""
-    return {"status": "healthy"}
\ No newline at end of file
+    return {
+        "status": "healthy",
+        "serp_cache": serp_cache.stats(),
+        "embedding_cache": embedding_cache_stats(),
+        "response_cache": response_cache.stats(),
+        "report_cache": report_cache.stats(),
+        "s3_listing_cache": listing_cache.stats(),
+        "contract_ingest": contractIngest.ingest_stats(),
+        "clause_index": clause_index_stats(),
+        "llm_json": llm_json_stats(),
+        "speculation": speculation_stats(),
+        "chroma_warm_start": getattr(app.state, "chroma_warm_start", None),
+    }
\ No newline at end of file
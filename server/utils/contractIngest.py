@@ -0,0 +1,235 @@
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from db import clauseIndex
+from db.chromaClient import upsert_contract_chunks, prune_contract_chunks
+from utils import pdfText
+from utils.metrics import CONTRACT_PAGES, CONTRACT_INGEST_SECONDS
+
+# pdfplumber is pure Python and CPU-bound: pages are extracted in worker processes,
+# a few pages per task, while the job thread chunks (clauseIndex.ClauseChunker) and
+# embeds what is already out.
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "32"))
+INGEST_MAX_JOBS = int(os.getenv("INGEST_MAX_JOBS", "2"))  # PDFs ingested at the same time
+INGEST_EMBED_BATCH = int(os.getenv("INGEST_EMBED_BATCH", "64"))  # chunks per upsert_contract_chunks call
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", "500"))  # finished jobs kept for /ingest_jobs
+
+_jobs = OrderedDict()  # job_id -> job dict
+_jobs_lock = threading.Lock()
+_job_executor = ThreadPoolExecutor(max_workers=INGEST_MAX_JOBS, thread_name_prefix="contract-ingest")
+_extract_pool = None
+_extract_pool_lock = threading.Lock()
+
+
+def is_pdf(file_name: str, content_type: str = None) -> bool:
+    return content_type == "application/pdf" or (file_name or "").lower().endswith(".pdf")
+
+
+# ─────────────────────────────────────────────
+# Jobs
+# ─────────────────────────────────────────────
+def submit_s3_pdf(s3_client, bucket: str, user_id: str, file_name: str, metadata: dict = None) -> dict:
+    """Queue ingestion of an uploaded PDF (downloaded from S3 by the job). Returns the job."""
+    job = _new_job(user_id, file_name)
+    _job_executor.submit(_run_s3_job, job["job_id"], s3_client, bucket, user_id, file_name, metadata or {})
+    print(f"📥 Contract ingestion queued: {user_id}/{file_name} (job {job['job_id']})")
+    return get_job(job["job_id"])
+
+
+def get_job(job_id: str):
+    """Job status with throughput so far, or None."""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        job = dict(job)
+    started, finished = job.pop("_started", None), job.pop("_finished", None)
+    elapsed = ((finished or time.perf_counter()) - started) if started else 0.0
+    job["elapsed_seconds"] = round(elapsed, 3)
+    job["pages_per_sec"] = round(job["pages_done"] / elapsed, 2) if elapsed else 0.0
+    job["progress"] = round(job["pages_done"] / job["pages_total"], 3) if job["pages_total"] else 0.0
+    return job
+
+
+def list_jobs(user_id: str):
+    with _jobs_lock:
+        job_ids = [job_id for job_id, job in _jobs.items() if job["user_id"] == user_id]
+    return [get_job(job_id) for job_id in job_ids]
+
+
+def ingest_stats() -> dict:
+    with _jobs_lock:
+        statuses = [job["status"] for job in _jobs.values()]
+    return {
+        "extract_workers": PDF_EXTRACT_WORKERS,
+        "max_jobs": INGEST_MAX_JOBS,
+        **{status: statuses.count(status) for status in ("queued", "running", "done", "failed")},
+    }
+
+
+def shutdown():
+    """Stop the extraction workers (API shutdown)."""
+    global _extract_pool
+    with _extract_pool_lock:
+        pool, _extract_pool = _extract_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+# ─────────────────────────────────────────────
+# Extraction and embedding
+# ─────────────────────────────────────────────
+def ingest_pdf(path: str, user_id: str, file_name: str, metadata: dict = None, job_id: str = None) -> dict:
+    """
+    Extract, chunk and embed a local PDF into the user's contracts collection.
+    Pages are chunked in order (sections carry across pages); at most two tasks
+    per worker are in flight or waiting for an earlier range, so extracted text
+    never piles up ahead of embedding. Returns {"pages", "chunks", "new_chunks", "pruned"}.
+    """
+    metadata = {k: v for k, v in (metadata or {}).items() if v is not None}
+    metadata.setdefault("contract_name", file_name)
+    total = pdfText.page_count(path)
+    _update(job_id, pages_total=total)
+
+    chunker = clauseIndex.ClauseChunker()
+    ids, new_chunks, pages_done = [], 0, 0
+    texts, metadatas = [], []
+
+    def add(chunks):
+        for chunk in chunks:
+            metadatas.append({
+                **metadata, "user_id": user_id, "file_name": file_name, "section": chunk["section"],
+                "page": chunk["page"], "page_end": chunk["page_end"], "chunk": len(ids) + len(texts),
+            })
+            texts.append(chunk["text"])
+
+    def flush():
+        nonlocal new_chunks
+        batch_ids, batch_new = upsert_contract_chunks(user_id, texts, metadatas)
+        ids.extend(batch_ids)
+        new_chunks += batch_new
+        texts.clear()
+        metadatas.clear()
+
+    firsts = list(range(1, total + 1, PDF_PAGES_PER_TASK))
+    pool = _get_extract_pool()
+    in_flight, ready, next_first = {}, {}, 1  # future -> first page; first page -> extracted pages
+    try:
+        while firsts or in_flight:
+            while firsts and len(in_flight) + len(ready) < 2 * PDF_EXTRACT_WORKERS:
+                first = firsts.pop(0)
+                last = min(first + PDF_PAGES_PER_TASK - 1, total)
+                in_flight[pool.submit(pdfText.extract_pages, path, first, last)] = first
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                ready[in_flight.pop(future)] = future.result()
+            while next_first in ready:
+                pages = ready.pop(next_first)
+                for page_number, text in pages:
+                    add(chunker.add_page(page_number, text))
+                pages_done += len(pages)
+                next_first += PDF_PAGES_PER_TASK
+                CONTRACT_PAGES.inc(len(pages))
+            if not (firsts or in_flight):
+                add(chunker.finish())
+            if len(texts) >= INGEST_EMBED_BATCH or not (firsts or in_flight):
+                flush()
+            _update(job_id, pages_done=pages_done, chunks=len(ids) + len(texts), new_chunks=new_chunks)
+    except BrokenProcessPool:
+        _reset_extract_pool(pool)
+        raise
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+    pruned = prune_contract_chunks(user_id, file_name, ids)
+    clauseIndex.invalidate(user_id)
+    return {"pages": pages_done, "chunks": len(ids), "new_chunks": new_chunks, "pruned": pruned}
+
+
+def _run_s3_job(job_id, s3_client, bucket, user_id, file_name, metadata):
+    started = time.perf_counter()
+    _update(job_id, status="running", stage="downloading", _started=started)
+    status = "failed"
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    os.close(fd)
+    try:
+        s3_client.download_file(bucket, file_name, uid=user_id, dest_path=path)
+        _update(job_id, stage="extracting")
+        result = ingest_pdf(path, user_id, file_name, metadata, job_id=job_id)
+        status = "done"
+        warning = None if result["chunks"] else "no extractable text (scanned PDF?)"
+        _update(job_id, status=status, stage=None, pruned=result["pruned"], warning=warning)
+        job = get_job(job_id)
+        print(
+            f"📄 Ingested {user_id}/{file_name}: {job['pages_done']} pages, {job['chunks']} chunks "
+            f"({job['new_chunks']} new) in {job['elapsed_seconds']}s, {job['pages_per_sec']} pages/s"
+        )
+    except Exception as e:
+        print(f"❌ Contract ingestion failed for {user_id}/{file_name}: {e}")
+        _update(job_id, status="failed", error=str(e))
+    finally:
+        _update(job_id, _finished=time.perf_counter())
+        CONTRACT_INGEST_SECONDS.observe(time.perf_counter() - started, status=status)
+        os.unlink(path)
+
+
+def _new_job(user_id: str, file_name: str) -> dict:
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "user_id": user_id,
+        "file_name": file_name,
+        "status": "queued",
+        "stage": None,
+        "pages_total": 0,
+        "pages_done": 0,
+        "chunks": 0,
+        "new_chunks": 0,
+        "pruned": 0,
+        "warning": None,
+        "error": None,
+        "_started": None,
+        "_finished": None,
+    }
+    with _jobs_lock:
+        _jobs[job["job_id"]] = job
+        # Forget the oldest finished jobs; running ones stay visible
+        finished = [job_id for job_id, j in _jobs.items() if j["status"] in ("done", "failed")]
+        for job_id in finished[:max(0, len(_jobs) - INGEST_JOB_HISTORY)]:
+            del _jobs[job_id]
+    return job
+
+
+def _update(job_id: str, **fields):
+    if job_id is None:
+        return
+    with _jobs_lock:
+        if job_id in _jobs:
+            _jobs[job_id].update(fields)
+
+
+def _get_extract_pool():
+    global _extract_pool
+    with _extract_pool_lock:
+        if _extract_pool is None:
+            # spawn, not fork: the API process is full of threads
+            _extract_pool = ProcessPoolExecutor(
+                max_workers=PDF_EXTRACT_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _extract_pool
+
+
+def _reset_extract_pool(broken):
+    global _extract_pool
+    with _extract_pool_lock:
+        if _extract_pool is broken:
+            _extract_pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
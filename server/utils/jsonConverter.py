@@ -1,71 +1,381 @@
 import os
 import json
 import re
-from openai import OpenAI
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import openai
+from openai import OpenAI, AsyncOpenAI
+from utils.metrics import track_dependency, record_llm_usage
 
 from dotenv import load_dotenv
 load_dotenv()  # loads variables from .env into environment
 
-# Initialize once globally
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))                  # per completion request
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))    # in-flight JSON calls per process
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "5"))           # tries per call on 429/5xx/timeouts
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "20"))
 
-def call_llm_as_json(prompt: str, model: str = "gpt-4o-mini", max_retries: int = 2):
+# Initialize once globally; both keep a pooled HTTP connection to the API
+client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=LLM_TIMEOUT)
+async_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=LLM_TIMEOUT)
+
+# JSON calls back off themselves (below), so the SDK's own retries are off for them.
+# with_options() shares the parent client's connection pool.
+_json_client = client.with_options(max_retries=0)
+_async_json_client = async_client.with_options(max_retries=0)
+
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+_llm_slots = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+_async_slots = None
+_async_slots_loop = None
+_llm_counters = {"calls": 0, "retries": 0, "failures": 0, "parse_failures": 0, "parse_retries": 0}
+_llm_counters_lock = threading.Lock()
+
+JSON_SYSTEM_PROMPT = (
+    "You are a precise data-returning model. "
+    "Always respond ONLY with valid JSON—no text before or after."
+)
+
+
+# Structured-output schema for the vendor risk assessment both risk graphs ask for
+RISK_ASSESSMENT_SCHEMA = {
+    "name": "risk_assessment",
+    "schema": {
+        "type": "object",
+        "properties": {
+            "financial_risk": {"type": "integer", "description": "1 (low) to 5 (high)"},
+            "security_risk": {"type": "integer", "description": "1 (low) to 5 (high)"},
+            "reputation_risk": {"type": "integer", "description": "1 (low) to 5 (high)"},
+            "resilience_strength": {"type": "integer", "description": "1 (weak) to 5 (strong)"},
+            "overall_recommendation": {
+                "type": "string",
+                "enum": ["safe_to_contract", "contract_with_protections", "do_not_contract"],
+            },
+            "rationale_with_citations": {"type": "array", "items": {"type": "string"}},
+        },
+        "required": [
+            "financial_risk", "security_risk", "reputation_risk", "resilience_strength",
+            "overall_recommendation", "rationale_with_citations",
+        ],
+        "additionalProperties": False,
+    },
+}
+
+
+def _json_messages(prompt: str):
+    return [
+        {"role": "system", "content": JSON_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def response_format(schema: dict = None) -> dict:
+    """Structured outputs for a declared schema ({"name", "schema"}), otherwise plain JSON mode."""
+    if schema is None:
+        return {"type": "json_object"}
+    return {"type": "json_schema", "json_schema": {**schema, "strict": True}}
+
+
+def parse_llm_json(raw: str):
+    """
+    Parse model output into a dict, tolerating ```json``` fences and text around the object.
+    Raises json.JSONDecodeError if no valid JSON can be found.
+    """
+    raw = raw.strip()
+
+    # --- Step 1: Clean markdown wrappers like ```json ... ```
+    if "```json" in raw:
+        raw = raw.split("```json")[1].split("```")[0]
+    elif "```" in raw:
+        raw = raw.split("```")[1]
+
+    # --- Step 2: Extract first JSON object using regex fallback
+    match = re.search(r"\{[\s\S]*\}", raw)
+    if match:
+        raw_json_str = match.group(0)
+    else:
+        raw_json_str = raw
+
+    # --- Step 3: Parse JSON
+    return json.loads(raw_json_str)
+
+
+# ─────────────────────────────────────────────
+# Rate limits and transient failures
+# ─────────────────────────────────────────────
+def _count(counter: str):
+    with _llm_counters_lock:
+        _llm_counters[counter] += 1
+
+
+def llm_json_stats() -> dict:
+    with _llm_counters_lock:
+        return dict(_llm_counters)
+
+
+def is_retryable(error: Exception) -> bool:
+    """429s, 5xx responses, timeouts and dropped connections are worth retrying."""
+    if isinstance(error, RETRYABLE_ERRORS):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+def backoff_delay(attempt: int, error: Exception = None) -> float:
+    """Retry-After from the response if present, else exponential backoff with full jitter."""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), LLM_BACKOFF_MAX)
+        except ValueError:
+            pass
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+
+
+def _record_usage(model: str, usage):
+    if usage is not None:
+        record_llm_usage(model, usage.prompt_tokens, usage.completion_tokens)
+
+
+def _async_llm_slots() -> asyncio.Semaphore:
+    """Concurrency limit for async calls, created per event loop (asyncio primitives are loop-bound)."""
+    global _async_slots, _async_slots_loop
+    loop = asyncio.get_running_loop()
+    if _async_slots is None or _async_slots_loop is not loop:
+        _async_slots = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+        _async_slots_loop = loop
+    return _async_slots
+
+
+def _create_json_completion(prompt: str, model: str, schema: dict = None) -> str:
+    """One JSON completion, retried with backoff on rate limits and transient errors."""
+    for attempt in range(LLM_MAX_ATTEMPTS):
+        try:
+            _count("calls")
+            with _llm_slots, track_dependency("openai", "json_completion"):
+                completion = _json_client.chat.completions.create(
+                    model=model,
+                    temperature=0.2,
+                    messages=_json_messages(prompt),
+                    response_format=response_format(schema),
+                    timeout=LLM_TIMEOUT,
+                )
+            _record_usage(model, completion.usage)
+            return completion.choices[0].message.content.strip()
+        except Exception as e:
+            if not is_retryable(e) or attempt == LLM_MAX_ATTEMPTS - 1:
+                raise
+            delay = backoff_delay(attempt, e)
+            _count("retries")
+            print(f"⏳ LLM call failed ({type(e).__name__}), retry {attempt + 1} in {delay:.2f}s")
+            time.sleep(delay)
+
+
+async def _acreate_json_completion(prompt: str, model: str, schema: dict = None) -> str:
+    """Async version of _create_json_completion; the backoff sleep holds no concurrency slot."""
+    for attempt in range(LLM_MAX_ATTEMPTS):
+        try:
+            _count("calls")
+            async with _async_llm_slots():
+                with track_dependency("openai", "json_completion"):
+                    completion = await _async_json_client.chat.completions.create(
+                        model=model,
+                        temperature=0.2,
+                        messages=_json_messages(prompt),
+                        response_format=response_format(schema),
+                        timeout=LLM_TIMEOUT,
+                    )
+            _record_usage(model, completion.usage)
+            return completion.choices[0].message.content.strip()
+        except Exception as e:
+            if not is_retryable(e) or attempt == LLM_MAX_ATTEMPTS - 1:
+                raise
+            delay = backoff_delay(attempt, e)
+            _count("retries")
+            print(f"⏳ LLM call failed ({type(e).__name__}), retry {attempt + 1} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+
+# ─────────────────────────────────────────────
+# JSON calls
+# ─────────────────────────────────────────────
+def record_parse_failure(retried: bool):
+    """Count a reply that wasn't valid JSON, and whether another completion was requested for it."""
+    _count("parse_failures")
+    if retried:
+        _count("parse_retries")
+
+
+def _parse_failed(attempt: int, max_retries: int, error: json.JSONDecodeError):
+    print(f"⚠️ JSON decode error (attempt {attempt+1}): {error}")
+    record_parse_failure(retried=attempt < max_retries - 1)
+
+
+def call_llm_as_json(prompt: str, model: str = "gpt-4o-mini", max_retries: int = 2, schema: dict = None):
     """
-    Calls an LLM and forces a valid JSON response.
-    - Handles ```json``` blocks, extra text, malformed JSON.
-    - Retries once if JSON decoding fails.
+    Calls an LLM in JSON mode and returns the parsed object.
+    - With `schema` ({"name", "schema"}), the reply is constrained to it (structured outputs).
+    - JSON mode rules out fences and prose, so the reply is parsed as-is; a reply that
+      still fails to parse (e.g. truncated) is re-requested, not sent back for repair.
+    - Rate limits (429), 5xx and timeouts back off and retry up to LLM_MAX_ATTEMPTS times.
 
     Args:
         prompt (str): The full prompt text you send to the model.
         model (str): The OpenAI model name.
-        max_retries (int): How many times to retry parsing.
+        max_retries (int): How many completions to try when the reply doesn't parse.
+        schema (dict): Optional JSON schema, e.g. RISK_ASSESSMENT_SCHEMA.
 
     Returns:
         dict: Parsed JSON result, or {'error': ..., 'raw': ...} on failure.
     """
+    raw = ""
     for attempt in range(max_retries):
         try:
-            completion = client.chat.completions.create(
-                model=model,
-                temperature=0.2,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a precise data-returning model. "
-                                   "Always respond ONLY with valid JSON—no text before or after."
-                    },
-                    {"role": "user", "content": prompt}
-                ],
-            )
-
-            raw = completion.choices[0].message.content.strip()
-
-            # --- Step 1: Clean markdown wrappers like ```json ... ```
-            if "```json" in raw:
-                raw = raw.split("```json")[1].split("```")[0]
-            elif "```" in raw:
-                raw = raw.split("```")[1]
-
-            # --- Step 2: Extract first JSON object using regex fallback
-            match = re.search(r"\{[\s\S]*\}", raw)
-            if match:
-                raw_json_str = match.group(0)
-            else:
-                raw_json_str = raw
-
-            # --- Step 3: Parse JSON
-            result = json.loads(raw_json_str)
-            return result
+            raw = _create_json_completion(prompt, model, schema)
+            return json.loads(raw)
 
         except json.JSONDecodeError as e:
-            print(f"⚠️ JSON decode error (attempt {attempt+1}): {e}")
-            prompt = (
-                f"The previous response was invalid JSON. "
-                f"Please reformat and return valid JSON only.\n\n{raw}"
-            )
+            _parse_failed(attempt, max_retries, e)
         except Exception as e:
+            _count("failures")
             print(f"❌ LLM call failed: {e}")
             return {"error": str(e)}
 
-    # --- Step 4: Fallback
+    # --- Fallback
     return {"error": "Failed to produce valid JSON after retries", "raw": raw}
+
+
+async def acall_llm_as_json(prompt: str, model: str = "gpt-4o-mini", max_retries: int = 2, schema: dict = None):
+    """Async version of call_llm_as_json on AsyncOpenAI; same return value."""
+    raw = ""
+    for attempt in range(max_retries):
+        try:
+            raw = await _acreate_json_completion(prompt, model, schema)
+            return json.loads(raw)
+
+        except json.JSONDecodeError as e:
+            _parse_failed(attempt, max_retries, e)
+        except Exception as e:
+            _count("failures")
+            print(f"❌ LLM call failed: {e}")
+            return {"error": str(e)}
+
+    return {"error": "Failed to produce valid JSON after retries", "raw": raw}
+
+
+async def acall_llm_as_json_many(prompts, model: str = "gpt-4o-mini", schema: dict = None):
+    """Run many JSON prompts concurrently (at most LLM_MAX_CONCURRENCY in flight); results in prompt order."""
+    return await asyncio.gather(*(acall_llm_as_json(prompt, model, schema=schema) for prompt in prompts))
+
+
+def call_llm_as_json_many(prompts, model: str = "gpt-4o-mini", schema: dict = None):
+    """Sync fan-out of call_llm_as_json over a thread pool; results in prompt order."""
+    prompts = list(prompts)
+    if not prompts:
+        return []
+    with ThreadPoolExecutor(max_workers=min(LLM_MAX_CONCURRENCY, len(prompts))) as pool:
+        return list(pool.map(lambda prompt: call_llm_as_json(prompt, model, schema=schema), prompts))
+
+
+def stream_llm_json(prompt: str, model: str = "gpt-4o-mini", schema: dict = None):
+    """
+    Stream the raw text of a JSON-mode completion, one token delta at a time.
+    Holds a concurrency slot (LLM_MAX_CONCURRENCY) for the whole stream; rate limits
+    and transient errors back off and retry like JSON calls, but only until the
+    first delta is out (a retry after that would repeat text).
+    """
+    for attempt in range(LLM_MAX_ATTEMPTS):
+        started = False
+        try:
+            _count("calls")
+            with _llm_slots, track_dependency("openai", "stream"):
+                stream = _json_client.chat.completions.create(
+                    model=model,
+                    temperature=0.2,
+                    messages=_json_messages(prompt),
+                    response_format=response_format(schema),
+                    stream=True,
+                    stream_options={"include_usage": True},
+                    timeout=LLM_TIMEOUT,
+                )
+                for chunk in stream:
+                    # The last chunk carries token usage and no choices
+                    _record_usage(model, chunk.usage)
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        started = True
+                        yield chunk.choices[0].delta.content
+            return
+        except Exception as e:
+            if started or not is_retryable(e) or attempt == LLM_MAX_ATTEMPTS - 1:
+                raise
+            delay = backoff_delay(attempt, e)
+            _count("retries")
+            print(f"⏳ LLM stream failed ({type(e).__name__}), retry {attempt + 1} in {delay:.2f}s")
+            time.sleep(delay)
+
+
+async def astream_llm_json(prompt: str, model: str = "gpt-4o-mini", schema: dict = None):
+    """Async version of stream_llm_json; the backoff sleep holds no concurrency slot."""
+    for attempt in range(LLM_MAX_ATTEMPTS):
+        started = False
+        try:
+            _count("calls")
+            async with _async_llm_slots():
+                with track_dependency("openai", "stream"):
+                    stream = await _async_json_client.chat.completions.create(
+                        model=model,
+                        temperature=0.2,
+                        messages=_json_messages(prompt),
+                        response_format=response_format(schema),
+                        stream=True,
+                        stream_options={"include_usage": True},
+                        timeout=LLM_TIMEOUT,
+                    )
+                    async for chunk in stream:
+                        _record_usage(model, chunk.usage)
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            started = True
+                            yield chunk.choices[0].delta.content
+            return
+        except Exception as e:
+            if started or not is_retryable(e) or attempt == LLM_MAX_ATTEMPTS - 1:
+                raise
+            delay = backoff_delay(attempt, e)
+            _count("retries")
+            print(f"⏳ LLM stream failed ({type(e).__name__}), retry {attempt + 1} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+
+class IncrementalJSONFields:
+    """
+    Picks completed scalar fields ("financial_risk": 3, "overall_recommendation": "...")
+    out of a JSON object while it is still being streamed.
+    feed() returns only the fields that became complete with that delta.
+    """
+
+    _FIELD = re.compile(
+        r'"(?P<key>[A-Za-z_][\w]*)"\s*:\s*'
+        r'(?P<value>"(?:[^"\\]|\\.)*"|-?\d+(?:\.\d+)?(?=\s*[,}\n])|true|false|null)'
+    )
+
+    def __init__(self):
+        self.buffer = ""
+        self.fields = {}
+        self._scan_from = 0
+
+    def feed(self, delta: str) -> dict:
+        self.buffer += delta
+        new_fields = {}
+        for match in self._FIELD.finditer(self.buffer, self._scan_from):
+            key = match.group("key")
+            if key not in self.fields:
+                value = json.loads(match.group("value"))
+                self.fields[key] = value
+                new_fields[key] = value
+            self._scan_from = match.end()
+        return new_fields
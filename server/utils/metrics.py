@@ -0,0 +1,285 @@
+import contextvars
+import functools
+import inspect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# USD per 1M tokens (input, output); extend with LLM_PRICE_<MODEL>="in,out", e.g. LLM_PRICE_GPT_4O="2.5,10"
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "text-embedding-3-small": (0.02, 0.0),
+}
+for _name, _value in os.environ.items():
+    if _name.startswith("LLM_PRICE_"):
+        try:
+            _input, _output = (float(p) for p in _value.split(","))
+        except ValueError:
+            print(f"⚠️ Ignoring {_name}={_value!r}: expected \"<input>,<output>\" USD per 1M tokens")
+            continue
+        MODEL_PRICES[_name[len("LLM_PRICE_"):].lower().replace("_", "-")] = (_input, _output)
+
+
+# ─────────────────────────────────────────────
+# Prometheus-style metric types
+# ─────────────────────────────────────────────
+def _label_text(labelnames, values) -> str:
+    if not labelnames:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(labelnames, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labelnames, key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    labels = _label_text(self.labelnames + ("le",), key + (f"{bound:g}",))
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _label_text(self.labelnames + ("le",), key + ("+Inf",))
+                lines.append(f"{self.name}_bucket{labels} {series[-1]}")
+                lines.append(f"{self.name}_sum{_label_text(self.labelnames, key)} {series[-2]:.6f}")
+                lines.append(f"{self.name}_count{_label_text(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+REGISTRY = []
+
+STAGE_SECONDS = Histogram("pipeline_stage_seconds", "Wall time per graph stage", ["graph", "stage"])
+DEPENDENCY_SECONDS = Histogram(
+    "dependency_request_seconds", "Wall time of calls to external dependencies", ["dependency", "operation"]
+)
+DEPENDENCY_ERRORS = Counter("dependency_errors_total", "Failed calls to external dependencies", ["dependency", "operation"])
+LLM_TOKENS = Counter("llm_tokens_total", "LLM tokens used", ["model", "kind"])
+LLM_COST = Counter("llm_cost_usd_total", "Estimated LLM spend in USD", ["model"])
+CONTRACT_PAGES = Counter("contract_pages_extracted_total", "PDF pages extracted from uploaded contracts")
+CONTRACT_INGEST_SECONDS = Histogram(
+    "contract_ingest_seconds", "Wall time per contract ingestion job", ["status"],
+    buckets=DEFAULT_BUCKETS + (120, 300, 600),
+)
+
+
+def render_metrics() -> str:
+    """Every registered metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ─────────────────────────────────────────────
+# Dependencies and token usage
+# ─────────────────────────────────────────────
+_current_stage = contextvars.ContextVar("current_stage", default=None)
+
+
+@contextmanager
+def track_dependency(dependency: str, operation: str):
+    """Time a call to an external dependency (serp, openai, chroma, s3)."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        DEPENDENCY_ERRORS.inc(dependency=dependency, operation=operation)
+        raise
+    finally:
+        DEPENDENCY_SECONDS.observe(time.perf_counter() - started, dependency=dependency, operation=operation)
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    prices = MODEL_PRICES.get(model) or next(
+        (p for name, p in MODEL_PRICES.items() if model and model.startswith(name)), (0.0, 0.0)
+    )
+    return (prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1_000_000
+
+
+def record_llm_usage(model: str, prompt_tokens: int, completion_tokens: int):
+    """Count tokens and cost globally and against the stage currently running, if any."""
+    prompt_tokens, completion_tokens = prompt_tokens or 0, completion_tokens or 0
+    cost = estimate_cost(model, prompt_tokens, completion_tokens)
+    LLM_TOKENS.inc(prompt_tokens, model=model, kind="prompt")
+    LLM_TOKENS.inc(completion_tokens, model=model, kind="completion")
+    LLM_COST.inc(cost, model=model)
+
+    span = _current_stage.get()
+    if span is not None:
+        span.add_usage(prompt_tokens, completion_tokens, cost)
+
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """LangChain callback that times chat model calls and records their token usage."""
+
+    run_inline = True
+
+    def __init__(self):
+        self._started = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            DEPENDENCY_SECONDS.observe(time.perf_counter() - started, dependency="openai", operation="chat")
+
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        model = (response.llm_output or {}).get("model_name") or "unknown"
+        if usage:
+            record_llm_usage(model, usage.get("prompt_tokens"), usage.get("completion_tokens"))
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            DEPENDENCY_SECONDS.observe(time.perf_counter() - started, dependency="openai", operation="chat")
+        DEPENDENCY_ERRORS.inc(dependency="openai", operation="chat")
+
+
+# ─────────────────────────────────────────────
+# Stage instrumentation
+# ─────────────────────────────────────────────
+class StageSpan:
+    def __init__(self, graph: str, stage: str):
+        self.graph, self.stage = graph, stage
+        self.prompt_tokens = self.completion_tokens = 0
+        self.cost = 0.0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add_usage(self, prompt_tokens: int, completion_tokens: int, cost: float):
+        with self._lock:
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.cost += cost
+
+    def finish(self, seconds: float, state):
+        self.seconds = seconds
+        STAGE_SECONDS.observe(seconds, graph=self.graph, stage=self.stage)
+        if isinstance(state, dict):
+            state["stage_metrics"] = {**(state.get("stage_metrics") or {}), self.stage: self.fields()}
+
+    def fields(self) -> dict:
+        return {
+            "duration_ms": round(self.seconds * 1000, 2),
+            "tokens": {"prompt": self.prompt_tokens, "completion": self.completion_tokens},
+            "cost_usd": round(self.cost, 6),
+        }
+
+
+def instrument_node(stage: str, graph: str):
+    """
+    Time a graph node (sync, async, or a sync/async generator that fills in the
+    state as it streams), attribute LLM tokens used inside it to `stage`, and
+    record {"duration_ms", "tokens", "cost_usd"} under state["stage_metrics"][stage].
+    """
+    def decorate(fn):
+        if inspect.isasyncgenfunction(fn):
+            @functools.wraps(fn)
+            async def async_gen_wrapper(state, *args, **kwargs):
+                span, started = StageSpan(graph, stage), time.perf_counter()
+                gen = fn(state, *args, **kwargs)
+                try:
+                    while True:
+                        token = _current_stage.set(span)
+                        try:
+                            item = await gen.__anext__()
+                        except StopAsyncIteration:
+                            break
+                        finally:
+                            _current_stage.reset(token)
+                        yield item
+                finally:
+                    span.finish(time.perf_counter() - started, state)
+            return async_gen_wrapper
+
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def gen_wrapper(state, *args, **kwargs):
+                span, started = StageSpan(graph, stage), time.perf_counter()
+                gen = fn(state, *args, **kwargs)
+                try:
+                    while True:
+                        token = _current_stage.set(span)
+                        try:
+                            item = next(gen)
+                        except StopIteration:
+                            break
+                        finally:
+                            _current_stage.reset(token)
+                        yield item
+                finally:
+                    span.finish(time.perf_counter() - started, state)
+            return gen_wrapper
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(state, *args, **kwargs):
+                span, started = StageSpan(graph, stage), time.perf_counter()
+                token = _current_stage.set(span)
+                result = state
+                try:
+                    result = await fn(state, *args, **kwargs)
+                    return result
+                finally:
+                    _current_stage.reset(token)
+                    span.finish(time.perf_counter() - started, result)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(state, *args, **kwargs):
+            span, started = StageSpan(graph, stage), time.perf_counter()
+            token = _current_stage.set(span)
+            result = state
+            try:
+                result = fn(state, *args, **kwargs)
+                return result
+            finally:
+                _current_stage.reset(token)
+                span.finish(time.perf_counter() - started, result)
+        return wrapper
+
+    return decorate
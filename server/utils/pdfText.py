@@ -0,0 +1,21 @@
+# Runs inside the PDF extraction process pool: keep imports light, nothing from db/ or graphs/.
+import pdfplumber
+
+
+def page_count(path: str) -> int:
+    with pdfplumber.open(path) as pdf:
+        return len(pdf.pages)
+
+
+def extract_pages(path: str, first: int, last: int):
+    """
+    Text of pages first..last (1-based, inclusive) as [(page_number, text)].
+    Only this range is parsed, and each page's layout objects are dropped once its
+    text is out, so a worker holds one page at a time whatever the PDF's size.
+    """
+    pages = []
+    with pdfplumber.open(path, pages=list(range(first, last + 1))) as pdf:
+        for page in pdf.pages:
+            pages.append((page.page_number, page.extract_text() or ""))
+            page.close()
+    return pages
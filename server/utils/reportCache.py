@@ -0,0 +1,58 @@
+import copy
+import hashlib
+import os
+
+from utils.ttlCache import TTLCache
+
+# One entry per (graph, company, criticality); it only counts as a hit while the
+# retrieved evidence is the same set of chunks the report was generated from.
+report_cache = TTLCache(
+    "risk_reports",
+    max_size=int(os.getenv("REPORT_CACHE_SIZE", "500")),
+    ttl=float(os.getenv("REPORT_CACHE_TTL", str(6 * 3600))),
+    db_path=os.getenv("REPORT_CACHE_DB"),
+)
+
+
+def evidence_fingerprint(chunks) -> str:
+    """Order-independent digest of the retrieved chunk ids (chunks are shuffled before prompting)."""
+    ids = sorted(str(chunk.get("id") or chunk.get("doc", "")) for chunk in chunks or [])
+    return hashlib.sha256("\n".join(ids).encode("utf-8")).hexdigest()
+
+
+def report_cache_key(scope: str, company: str, criticality) -> str:
+    company = " ".join(str(company).lower().split())
+    return f"{scope}:{company}:{str(criticality).lower()}"
+
+
+def lookup_report(scope: str, company: str, criticality, chunks):
+    """
+    Cached report for this evidence, marked {"cached": True, "cache_age_seconds": ...}, or None.
+    An entry generated from different evidence is dropped.
+    """
+    key = report_cache_key(scope, company, criticality)
+    entry, status = report_cache.get(key)
+    if status != "hit":
+        return None
+
+    if entry["fingerprint"] != evidence_fingerprint(chunks):
+        print(f"♻️ Evidence changed for {company}, dropping cached report")
+        report_cache.delete(key)
+        return None
+
+    age = report_cache.age(key)
+    report = copy.deepcopy(entry["report"])
+    report["cached"] = True
+    report["cache_age_seconds"] = round(age, 1) if age is not None else None
+    print(f"📦 Serving cached risk report for {company} ({criticality})")
+    return report
+
+
+def remember_report(scope: str, company: str, criticality, chunks, report: dict):
+    """Store a successful report; failed generations are never cached."""
+    if "error" in report or "error" in (report.get("assessment") or {}):
+        return
+    report_cache.set(
+        report_cache_key(scope, company, criticality),
+        {"fingerprint": evidence_fingerprint(chunks), "report": report},
+    )
@@ -0,0 +1,144 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.ttlCache import TTLCache
+
+
+def normalize_prompt(text: str) -> str:
+    """Lower-case, collapse whitespace and drop trailing punctuation ("What can you do?" == "what can you do")."""
+    return re.sub(r"\s+", " ", text.lower()).strip().rstrip("?!. ")
+
+
+class ResponseCache:
+    """
+    Cache for deterministic (temperature 0) LLM calls, keyed by node and normalized input.
+
+    - Exact tier: TTLCache (TTL + LRU eviction) on sha256(node + normalized input).
+    - Semantic tier (optional): when `embed` and `semantic_threshold` are set, a
+      miss on the exact tier falls back to the most similar earlier input of the
+      same node (cosine similarity >= threshold). Only used where callers pass
+      semantic=True, so extraction-style calls never get a "close enough" answer.
+    """
+
+    def __init__(self, name: str, max_size: int = 1000, ttl: float = 86400,
+                 embed=None, semantic_threshold: float = None):
+        self.max_size = max_size
+        self.embed = embed
+        self.semantic_threshold = semantic_threshold
+        self._exact = TTLCache(name, max_size=max_size, ttl=ttl)
+        self._vectors = {}  # node -> OrderedDict(key -> unit vector)
+        self._counters = {}  # node -> {"hits", "semantic_hits", "misses"}
+        self._lock = threading.Lock()
+
+    @property
+    def semantic_enabled(self) -> bool:
+        return self.embed is not None and self.semantic_threshold is not None
+
+    def key(self, node: str, text: str) -> str:
+        digest = hashlib.sha256(normalize_prompt(text).encode("utf-8")).hexdigest()
+        return f"{node}:{digest}"
+
+    # ─────────────────────────────────────────────
+    # Lookups
+    # ─────────────────────────────────────────────
+    def get(self, node: str, text: str, semantic: bool = False):
+        """Cached response for `text` at `node`, or None."""
+        value, status = self._exact.get(self.key(node, text))
+        if status == "hit":
+            self._count(node, "hits")
+            return value
+
+        if semantic and self.semantic_enabled:
+            value = self._semantic_get(node, text)
+            if value is not None:
+                self._count(node, "semantic_hits")
+                return value
+
+        self._count(node, "misses")
+        return None
+
+    def _semantic_get(self, node: str, text: str):
+        with self._lock:
+            entries = list(self._vectors.get(node, {}).items())
+        if not entries:
+            return None
+
+        vector = self._embed(text)
+        if vector is None:
+            return None
+
+        keys = [k for k, _ in entries]
+        scores = np.stack([v for _, v in entries]) @ vector
+        best = int(np.argmax(scores))
+        if scores[best] < self.semantic_threshold:
+            return None
+
+        value, status = self._exact.get(keys[best])
+        if status != "hit":
+            # Expired or evicted from the exact tier; forget the vector too
+            with self._lock:
+                self._vectors.get(node, {}).pop(keys[best], None)
+            return None
+        return value
+
+    # ─────────────────────────────────────────────
+    # Writes
+    # ─────────────────────────────────────────────
+    def set(self, node: str, text: str, value, semantic: bool = False):
+        key = self.key(node, text)
+        self._exact.set(key, value)
+
+        if semantic and self.semantic_enabled:
+            vector = self._embed(text)
+            if vector is None:
+                return
+            with self._lock:
+                vectors = self._vectors.setdefault(node, OrderedDict())
+                vectors[key] = vector
+                vectors.move_to_end(key)
+                while len(vectors) > self.max_size:
+                    vectors.popitem(last=False)
+
+    def clear(self):
+        self._exact.clear()
+        with self._lock:
+            self._vectors.clear()
+
+    def stats(self) -> dict:
+        """Per-node hits, semantic hits, misses and hit rate."""
+        with self._lock:
+            counters = {node: dict(c) for node, c in self._counters.items()}
+            vectors = sum(len(v) for v in self._vectors.values())
+        nodes = {}
+        for node, c in counters.items():
+            lookups = c["hits"] + c["semantic_hits"] + c["misses"]
+            served = c["hits"] + c["semantic_hits"]
+            nodes[node] = {**c, "hit_rate": round(served / lookups, 4) if lookups else 0.0}
+        return {
+            "size": self._exact.stats()["size"],
+            "max_size": self.max_size,
+            "semantic": self.semantic_enabled,
+            "semantic_vectors": vectors,
+            "nodes": nodes,
+        }
+
+    # ─────────────────────────────────────────────
+    # Internals
+    # ─────────────────────────────────────────────
+    def _count(self, node: str, counter: str):
+        with self._lock:
+            counters = self._counters.setdefault(node, {"hits": 0, "semantic_hits": 0, "misses": 0})
+            counters[counter] += 1
+
+    def _embed(self, text: str):
+        try:
+            vector = np.asarray(self.embed([normalize_prompt(text)])[0], dtype=np.float32)
+        except Exception as e:
+            print(f"⚠️ Response cache embedding failed, skipping semantic tier: {e}")
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
@@ -0,0 +1,184 @@
+import asyncio
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from typing import Optional
+
+# Work started on a guess before the step that needs it has confirmed the guess,
+# e.g. the SERP fetch for a company read off the message by regex while the LLM
+# classifier is still running. The confirming step claims it or cancels it.
+SPECULATION_ENABLED = os.getenv("SPECULATION_ENABLED", "1") != "0"
+SPECULATION_MAX_AGE = float(os.getenv("SPECULATION_MAX_AGE", "60"))  # unclaimed work is cancelled after this
+SPECULATION_MAX_WORKERS = int(os.getenv("SPECULATION_MAX_WORKERS", "4"))
+
+# "could you analyze Tesla for our vendor review", "risk profile of Apple Inc?"
+COMPANY_GUESS_PATTERN = re.compile(
+    r"\b(?:analy[sz]e|assess|evaluate|vet|risk (?:analysis|assessment|profile) (?:of|for|on))\s+"
+    r"(?:(?:the\s+)?risks?\s+(?:of|for|in)\s+)?"
+    r"(?P<company>[\w&.'\-]+(?:\s+[\w&.'\-]+){0,3}?)"
+    r"(?=\s*(?:$|[,;:?!]|\s(?:with|for|and|as|at|to|criticality|please|because|before|so)\b))",
+    re.IGNORECASE,
+)
+
+# A guess starting with one of these ("my contract", "our supplier Acme", "this deal") or naming
+# a document rather than a company is not worth paid SERP queries; the LLM decides those.
+NOT_COMPANY_FIRST_WORDS = frozenset(
+    "a an the this that these those it its my our your their his her me us them all any some"
+    " every each whether how what which who if".split()
+)
+NOT_COMPANY_WORDS = frozenset(
+    "contract contracts agreement agreements clause clauses msa nda sow document documents"
+    " file files risk risks supplier suppliers vendor vendors deal terms".split()
+)
+
+_pending = {}  # key -> (Future | asyncio.Task, started_at)
+_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=SPECULATION_MAX_WORKERS, thread_name_prefix="speculative")
+_counters = {"started": 0, "claimed": 0, "cancelled": 0, "expired": 0, "failed": 0}
+
+
+def guess_company(message: str) -> Optional[str]:
+    """Cheap regex guess at the company a message asks about, or None when it doesn't look like one."""
+    match = COMPANY_GUESS_PATTERN.search(message or "")
+    if not match:
+        return None
+    company = match.group("company").strip(" .,'")
+    words = company.lower().split()
+    if not words or words[0] in NOT_COMPANY_FIRST_WORDS or NOT_COMPANY_WORDS.intersection(words):
+        return None
+    return company
+
+
+def normalize_company(name: str) -> str:
+    return " ".join(str(name).lower().replace(",", " ").split()).strip(" .")
+
+
+def speculation_key(scope: str, company: str) -> str:
+    return f"{scope}:{normalize_company(company)}"
+
+
+# ─────────────────────────────────────────────
+# Starting, claiming and cancelling
+# ─────────────────────────────────────────────
+def start(key: str, fn, *args) -> bool:
+    """Run fn(*args) on the speculative pool under `key`. False when disabled or already running."""
+    if not SPECULATION_ENABLED:
+        return False
+    _expire_old()
+    with _lock:
+        if key in _pending:
+            return False
+        _pending[key] = (_executor.submit(fn, *args), time.monotonic())
+        _counters["started"] += 1
+    print(f"🔮 Speculative work started: {key}")
+    return True
+
+
+def astart(key: str, coro_fn, *args) -> bool:
+    """Async version of start: schedules coro_fn(*args) as a task on the running loop."""
+    if not SPECULATION_ENABLED:
+        return False
+    _expire_old()
+    with _lock:
+        if key in _pending:
+            return False
+        task = asyncio.get_running_loop().create_task(coro_fn(*args))
+        # Nobody may ever await a cancelled guess; don't let asyncio log its exception
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        _pending[key] = (task, time.monotonic())
+        _counters["started"] += 1
+    print(f"🔮 Speculative work started: {key}")
+    return True
+
+
+def claim(key: str):
+    """Take ownership of the work started under `key`; returns its Future/Task or None."""
+    with _lock:
+        entry = _pending.pop(key, None)
+        if entry is not None:
+            _counters["claimed"] += 1
+    return entry[0] if entry else None
+
+
+def cancel(key: str, reason: str = "guess was wrong") -> bool:
+    """Cancel the work started under `key`. A thread that is already running finishes but is discarded."""
+    with _lock:
+        entry = _pending.pop(key, None)
+        if entry is not None:
+            _counters["cancelled"] += 1
+    if entry is None:
+        return False
+    _cancel_handle(entry[0])
+    print(f"🚫 Speculative work cancelled ({reason}): {key}")
+    return True
+
+
+def claim_result(key: str, timeout: float = None):
+    """Result of the work started under `key`, or None when there is none or it failed."""
+    handle = claim(key)
+    if handle is None:
+        return None
+    if not isinstance(handle, Future):
+        # Started on an event loop; a sync caller can't wait for it
+        _cancel_handle(handle)
+        return None
+    try:
+        return handle.result(timeout=timeout)
+    except FuturesTimeout:
+        handle.cancel()
+        return _failed(key, "timed out")
+    except Exception as e:
+        return _failed(key, e)
+
+
+async def aclaim_result(key: str):
+    """Async version of claim_result; waits for tasks and pool futures alike."""
+    handle = claim(key)
+    if handle is None:
+        return None
+    try:
+        if isinstance(handle, Future):
+            return await asyncio.wrap_future(handle)
+        return await handle
+    except asyncio.CancelledError:
+        if handle.cancelled():
+            return _failed(key, "cancelled")
+        raise
+    except Exception as e:
+        return _failed(key, e)
+
+
+def speculation_stats() -> dict:
+    with _lock:
+        return {"enabled": SPECULATION_ENABLED, "pending": len(_pending), **_counters}
+
+
+# ─────────────────────────────────────────────
+# Internals
+# ─────────────────────────────────────────────
+def _cancel_handle(handle):
+    if isinstance(handle, Future):
+        handle.cancel()
+    elif not handle.done():
+        handle.get_loop().call_soon_threadsafe(handle.cancel)
+
+
+def _failed(key: str, error):
+    with _lock:
+        _counters["failed"] += 1
+    print(f"⚠️ Speculative work {key} failed, running it again: {error}")
+    return None
+
+
+def _expire_old():
+    """Cancel speculative work nobody claimed within SPECULATION_MAX_AGE seconds."""
+    cutoff = time.monotonic() - SPECULATION_MAX_AGE
+    with _lock:
+        expired = [(key, entry[0]) for key, entry in _pending.items() if entry[1] < cutoff]
+        for key, _ in expired:
+            del _pending[key]
+        _counters["expired"] += len(expired)
+    for _, handle in expired:
+        _cancel_handle(handle)
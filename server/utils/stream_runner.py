@@ -1,206 +1,351 @@
 # backend/stream_runner.py
-from typing import Dict, Any, Generator
+import asyncio
+import os
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Generator, AsyncGenerator
+from graphs import contractbot
 from graphs.contractbot import (
-    classify_question_node,
-    router_node,
+    classify_and_extract_node,
     regular_chatbot_node,
-    init_risk_node,
-    check_inputs_node,
+    contract_qa_node,
     fetch_external_data_node,
     verify_sources_node,
     store_in_vector_db_node,
+    retrieve_existing_context_node,
     retrieve_relevant_context_node,
     generate_final_analysis_node,
+    aclassify_and_extract_node,
+    aregular_chatbot_node,
+    acontract_qa_node,
+    afetch_external_data_node,
+    astore_in_vector_db_node,
+    aretrieve_existing_context_node,
+    aretrieve_relevant_context_node,
+    agenerate_final_analysis_node,
+    generate_final_analysis_stream,
+    agenerate_final_analysis_stream,
+    merge_stage_metrics,
     ChatState,
 )
 
+# Runs the stored-evidence lookup next to fetch → verify → store in the sync runner
+_branch_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("STREAM_BRANCH_WORKERS", "8")), thread_name_prefix="stream-branch"
+)
+
+
+# ─────────────────────────────────────────────
+# Risk pipeline stages shared by the sync and async runners:
+# (stage, start message, sync node, async node, completion fields)
+# ─────────────────────────────────────────────
+def _fetch_complete(state: ChatState) -> Dict[str, Any]:
+    raw_findings = state.get("raw_findings", [])
+    raw_count = len(raw_findings) if isinstance(raw_findings, list) else 0
+    return {"raw_count": raw_count, "message": f"Found {raw_count} sources"}
+
+
+def _verify_complete(state: ChatState) -> Dict[str, Any]:
+    verified_count = len(state.get("verified_findings", []) or [])
+    unverified_count = len(state.get("unverified_findings", []) or [])
+    return {
+        "verified_count": verified_count,
+        "unverified_count": unverified_count,
+        "message": f"✅ Verified {verified_count} high-trust sources, flagged {unverified_count} as lower credibility"
+    }
+
+
+def _store_complete(state: ChatState) -> Dict[str, Any]:
+    stored_count = len(state.get("chroma_ids", []) or [])
+    return {"stored_count": stored_count, "message": f"💾 Stored {stored_count} documents in vector database"}
+
+
+def _analysis_complete(state: ChatState) -> Dict[str, Any]:
+    report = state.get("risk_report", {}) or {}
+    if report.get("cached"):
+        return {
+            "cached": True,
+            "cache_age_seconds": report.get("cache_age_seconds"),
+            "message": "Analysis complete (evidence unchanged, reused cached report)"
+        }
+    return {"cached": False, "message": "Analysis complete"}
+
+
+def _retrieve_complete(state: ChatState) -> Dict[str, Any]:
+    context_count = len(state.get("retrieved_context", []) or [])
+    if state.get("context_reused"):
+        return {"context_count": context_count, "reused": True,
+                "message": f"📊 No new evidence, using {context_count} stored context chunks"}
+    return {"context_count": context_count, "reused": False,
+            "message": f"📊 Retrieved {context_count} relevant context chunks"}
+
+
+RISK_STAGES = [
+    (
+        "fetch_external_data",
+        lambda state: f"Searching for information about {state.get('company_name')}...",
+        fetch_external_data_node, afetch_external_data_node, _fetch_complete,
+    ),
+    (
+        "verify_sources",
+        lambda state: "Verifying source credibility...",
+        verify_sources_node, None, _verify_complete,
+    ),
+    (
+        "store_in_vector_db",
+        lambda state: "Storing verified sources in database...",
+        store_in_vector_db_node, astore_in_vector_db_node, _store_complete,
+    ),
+    (
+        "retrieve_relevant_context",
+        lambda state: "Analyzing relevant information...",
+        retrieve_relevant_context_node, aretrieve_relevant_context_node, _retrieve_complete,
+    ),
+    (
+        "generate_final_analysis",
+        lambda state: "Generating comprehensive risk analysis...",
+        generate_final_analysis_node, agenerate_final_analysis_node, _analysis_complete,
+    ),
+]
+
+
+# Stored evidence is looked up alongside fetch → verify → store and joined before this stage
+EXISTING_CONTEXT_JOIN = "retrieve_relevant_context"
+
+
+def _existing_context_start() -> Dict[str, Any]:
+    return {"type": "stage_start", "stage": "retrieve_existing_context", "message": "Checking evidence already stored..."}
+
+
+def _join_existing_context(state: ChatState, branch: ChatState) -> Dict[str, Any]:
+    """Copy the lookup branch's result onto the main state; returns its stage_complete event."""
+    state["existing_context"] = branch.get("existing_context") or []
+    state["stage_metrics"] = merge_stage_metrics(state.get("stage_metrics"), branch.get("stage_metrics"))
+    existing_count = len(state["existing_context"])
+    return {
+        "type": "stage_complete",
+        "stage": "retrieve_existing_context",
+        **_stage_metrics(state, "retrieve_existing_context"),
+        "existing_count": existing_count,
+        "message": f"📚 Found {existing_count} relevant chunks already stored"
+    }
+
+
+# Stages whose LLM output is streamed to the client as "partial" events: stage -> (sync, async)
+STREAMING_STAGES = {
+    "generate_final_analysis": (generate_final_analysis_stream, agenerate_final_analysis_stream),
+}
+
+
+def _partial_event(stage: str, partial: Dict[str, Any]) -> Dict[str, Any]:
+    event = {"type": "partial", "stage": stage, "delta": partial["delta"]}
+    if partial.get("fields"):
+        event["fields"] = partial["fields"]
+    return event
+
+
+def _initial_state(user_id: str, user_message: str) -> ChatState:
+    return {
+        "user_id": user_id,
+        "messages": [{"role": "user", "content": user_message}]
+    }
+
+
+def _stage_metrics(state: ChatState, stage: str) -> Dict[str, Any]:
+    """duration_ms / tokens / cost_usd recorded by the instrumented node for `stage`."""
+    return (state.get("stage_metrics") or {}).get(stage, {})
+
+
+def _classified_event(state: ChatState) -> Dict[str, Any]:
+    return {
+        "type": "stage_complete",
+        "stage": "classify_question",
+        "intent": state.get("intent"),
+        "source": state.get("classified_by"),
+        **_stage_metrics(state, "classify_question"),
+        "message": f"Intent detected: {state.get('intent', 'unknown')}"
+    }
+
+
+def _chat_final_event(state: ChatState) -> Dict[str, Any]:
+    return {
+        "type": "final",
+        "mode": "chat",
+        "assistant_reply": state.get("assistant_reply", "")
+    }
+
+
+CONTRACT_QA_START = {"type": "stage_start", "stage": "contract_qa", "message": "Searching your contracts..."}
+
+
+def _contract_qa_events(state: ChatState):
+    """stage_complete and final events for an answer from the user's contracts."""
+    sources = state.get("contract_sources") or []
+    return [
+        {"type": "stage_complete", "stage": "contract_qa", "clauses": len(sources),
+         **_stage_metrics(state, "contract_qa"), "message": f"Answered from {len(sources)} contract clauses"},
+        {"type": "final", "mode": "contract", "assistant_reply": state.get("assistant_reply", ""), "sources": sources},
+    ]
+
+
+def _init_risk_event(state: ChatState) -> Dict[str, Any]:
+    # Company and criticality come out of the classification step; the event keeps its old shape
+    return {
+        "type": "stage_complete",
+        "stage": "init_risk",
+        "source": "classify_question",
+        "company_name": state.get("company_name"),
+        "criticality": state.get("criticality"),
+        "message": f"Analyzing {state.get('company_name', 'company')} with {state.get('criticality', 'unknown')} criticality"
+    }
+
+
+def _clarification_event(state: ChatState) -> Dict[str, Any]:
+    return {
+        "type": "final",
+        "mode": "clarification_needed",
+        "assistant_reply": state.get("assistant_reply", "Please provide company name and criticality.")
+    }
+
+
+def _risk_final_event(state: ChatState) -> Dict[str, Any]:
+    return {
+        "type": "final",
+        "mode": "risk_report",
+        "assistant_reply": state.get("assistant_reply", ""),
+        "risk_report": state.get("risk_report", {}),
+        "company_name": state.get("company_name"),
+        "criticality": state.get("criticality")
+    }
+
+
+def _error_event(e: Exception) -> Dict[str, Any]:
+    return {
+        "type": "error",
+        "message": str(e),
+        "traceback": traceback.format_exc()
+    }
+
+
 def run_pipeline_stream(user_id: str, user_message: str) -> Generator[Dict[str, Any], None, None]:
     """
     Yields dict events like:
-    { "type": "stage", "stage": "classify_question", "message": "...status..." }
+    { "type": "stage_complete", "stage": "classify_question", "duration_ms": 12.3,
+      "tokens": {"prompt": 120, "completion": 8}, "cost_usd": 0.00002, "message": "...status..." }
+    { "type": "partial", "stage": "generate_final_analysis", "delta": "...", "fields": {...} }
     { "type": "final", "assistant_reply": "...", "risk_report": {...} }
     """
 
     # Initialize state
-    state: ChatState = {
-        "user_id": user_id,
-        "messages": [{"role": "user", "content": user_message}]
-    }
+    state = _initial_state(user_id, user_message)
 
     try:
-        # Step 1: Classify the question
-        yield {
-            "type": "stage_start",
-            "stage": "classify_question",
-            "message": "Classifying your request..."
-        }
-        
-        state = classify_question_node(state)
-        
-        yield {
-            "type": "stage_complete",
-            "stage": "classify_question",
-            "intent": state.get("intent"),
-            "message": f"Intent detected: {state.get('intent', 'unknown')}"
-        }
+        # Step 1: Classify the question and extract company + criticality in one step
+        yield {"type": "stage_start", "stage": "classify_question", "message": "Classifying your request..."}
+        state = classify_and_extract_node(state)
+        yield _classified_event(state)
 
         # Step 2: Route based on intent
-        intent = state.get("intent", "other")
-        
-        if intent != "risk":
+        if state.get("intent") == "contract":
+            yield CONTRACT_QA_START
+            state = contract_qa_node(state)
+            yield from _contract_qa_events(state)
+            return
+
+        if state.get("intent", "other") != "risk":
             # Handle regular chatbot flow
-            yield {
-                "type": "stage_start",
-                "stage": "regular_chatbot",
-                "message": "Processing your query..."
-            }
-            
+            yield {"type": "stage_start", "stage": "regular_chatbot", "message": "Processing your query..."}
             state = regular_chatbot_node(state)
-            
-            yield {
-                "type": "stage_complete",
-                "stage": "regular_chatbot",
-                "message": "Response generated"
-            }
-            
-            yield {
-                "type": "final",
-                "mode": "chat",
-                "assistant_reply": state.get("assistant_reply", "")
-            }
+            yield {"type": "stage_complete", "stage": "regular_chatbot",
+                   **_stage_metrics(state, "regular_chatbot"), "message": "Response generated"}
+            yield _chat_final_event(state)
             return
 
-        # Risk analysis flow
-        # Step 3: Initialize risk analysis (extract company + criticality)
-        yield {
-            "type": "stage_start",
-            "stage": "init_risk",
-            "message": "Extracting company details..."
-        }
-        
-        state = init_risk_node(state)
-        
-        yield {
-            "type": "stage_complete",
-            "stage": "init_risk",
-            "company_name": state.get("company_name"),
-            "criticality": state.get("criticality"),
-            "message": f"Analyzing {state.get('company_name', 'company')} with {state.get('criticality', 'unknown')} criticality"
-        }
-
         # Check if we have valid inputs
         if state.get("stage") != "risk_analysis":
-            yield {
-                "type": "final",
-                "mode": "clarification_needed",
-                "assistant_reply": state.get("assistant_reply", "Please provide company name and criticality.")
-            }
+            yield _clarification_event(state)
             return
+        yield _init_risk_event(state)
 
-        # Step 4: Fetch external data
-        yield {
-            "type": "stage_start",
-            "stage": "fetch_external_data",
-            "message": f"Searching for information about {state.get('company_name')}..."
-        }
-        
-        state = fetch_external_data_node(state)
-        
-        raw_findings = state.get("raw_findings", [])
-        raw_count = len(raw_findings) if isinstance(raw_findings, list) else 0
-        
-        yield {
-            "type": "stage_complete",
-            "stage": "fetch_external_data",
-            "raw_count": raw_count,
-            "message": f"Found {raw_count} sources"
-        }
+        # Stored evidence is looked up in the background while new evidence is fetched and stored
+        existing = None
+        if contractbot.PARALLEL_RETRIEVAL:
+            yield _existing_context_start()
+            existing = _branch_executor.submit(retrieve_existing_context_node, dict(state))
 
-        # Step 5: Verify sources
-        yield {
-            "type": "stage_start",
-            "stage": "verify_sources",
-            "message": "Verifying source credibility..."
-        }
-        
-        state = verify_sources_node(state)
-        
-        verified_count = len(state.get("verified_findings", []) or [])
-        unverified_count = len(state.get("unverified_findings", []) or [])
-        
-        yield {
-            "type": "stage_complete",
-            "stage": "verify_sources",
-            "verified_count": verified_count,
-            "unverified_count": unverified_count,
-            "message": f"✅ Verified {verified_count} high-trust sources, flagged {unverified_count} as lower credibility"
-        }
+        # Steps 3-7: fetch → verify → store → retrieve → analyze
+        for stage, start_message, node, _, complete in RISK_STAGES:
+            if stage == EXISTING_CONTEXT_JOIN and existing is not None:
+                yield _join_existing_context(state, existing.result())
+            yield {"type": "stage_start", "stage": stage, "message": start_message(state)}
+            if stage in STREAMING_STAGES:
+                # Nodes stream partial output and fill in the state in place
+                for partial in STREAMING_STAGES[stage][0](state):
+                    yield _partial_event(stage, partial)
+            else:
+                state = node(state)
+            yield {"type": "stage_complete", "stage": stage, **_stage_metrics(state, stage), **complete(state)}
 
-        # Step 6: Store in vector database
-        yield {
-            "type": "stage_start",
-            "stage": "store_in_vector_db",
-            "message": "Storing verified sources in database..."
-        }
-        
-        state = store_in_vector_db_node(state)
-        
-        stored_count = len(state.get("chroma_ids", []) or [])
-        
-        yield {
-            "type": "stage_complete",
-            "stage": "store_in_vector_db",
-            "stored_count": stored_count,
-            "message": f"💾 Stored {stored_count} documents in vector database"
-        }
+        # Final result
+        yield _risk_final_event(state)
 
-        # Step 7: Retrieve relevant context
-        yield {
-            "type": "stage_start",
-            "stage": "retrieve_relevant_context",
-            "message": "Analyzing relevant information..."
-        }
-        
-        state = retrieve_relevant_context_node(state)
-        
-        context_count = len(state.get("retrieved_context", []) or [])
-        
-        yield {
-            "type": "stage_complete",
-            "stage": "retrieve_relevant_context",
-            "context_count": context_count,
-            "message": f"📊 Retrieved {context_count} relevant context chunks"
-        }
+    except Exception as e:
+        yield _error_event(e)
 
-        # Step 8: Generate final analysis
-        yield {
-            "type": "stage_start",
-            "stage": "generate_final_analysis",
-            "message": "Generating comprehensive risk analysis..."
-        }
-        
-        state = generate_final_analysis_node(state)
-        
-        yield {
-            "type": "stage_complete",
-            "stage": "generate_final_analysis",
-            "message": "Analysis complete"
-        }
 
-        # Final result
-        yield {
-            "type": "final",
-            "mode": "risk_report",
-            "assistant_reply": state.get("assistant_reply", ""),
-            "risk_report": state.get("risk_report", {}),
-            "company_name": state.get("company_name"),
-            "criticality": state.get("criticality")
-        }
+async def arun_pipeline_stream(user_id: str, user_message: str) -> AsyncGenerator[Dict[str, Any], None]:
+    """
+    Async version of run_pipeline_stream with the same events.
+    LLM calls use ainvoke, SERP requests use the async HTTP client and Chroma
+    work runs in worker threads, so a slow analysis never pins a request thread.
+    """
+    state = _initial_state(user_id, user_message)
+    existing = None
+
+    try:
+        yield {"type": "stage_start", "stage": "classify_question", "message": "Classifying your request..."}
+        state = await aclassify_and_extract_node(state)
+        yield _classified_event(state)
+
+        if state.get("intent") == "contract":
+            yield CONTRACT_QA_START
+            state = await acontract_qa_node(state)
+            for event in _contract_qa_events(state):
+                yield event
+            return
+
+        if state.get("intent", "other") != "risk":
+            yield {"type": "stage_start", "stage": "regular_chatbot", "message": "Processing your query..."}
+            state = await aregular_chatbot_node(state)
+            yield {"type": "stage_complete", "stage": "regular_chatbot",
+                   **_stage_metrics(state, "regular_chatbot"), "message": "Response generated"}
+            yield _chat_final_event(state)
+            return
+
+        if state.get("stage") != "risk_analysis":
+            yield _clarification_event(state)
+            return
+        yield _init_risk_event(state)
+
+        if contractbot.PARALLEL_RETRIEVAL:
+            yield _existing_context_start()
+            existing = asyncio.create_task(aretrieve_existing_context_node(dict(state)))
+
+        for stage, start_message, node, anode, complete in RISK_STAGES:
+            if stage == EXISTING_CONTEXT_JOIN and existing is not None:
+                yield _join_existing_context(state, await existing)
+            yield {"type": "stage_start", "stage": stage, "message": start_message(state)}
+            if stage in STREAMING_STAGES:
+                async for partial in STREAMING_STAGES[stage][1](state):
+                    yield _partial_event(stage, partial)
+            else:
+                state = await anode(state) if anode else node(state)
+            yield {"type": "stage_complete", "stage": stage, **_stage_metrics(state, stage), **complete(state)}
+
+        yield _risk_final_event(state)
 
     except Exception as e:
-        import traceback
-        yield {
-            "type": "error",
-            "message": str(e),
-            "traceback": traceback.format_exc()
-        }
\ No newline at end of file
+        yield _error_event(e)
+    finally:
+        if existing is not None and not existing.done():
+            existing.cancel()
@@ -0,0 +1,32 @@
+import os
+import json
+import sys
+import threading
+import time
+
+# Unset/empty → tracing off. "stdout" → print one JSON line per event. Anything else → append to that file.
+TRACE_TARGET = os.getenv("GRAPH_TRACE", "").strip()
+
+_trace_lock = threading.Lock()
+
+
+def trace_enabled() -> bool:
+    return bool(TRACE_TARGET)
+
+
+def trace(event: str, **fields):
+    """
+    Write a single compact JSON line describing `event`.
+    Does nothing (and serializes nothing) unless GRAPH_TRACE is set.
+    """
+    if not TRACE_TARGET:
+        return
+
+    line = json.dumps({"ts": round(time.time(), 3), "event": event, **fields}, default=str)
+
+    with _trace_lock:
+        if TRACE_TARGET == "stdout":
+            sys.stdout.write(line + "\n")
+        else:
+            with open(TRACE_TARGET, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
@@ -0,0 +1,148 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Thread-safe in-memory LRU with per-entry TTL and an optional SQLite tier.
+
+    - get() returns (value, status) with status "hit", "stale" or "miss".
+      An entry is "stale" for `stale_ttl` seconds after it expires, so callers
+      can serve it while refreshing in the background.
+    - With `db_path`, entries are also written to SQLite (values must be
+      JSON-serializable) and memory misses fall back to disk.
+    """
+
+    def __init__(self, name: str, max_size: int = 1024, ttl: float = 3600,
+                 stale_ttl: float = 0, db_path: str = None):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries = OrderedDict()  # key -> (value, stored_at, expires_at)
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "stale_hits": 0, "misses": 0, "disk_hits": 0, "evictions": 0}
+
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                " namespace TEXT, key TEXT, value TEXT, stored_at REAL, expires_at REAL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+            self._db.commit()
+
+    # ─────────────────────────────────────────────
+    # Lookups
+    # ─────────────────────────────────────────────
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self._db is not None:
+                entry = self._load_from_disk(key)
+                if entry is not None:
+                    self._counters["disk_hits"] += 1
+                    self._remember(key, entry)
+
+            if entry is None:
+                self._counters["misses"] += 1
+                return None, "miss"
+
+            value, stored_at, expires_at = entry
+            if now <= expires_at:
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                return value, "hit"
+
+            if now <= expires_at + self.stale_ttl:
+                self._counters["stale_hits"] += 1
+                return value, "stale"
+
+            self._entries.pop(key, None)
+            self._counters["misses"] += 1
+            return None, "miss"
+
+    def age(self, key: str):
+        """Seconds since `key` was stored, or None if it is not cached."""
+        with self._lock:
+            entry = self._entries.get(key)
+        return None if entry is None else time.time() - entry[1]
+
+    # ─────────────────────────────────────────────
+    # Writes
+    # ─────────────────────────────────────────────
+    def set(self, key: str, value, ttl: float = None):
+        now = time.time()
+        entry = (value, now, now + (self.ttl if ttl is None else ttl))
+        with self._lock:
+            self._remember(key, entry)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO cache_entries VALUES (?, ?, ?, ?, ?)",
+                    (self.name, key, json.dumps(value), entry[1], entry[2])
+                )
+                self._db.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+            if self._db is not None:
+                self._db.execute("DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (self.name, key))
+                self._db.commit()
+
+    def delete_prefix(self, prefix: str):
+        """Drop every entry whose key starts with `prefix`."""
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+            if self._db is not None:
+                self._db.execute(
+                    "DELETE FROM cache_entries WHERE namespace = ? AND substr(key, 1, ?) = ?",
+                    (self.name, len(prefix), prefix)
+                )
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM cache_entries WHERE namespace = ?", (self.name,))
+                self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            size = len(self._entries)
+        lookups = counters["hits"] + counters["stale_hits"] + counters["misses"]
+        served = counters["hits"] + counters["stale_hits"]
+        return {
+            "size": size,
+            "max_size": self.max_size,
+            **counters,
+            "hit_rate": round(served / lookups, 4) if lookups else 0.0,
+            "persistent": self._db is not None,
+        }
+
+    # ─────────────────────────────────────────────
+    # Internals (call with self._lock held)
+    # ─────────────────────────────────────────────
+    def _remember(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def _load_from_disk(self, key):
+        row = self._db.execute(
+            "SELECT value, stored_at, expires_at FROM cache_entries WHERE namespace = ? AND key = ?",
+            (self.name, key)
+        ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1], row[2]
@@ -1,81 +1,333 @@
-import requests
 import os
+import asyncio
+import copy
+import hashlib
+import threading
+import time
+import httpx
 import requests
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 from utils.htmlParser import parse_google_html
+from utils.ttlCache import TTLCache
+from utils.metrics import track_dependency
 
 # Load .env file into environment variables
 load_dotenv()
 
+BRIGHT_DATA_URL = os.getenv("BRIGHT_DATA_URL", "https://api.brightdata.com/request")
+BRIGHT_DATA_ZONE = os.getenv("BRIGHT_DATA_ZONE", "serp_api1")
+SERP_REQUEST_TIMEOUT = float(os.getenv("SERP_REQUEST_TIMEOUT", "25"))  # per SERP call
+SERP_DEADLINE = float(os.getenv("SERP_DEADLINE", "30"))                # whole get_company_data
+SERP_MAX_WORKERS = int(os.getenv("SERP_MAX_WORKERS", "8"))
+
+# Query variants per category; every variant is fetched in parallel and merged.
+SERP_QUERY_TEMPLATES = {
+    "risk": [
+        "Recent financial, security breaches, regulatory issues, or lawsuits involving {company}",
+    ],
+    "resilience": [
+        "{company} compliance certification, partnerships, sustainability, "
+        "leadership awards, security updates, product reliability, and community impact",
+    ],
+}
+
+# SERP result cache: TTL per category, stale entries served while a refresh runs.
+SERP_CACHE_TTL = {
+    "risk": float(os.getenv("SERP_CACHE_TTL_RISK", str(6 * 3600))),
+    "resilience": float(os.getenv("SERP_CACHE_TTL_RESILIENCE", str(24 * 3600))),
+}
+serp_cache = TTLCache(
+    "serp",
+    max_size=int(os.getenv("SERP_CACHE_SIZE", "2000")),
+    ttl=float(os.getenv("SERP_CACHE_TTL", str(6 * 3600))),
+    stale_ttl=float(os.getenv("SERP_CACHE_STALE_TTL", "3600")),
+    db_path=os.getenv("SERP_CACHE_DB"),
+)
+
+_session = None
+_session_lock = threading.Lock()
+_serp_executor = ThreadPoolExecutor(max_workers=SERP_MAX_WORKERS, thread_name_prefix="serp")
+_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="serp-refresh")
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+_async_client = None
+_async_client_loop = None
+
+
+def get_http_session() -> requests.Session:
+    """Shared keep-alive session so repeated SERP calls reuse pooled connections."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=SERP_MAX_WORKERS)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """Shared keep-alive AsyncClient for the running event loop."""
+    global _async_client, _async_client_loop
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_client_loop is not loop:
+        _async_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=SERP_MAX_WORKERS * 4, max_keepalive_connections=SERP_MAX_WORKERS)
+        )
+        _async_client_loop = loop
+    return _async_client
+
 
 def build_search_url(query):
     encoded_query = urllib.parse.quote(query)
     search_url = f"https://www.google.com/search?q={encoded_query}&brd_mobile=desktop"
     return search_url
 
-def get_company_data(company_name: str):
-    """
-    Fetches raw Google search HTML for a given company using Bright Data SERP API zone.
-    Optionally parses and returns structured search results.
 
-    Args:
-        company_name (str): Name of the company (e.g., 'Apple')
-        save_html (bool): If True, saves the fetched HTML to a file for inspection.
+def build_queries(company_name: str, templates: dict = None):
+    """Expand the query templates into (category, query) pairs."""
+    templates = templates or SERP_QUERY_TEMPLATES
+    return [
+        (category, template.format(company=company_name))
+        for category, variants in templates.items()
+        for template in variants
+    ]
 
-    Returns:
-        list[dict]: Parsed search results with title, url, snippet (if found)
-    """
 
-    api_key = os.getenv("BRIGHT_DATA_KEY") or "YOUR_API_KEY"  # Replace or set env var
-    if not api_key or api_key == "YOUR_API_KEY":
-        raise ValueError("❌ BRIGHT_DATA_KEY not set. Please set your Bright Data API key.")
-    url = "https://api.brightdata.com/request"
-    
-    risk_query = f"Recent financial, security breaches, regulatory issues, or lawsuits involving {company_name}"
-    resilience_query = (
-        f"{company_name} compliance certification, partnerships, sustainability, "
-        f"leadership awards, security updates, product reliability, and community impact"
-    )
-
-    risk_search_encoded_url = build_search_url(risk_query)
-    resilience_search_encoded_url=build_search_url(resilience_query)
-    
+def _serp_request(query: str, api_key: str):
     headers = {
         "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json"
     }
-
-    payload1 = {
-        "zone": "serp_api1",
-        "url": risk_search_encoded_url,
+    payload = {
+        "zone": BRIGHT_DATA_ZONE,
+        "url": build_search_url(query),
         "format": "raw"
     }
+    return headers, payload
 
-    payload2 = {
-        "zone": "serp_api1",
-        "url": resilience_search_encoded_url,
-        "format": "raw"
+
+def fetch_serp_html(query: str, api_key: str, timeout: float = SERP_REQUEST_TIMEOUT) -> str:
+    """POST one Google query to the Bright Data SERP zone and return the raw HTML."""
+    headers, payload = _serp_request(query, api_key)
+    with track_dependency("serp", "search"):
+        response = get_http_session().post(BRIGHT_DATA_URL, headers=headers, json=payload, timeout=timeout)
+        response.raise_for_status()
+    return response.text
+
+
+async def afetch_serp_html(query: str, api_key: str, timeout: float = SERP_REQUEST_TIMEOUT) -> str:
+    """Async version of fetch_serp_html on the shared httpx client."""
+    headers, payload = _serp_request(query, api_key)
+    with track_dependency("serp", "search"):
+        response = await get_async_http_client().post(BRIGHT_DATA_URL, headers=headers, json=payload, timeout=timeout)
+        response.raise_for_status()
+    return response.text
+
+
+def fetch_serp_many(queries, api_key: str, timeout: float = SERP_REQUEST_TIMEOUT, deadline: float = SERP_DEADLINE):
+    """
+    Fetch every (category, query) pair concurrently and parse each page as soon as it arrives.
+
+    Returns:
+        (dict, dict): results per category (deduplicated by URL) and successful fetches per category.
+        Queries still running when `deadline` expires are dropped.
+    """
+    futures = {
+        _serp_executor.submit(fetch_serp_html, query, api_key, timeout): category
+        for category, query in queries
     }
+    results = {category: [] for category, _ in queries}
+    seen_urls = {category: set() for category in results}
+    succeeded = {category: 0 for category in results}
 
     try:
-        risk_response = requests.post(url, headers=headers, json=payload1, timeout=25)
-        resilience_response=requests.post(url, headers=headers, json=payload2, timeout=25)
-        
-        if not risk_response.ok and not resilience_response:
-            return []
-
-        risk_html = risk_response.text
-        resilience_html = risk_response.text
-        
-        risk_results = parse_google_html(risk_html)
-        resilience_results=parse_google_html(resilience_html)
-        
-        return {
-            "risk":risk_results,
-            "resilience":resilience_results
-        }
-
-    except requests.exceptions.RequestException as e:
-        print("⚠️ Request failed:", e)
-        return []
\ No newline at end of file
+        for future in as_completed(futures, timeout=deadline):
+            category = futures[future]
+            try:
+                html = future.result()
+            except requests.exceptions.RequestException as e:
+                print(f"⚠️ {category} SERP request failed:", e)
+                continue
+
+            succeeded[category] += 1
+            _merge_parsed(parse_google_html(html), results[category], seen_urls[category])
+    except FuturesTimeout:
+        pending = [f for f in futures if not f.done()]
+        for f in pending:
+            f.cancel()
+        print(f"⚠️ SERP deadline of {deadline}s hit, dropped {len(pending)} pending queries")
+
+    return results, succeeded
+
+
+async def afetch_serp_many(queries, api_key: str, timeout: float = SERP_REQUEST_TIMEOUT, deadline: float = SERP_DEADLINE):
+    """Async version of fetch_serp_many; same return value and deadline behaviour."""
+    tasks = {
+        asyncio.ensure_future(afetch_serp_html(query, api_key, timeout)): category
+        for category, query in queries
+    }
+    results = {category: [] for category, _ in queries}
+    seen_urls = {category: set() for category in results}
+    succeeded = {category: 0 for category in results}
+
+    pending = set(tasks)
+    loop = asyncio.get_running_loop()
+    ends_at = loop.time() + deadline
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, timeout=max(0, ends_at - loop.time()), return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                print(f"⚠️ SERP deadline of {deadline}s hit, dropped {len(pending)} pending queries")
+                break
+
+            for task in done:
+                category = tasks[task]
+                try:
+                    html = task.result()
+                except httpx.HTTPError as e:
+                    print(f"⚠️ {category} SERP request failed:", e)
+                    continue
+
+                succeeded[category] += 1
+                parsed = await asyncio.to_thread(parse_google_html, html)
+                _merge_parsed(parsed, results[category], seen_urls[category])
+    finally:
+        # Deadline, or this fetch itself was cancelled (e.g. a wrong speculative guess):
+        # stop the requests still in flight instead of letting them finish unread
+        for task in pending:
+            task.cancel()
+
+    return results, succeeded
+
+
+def _merge_parsed(parsed, category_results, seen_urls):
+    for item in parsed:
+        if item["url"] not in seen_urls:
+            seen_urls.add(item["url"])
+            category_results.append(item)
+
+
+def serp_cache_key(company_name: str, category: str, templates: dict = None) -> str:
+    """Cache key from the normalized company name and the query templates used for `category`."""
+    templates = templates or SERP_QUERY_TEMPLATES
+    template_digest = hashlib.sha1("|".join(templates[category]).encode()).hexdigest()[:12]
+    company = " ".join(company_name.lower().split())
+    return f"{category}:{template_digest}:{company}"
+
+
+def _store_results(company_name: str, categories, results: dict, succeeded: dict):
+    for category in categories:
+        # Only cache categories where at least one request actually came back
+        if succeeded.get(category):
+            serp_cache.set(
+                serp_cache_key(company_name, category),
+                results[category],
+                ttl=SERP_CACHE_TTL.get(category),
+            )
+
+
+def _fetch_and_cache(company_name: str, categories, api_key: str):
+    templates = {c: SERP_QUERY_TEMPLATES[c] for c in categories}
+    results, succeeded = fetch_serp_many(build_queries(company_name, templates), api_key)
+    _store_results(company_name, categories, results, succeeded)
+    return results, succeeded
+
+
+def _refresh_in_background(company_name: str, category: str, api_key: str):
+    key = serp_cache_key(company_name, category)
+    with _refreshing_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+
+    def refresh():
+        try:
+            _fetch_and_cache(company_name, [category], api_key)
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(key)
+
+    _refresh_executor.submit(refresh)
+
+
+def _bright_data_key() -> str:
+    api_key = os.getenv("BRIGHT_DATA_KEY") or "YOUR_API_KEY"  # Replace or set env var
+    if not api_key or api_key == "YOUR_API_KEY":
+        raise ValueError("❌ BRIGHT_DATA_KEY not set. Please set your Bright Data API key.")
+    return api_key
+
+
+def _cached_categories(company_name: str, api_key: str):
+    """Split categories into cached data and the ones that still need a fetch."""
+    data, missing = {}, []
+    for category in SERP_QUERY_TEMPLATES:
+        cached, status = serp_cache.get(serp_cache_key(company_name, category))
+        if status == "miss":
+            missing.append(category)
+            continue
+        data[category] = cached
+        if status == "stale":
+            _refresh_in_background(company_name, category, api_key)
+    return data, missing
+
+
+def _combine(company_name: str, data: dict, missing, results: dict, succeeded: dict, started: float):
+    print(f"🌐 SERP fetch for {company_name}: {sum(succeeded.values())} ok in {time.perf_counter() - started:.2f}s")
+
+    if not data and not any(succeeded.values()):
+        return []
+
+    for category in missing:
+        data[category] = results.get(category, [])
+    # Nodes annotate findings in place (trust_score), so never hand out cached objects
+    return copy.deepcopy(data)
+
+
+def get_company_data(company_name: str):
+    """
+    Fetches Google results for a company through the Bright Data SERP API zone.
+    Fresh cached results are returned without a request; stale ones are returned
+    immediately and refreshed in the background. Missing categories are fetched
+    in parallel over a pooled HTTP session.
+
+    Args:
+        company_name (str): Name of the company (e.g., 'Apple')
+
+    Returns:
+        dict: {"risk": [...], "resilience": [...]} with title, url, snippet per result,
+        or [] if every request failed.
+    """
+    api_key = _bright_data_key()
+
+    data, missing = _cached_categories(company_name, api_key)
+    if not missing:
+        print(f"🌐 SERP cache hit for {company_name}")
+        return copy.deepcopy(data)
+
+    started = time.perf_counter()
+    results, succeeded = _fetch_and_cache(company_name, missing, api_key)
+    return _combine(company_name, data, missing, results, succeeded, started)
+
+
+async def aget_company_data(company_name: str):
+    """Async version of get_company_data (same cache, same return value) on the shared httpx client."""
+    api_key = _bright_data_key()
+
+    data, missing = _cached_categories(company_name, api_key)
+    if not missing:
+        print(f"🌐 SERP cache hit for {company_name}")
+        return copy.deepcopy(data)
+
+    started = time.perf_counter()
+    templates = {c: SERP_QUERY_TEMPLATES[c] for c in missing}
+    results, succeeded = await afetch_serp_many(build_queries(company_name, templates), api_key)
+    _store_results(company_name, missing, results, succeeded)
+    return _combine(company_name, data, missing, results, succeeded, started)
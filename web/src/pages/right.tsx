@@ -56,6 +56,11 @@ const stageConfig: Record<string, StageConfig> = {
     icon: Database,
     color: "cyan",
   },
+  retrieve_existing_context: {
+    label: "Checking stored evidence",
+    icon: Database,
+    color: "teal",
+  },
   retrieve_relevant_context: {
     label: "Retrieving context",
     icon: Search,
@@ -66,6 +71,11 @@ const stageConfig: Record<string, StageConfig> = {
     icon: BarChart3,
     color: "red",
   },
+  contract_qa: {
+    label: "Searching your contracts",
+    icon: FileCheck,
+    color: "emerald",
+  },
   regular_chatbot: {
     label: "Processing response",
     icon: MessageSquare,